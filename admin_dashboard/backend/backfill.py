@@ -0,0 +1,53 @@
+"""
+Admin Dashboard Registration Code Backfill
+
+Registration codes stored without being indexed reach the
+RegistrationCodeIndex through RegistrationCode.catch_up(),
+CATCH_UP_BATCH_SIZE codes per call: a first batch from initialize(), then
+one per timer tick until the `indexed` cursor reaches the last code. The
+same batches delete the entries of an older index layout before every
+code is indexed again, so rebuilding the index of any number of codes
+never exceeds the instruction limit of one message.
+"""
+
+from typing import Optional
+
+from kybra import Duration, TimerId, ic
+from kybra_simple_logging import get_logger
+
+from .models import RegistrationCode
+
+logger = get_logger("extensions.admin_dashboard.backfill")
+
+# Registration codes, or stale index entries, handled per catch_up call
+CATCH_UP_BATCH_SIZE = 500
+
+_timer_id: Optional[TimerId] = None
+
+
+def _schedule() -> None:
+    global _timer_id
+    if _timer_id is None:
+        _timer_id = ic.set_timer(Duration(0), _on_timer)
+
+
+def _on_timer() -> None:
+    global _timer_id
+    _timer_id = None
+    try:
+        catch_up()
+    except Exception as e:
+        logger.error(f"Error indexing registration codes: {str(e)}")
+
+
+def catch_up() -> bool:
+    """
+    Run the next batch of registration code indexing.
+
+    Returns whether every code is indexed; if not, a timer runs the next
+    batch.
+    """
+    if RegistrationCode.catch_up(CATCH_UP_BATCH_SIZE):
+        return True
+    _schedule()
+    return False
@@ -9,16 +9,71 @@ import json
 import traceback
 from datetime import datetime
 from io import StringIO
-from typing import Any, Dict, List
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import ggg
-from kybra_simple_db import Entity
+from kybra_simple_db import Database, Entity
 from kybra_simple_logging import get_logger
 
-from .models import RegistrationCode
+from . import backfill, sweeper
+from .models import (
+    CodexHash,
+    ImportErrorRecord,
+    ImportSession,
+    RegistrationCode,
+    RegistrationCodeIndex,
+    RegistrationCodeSweeper,
+)
+from .validation import get_validator, validate_records
 
 logger = get_logger("extensions.admin_dashboard")
 
+# Number of records handed to process_bulk_import at a time
+IMPORT_BATCH_SIZE = 500
+
+# Maximum number of users per generate_registration_urls_bulk call
+MAX_BULK_REGISTRATION_CODES = 10000
+
+# Entity types resolved by _exportable_entity_types: (registry size, types)
+_export_types_cache: Tuple[int, List[Tuple[str, type]]] = (-1, [])
+
+
+def initialize(args: str):
+    """
+    Register admin dashboard entity types with the Database, start
+    indexing the registration codes that are not indexed yet, in batches
+    from a timer, and start the registration code sweeper.
+
+    Called once during canister initialization, so that registry-driven
+    export covers these types even before they are first used.
+    """
+    entity_types = (
+        RegistrationCode,
+        RegistrationCodeIndex,
+        RegistrationCodeSweeper,
+        ImportSession,
+        ImportErrorRecord,
+        CodexHash,
+    )
+    for entity_type in entity_types:
+        try:
+            Database.get_instance().register_entity_type(entity_type)
+        except Exception as e:
+            logger.error(
+                f"Error registering entity type {entity_type.__name__}: {str(e)}"
+            )
+
+    try:
+        backfill.catch_up()
+    except Exception as e:
+        logger.error(f"Error indexing registration codes: {str(e)}")
+
+    try:
+        sweeper.start_timer()
+    except Exception as e:
+        logger.error(f"Error starting registration code sweeper: {str(e)}")
+
 
 def extension_sync_call(method_name: str, args: dict):
     """
@@ -29,8 +84,16 @@ def extension_sync_call(method_name: str, args: dict):
         "import_data": (import_data, True),
         "export_data": (export_data, True),
         "generate_registration_url": (generate_registration_url, True),
+        "generate_registration_urls_bulk": (generate_registration_urls_bulk, True),
         "validate_registration_code": (validate_registration_code, True),
         "get_registration_codes": (get_registration_codes, True),
+        "sweep_registration_codes": (sweep_registration_codes, True),
+        "configure_registration_code_sweeper": (
+            configure_registration_code_sweeper,
+            True,
+        ),
+        "get_import_errors": (get_import_errors, True),
+        "get_codex_hashes": (get_codex_hashes, True),
     }
 
     if method_name not in methods:
@@ -58,63 +121,60 @@ def export_data(args):
 
         entity_types = args.get("entity_types", None)
         include_codexes = args.get("include_codexes", True)
+        # Codex bodies the caller already has, by hash; these are not resent
+        known_hashes = set(args.get("known_hashes") or [])
 
         logger.debug(f"Exporting data - entity_types: {entity_types}, include_codexes: {include_codexes}")
 
-        # Get all entity classes from ggg module
-        import ggg
-        from kybra_simple_db import Entity
-        
         all_entities = []
         codexes = []
-        
-        # List of known entity types in the system
-        entity_classes = [
-            'User', 'Human', 'Citizen', 'Organization', 'Realm', 'Treasury',
-            'Instrument', 'Transfer', 'Balance', 'Mandate', 'Contract', 'Trade',
-            'Dispute', 'License', 'Task', 'Codex', 'TaskSchedule', 'TaskExecution',
-            'Land', 'Registry', 'Service', 'Proposal', 'Vote', 'TaxRecord',
-            'Notification', 'Identity', 'UserProfile', 'Permission'
-        ]
-        
+
+        entity_classes = _exportable_entity_types()
+
         # Filter entity classes if specific types requested
         if entity_types:
-            entity_classes = [ec for ec in entity_classes if ec in entity_types]
-        
+            entity_classes = [
+                (type_name, entity_class)
+                for type_name, entity_class in entity_classes
+                if type_name in entity_types or entity_class.__name__ in entity_types
+            ]
+
         # Export each entity type
-        for entity_class_name in entity_classes:
+        for type_name, entity_class in entity_classes:
             try:
-                # Get the entity class from ggg module
-                if hasattr(ggg, entity_class_name):
-                    entity_class = getattr(ggg, entity_class_name)
-                    
-                    # Get all instances of this entity type
-                    instances = list(entity_class.instances())
-                    
-                    logger.debug(f"Found {len(instances)} instances of {entity_class_name}")
-                    
-                    for instance in instances:
-                        try:
-                            # Serialize the entity
-                            serialized = instance.serialize()
-                            
-                            # Separate codexes from regular entities
-                            if entity_class_name == 'Codex' and include_codexes:
-                                codexes.append({
-                                    'name': serialized.get('name', ''),
-                                    'code': serialized.get('code', ''),
-                                    '_id': serialized.get('_id', ''),
-                                })
-                            else:
-                                all_entities.append(serialized)
-                        except Exception as e:
-                            logger.error(f"Error serializing {entity_class_name} instance: {str(e)}")
-                            continue
-                            
+                # Load only this type's own instances; subclasses are listed separately
+                max_id = entity_class.max_id()
+                instances = entity_class.load_some(1, max_id) if max_id else []
+
+                logger.debug(f"Found {len(instances)} instances of {type_name}")
+
+                for instance in instances:
+                    try:
+                        # Serialize the entity
+                        serialized = instance.serialize()
+
+                        # Separate codexes from regular entities
+                        if entity_class.__name__ == "Codex" and include_codexes:
+                            code = serialized.get("code") or ""
+                            code_hash = CodexHash.hash_code(code)
+                            codex = {
+                                "name": serialized.get("name", ""),
+                                "hash": code_hash,
+                                "_id": serialized.get("_id", ""),
+                            }
+                            if code_hash not in known_hashes:
+                                codex["code"] = code
+                            codexes.append(codex)
+                        else:
+                            all_entities.append(serialized)
+                    except Exception as e:
+                        logger.error(f"Error serializing {type_name}: {str(e)}")
+                        continue
+
             except Exception as e:
-                logger.error(f"Error processing entity class {entity_class_name}: {str(e)}")
+                logger.error(f"Error processing entity type {type_name}: {str(e)}")
                 continue
-        
+
         # Prepare response data
         response_data = {
             "entities": all_entities,
@@ -139,6 +199,40 @@ def export_data(args):
         return {"success": False, "error": str(e)}
 
 
+def _exportable_entity_types() -> List[Tuple[str, type]]:
+    """
+    List (full type name, class) pairs of the entity types to export.
+
+    These are the ggg entity types, whether or not they are registered
+    with the Database yet, and the types in the Database type registry,
+    which adds namespaced extension entities. Classes are registered under
+    both their full and their class name, so entries are de-duplicated by
+    full type name. Types whose class sets `__export__ = False` are left
+    out: internal bookkeeping, such as indexes, counters and job state,
+    that its extension rebuilds from the exported entities, or that only
+    makes sense in the source realm. The result is cached until the
+    registry changes size.
+    """
+    global _export_types_cache
+    registry = Database.get_instance()._entity_types
+    if _export_types_cache[0] != len(registry):
+        types = {}
+        for entity_class in (*_ggg_entity_types(), *registry.values()):
+            if getattr(entity_class, "__export__", True):
+                types.setdefault(entity_class.get_full_type_name(), entity_class)
+        _export_types_cache = (len(registry), sorted(types.items()))
+    return _export_types_cache[1]
+
+
+def _ggg_entity_types() -> List[type]:
+    """List the Entity subclasses defined by the ggg module"""
+    return [
+        value
+        for value in vars(ggg).values()
+        if isinstance(value, type) and issubclass(value, Entity) and value is not Entity
+    ]
+
+
 def import_data(args):
     """
     Import data from direct data input
@@ -150,45 +244,61 @@ def import_data(args):
 
         data_format = args.get("format", "json")
         data_content = args.get("data", "")
+        validate_only = args.get("validate_only", False)
+        batch_size = args.get("batch_size", IMPORT_BATCH_SIZE)
 
-        logger.debug(f"data_content: {data_content}")
         logger.debug(f"data_format: {data_format}")
 
         if not data_content:
             return {"success": False, "error": "No data provided"}
 
+        if (
+            not isinstance(batch_size, int)
+            or isinstance(batch_size, bool)
+            or batch_size < 1
+        ):
+            return {"success": False, "error": "batch_size must be a positive integer"}
+
         # Parse data based on format
-        parsed_data = []
         if data_format == "csv":
-            # Handle CSV data
-            import io
-
-            csv_reader = csv.DictReader(
-                io.StringIO(data_content)
-            )  # TODO: this might not work on Kybra
-            parsed_data = list(csv_reader)
+            records = _iter_csv_records(data_content, args.get("entity_type"))
         else:
             # Handle JSON data
             try:
                 if isinstance(data_content, str):
-                    parsed_data = json.loads(data_content)
+                    records = json.loads(data_content)
                 else:
-                    parsed_data = data_content
+                    records = data_content
 
-                if not isinstance(parsed_data, list):
-                    parsed_data = [parsed_data]
+                if not isinstance(records, list):
+                    records = [records]
             except json.JSONDecodeError as e:
                 return {"success": False, "error": f"Invalid JSON data: {str(e)}"}
 
+        if validate_only:
+            records = list(records)
+            report = validate_records(records)
+            return {
+                "success": True,
+                "message": "Validation completed, no records were imported",
+                "data": {
+                    "total_records": len(records),
+                    "valid": report["valid"],
+                    "invalid": report["invalid"],
+                    "errors": report["errors"],
+                },
+            }
+
         # Process data in batches
-        logger.debug(f"parsed_data: {parsed_data}")
-        results = process_bulk_import(parsed_data)
+        session = ImportSession(format=data_format)
+        results = _import_in_batches(records, batch_size, session)
 
         return {
             "success": True,
             "message": "Successfully imported records",
             "data": {
-                "total_records": len(parsed_data),
+                "session_id": session._id,
+                "total_records": results["total_records"],
                 "successful": results["successful"],
                 "failed": results["failed"],
                 "errors": results["errors"],
@@ -200,18 +310,141 @@ def import_data(args):
         return {"success": False, "error": str(e)}
 
 
-def process_bulk_import(data: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Process bulk import data and create entities"""
+def _iter_csv_records(data_content: str, entity_type: str = None) -> Iterator[dict]:
+    """
+    Lazily read CSV rows, coercing columns to the target entity's property types.
+
+    The entity type comes from a `_type` column, falling back to `entity_type`.
+    """
+    csv_reader = csv.DictReader(StringIO(data_content))
+    for row in csv_reader:
+        row_type = row.get("_type") or entity_type
+        if row_type:
+            row["_type"] = row_type
+            validator = get_validator(row_type)
+            if validator:
+                row = validator.coerce(row)
+        yield row
+
+
+def _import_in_batches(
+    records: Iterable[dict], batch_size: int, session: ImportSession
+) -> Dict[str, Any]:
+    """Feed records to process_bulk_import in fixed-size batches"""
+    totals = {"total_records": 0, "successful": 0, "failed": 0, "errors": []}
+    records = iter(records)
+
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        results = process_bulk_import(batch, totals["total_records"], session)
+        totals["total_records"] += len(batch)
+        totals["successful"] += results["successful"]
+        totals["failed"] += results["failed"]
+        totals["errors"].extend(results["errors"][: 10 - len(totals["errors"])])
+
+    session.total_records = totals["total_records"]
+    session.successful = totals["successful"]
+    session.failed = totals["failed"]
+
+    return totals
+
+
+def _stored_codex_code(code_hash: str) -> Optional[str]:
+    """Get a codex body the realm already stores by its hash, or None"""
+    entry = CodexHash["hash", code_hash]
+    codex = ggg.Codex.load(entry.codex_id) if entry else None
+    # The Codex may have been deleted or its code changed since it was
+    # indexed, and its checksum is not updated along with its code
+    if codex and CodexHash.hash_code(codex.code or "") == code_hash:
+        return codex.code
+    return None
+
+
+def _resolve_codex_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Resolve the body of an imported Codex record through the hash index.
+
+    A record may carry its code inline (plain or `base64:` prefixed), or
+    only a `hash` of a body the realm already stores, in which case no
+    code needs to be sent or decoded. The returned record has plain `code`
+    and a `sha256:` checksum of it.
+    """
+    record = dict(record)
+    code_hash = record.pop("hash", None)
+    code = record.get("code")
+    stored = _stored_codex_code(code_hash) if code_hash else None
+
+    if stored is not None and (not code or code.startswith("base64:")):
+        # Body already stored, no need to receive or decode it again
+        record["code"] = stored
+    elif code:
+        if code.startswith("base64:"):
+            code = base64.b64decode(code[7:]).decode()
+        record["code"] = code
+        code_hash = CodexHash.hash_code(code)
+    else:
+        raise ValueError(f"Codex body {code_hash} not found and no code provided")
+
+    record["checksum"] = f"sha256:{code_hash}"
+    return record
+
+
+def get_codex_hashes(args: dict):
+    """
+    Get the hashes of the codex bodies imported into the realm.
+
+    Only bodies received through import_data are indexed: a Codex created
+    in the realm any other way is not listed, and a listed body may have
+    been changed or deleted since. import_data checks every hash against
+    the stored code, so a record sending only the hash of a body the realm
+    no longer holds fails, and has to be sent again with its code.
+    """
+    try:
+        hashes = [entry.hash for entry in CodexHash.instances()]
+        return {"success": True, "data": {"hashes": hashes}}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def _import_error_code(error: Exception) -> str:
+    """Map an import exception to a short error code"""
+    message = str(error)
+    if isinstance(error, TypeError):
+        return "invalid_type"
+    if isinstance(error, KeyError) or "must contain '_type'" in message:
+        return "missing_field"
+    if "Unknown entity type" in message:
+        return "unknown_type"
+    if "already exists" in message:
+        return "duplicate"
+    if "Invalid value" in message:
+        return "invalid_value"
+    return "error"
+
+
+def process_bulk_import(
+    data: List[Dict[str, Any]],
+    start_index: int = 0,
+    session: ImportSession = None,
+) -> Dict[str, Any]:
+    """
+    Process bulk import data and create entities.
+
+    Failed records are written to the session's error ledger when a session
+    is given; the returned `errors` only holds the first 10 of this batch.
+    """
     successful = 0
     failed = 0
     errors = []
 
-    logger.debug(f"data: {data}")
-
-    for record in data:
+    for index, record in enumerate(data, start_index):
         try:
 
-            entity = Entity.deserialize(record)
+            is_codex = isinstance(record, dict) and record.get("_type") == "Codex"
+            if is_codex:
+                record = _resolve_codex_record(record)
 
             # Example data
             # d = [
@@ -234,33 +467,84 @@ def process_bulk_import(data: List[Dict[str, Any]]) -> Dict[str, Any]:
             #     ]
 
             entity = Entity.deserialize(record)
-            entity_type = record["_type"]
-            if entity_type == "Codex":
-                if record["code"].startswith("base64:"):
-                    entity.code = base64.b64decode(record["code"][7:]).decode()
-                else:
-                    entity.code = record["code"]
+            if is_codex:
+                CodexHash.add(record["checksum"][7:], entity._id)
 
             successful += 1
         except Exception as e:
-            logger.error(f"Error creating entity: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error creating entity at record {index}: {str(e)}")
             failed += 1
-            errors.append(f"Record {record}: {str(e)}")
+            error_code = _import_error_code(e)
+            if session:
+                session.record_error(index, record, error_code, str(e))
+            if len(errors) < 10:
+                is_dict = isinstance(record, dict)
+                errors.append(
+                    {
+                        "index": index,
+                        "_type": record.get("_type") if is_dict else None,
+                        "_id": record.get("_id") if is_dict else None,
+                        "code": error_code,
+                        "error": str(e)[:256],
+                    }
+                )
 
     return {
         "successful": successful,
         "failed": failed,
-        "errors": errors[:10],  # Limit to first 10 errors
+        "errors": errors,
     }
 
 
+def get_import_errors(args: dict):
+    """Get a page of the error ledger of an import session"""
+    try:
+        if isinstance(args, str):
+            args = json.loads(args)
+
+        session_id = args.get("session_id")
+        if not session_id:
+            return {"success": False, "error": "session_id is required"}
+
+        session = ImportSession.load(str(session_id))
+        if not session:
+            return {"success": False, "error": f"Import session {session_id} not found"}
+
+        cursor = int(args.get("cursor", 0))
+        limit = min(int(args.get("limit", 100)), 1000)
+        page = session.errors(cursor, limit)
+        next_cursor = cursor + len(page)
+
+        return {
+            "success": True,
+            "data": {
+                "session_id": session._id,
+                "total_records": session.total_records,
+                "failed": session.failed,
+                "errors": [
+                    {
+                        "index": error.record_index,
+                        "_type": error.entity_type,
+                        "_id": error.entity_id,
+                        "code": error.error_code,
+                        "error": error.message,
+                    }
+                    for error in page
+                ],
+                "next_cursor": next_cursor if next_cursor < session.failed else None,
+            },
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
 def generate_registration_url(args: dict):
     """Generate a registration URL for a user"""
     try:
         user_id = args.get("user_id")
         created_by = args.get("created_by", "admin")
         frontend_url = args.get("frontend_url", "https://localhost:3000")
-        email = args["email"]
+        email = args.get("email")
         expires_in_hours = args.get("expires_in_hours", 24)
 
         if not user_id:
@@ -288,6 +572,84 @@ def generate_registration_url(args: dict):
         return {"success": False, "error": str(e)}
 
 
+def generate_registration_urls_bulk(args: dict):
+    """
+    Generate registration URLs for many users at once
+
+    Takes `users` as a list of {"user_id", "email"} objects or
+    [user_id, email] pairs, and returns the URLs as CSV (default) or NDJSON
+    text in `data.content`.
+    """
+    try:
+        if isinstance(args, str):
+            args = json.loads(args)
+
+        users = args.get("users") or []
+        created_by = args.get("created_by", "admin")
+        frontend_url = args.get("frontend_url", "https://localhost:3000")
+        expires_in_hours = args.get("expires_in_hours", 24)
+        output_format = args.get("output_format", "csv").lower()
+
+        if output_format not in ("csv", "ndjson"):
+            return {"success": False, "error": "output_format must be csv or ndjson"}
+        if len(users) > MAX_BULK_REGISTRATION_CODES:
+            return {
+                "success": False,
+                "error": f"At most {MAX_BULK_REGISTRATION_CODES} users per call",
+            }
+
+        pairs = []
+        for index, user in enumerate(users):
+            if isinstance(user, dict):
+                user_id, email = user.get("user_id"), user.get("email")
+            else:
+                user_id, email = (list(user) + [None])[:2]
+            if not user_id:
+                return {"success": False, "error": f"users[{index}] has no user_id"}
+            pairs.append((str(user_id), email))
+
+        reg_codes = RegistrationCode.create_many(
+            pairs, created_by, frontend_url, expires_in_hours
+        )
+        expires_at = (
+            datetime.fromtimestamp(reg_codes[0].expires_at).isoformat()
+            if reg_codes
+            else None
+        )
+        fields = ["user_id", "email", "code", "registration_url", "expires_at"]
+        rows = (
+            [
+                reg_code.user_id,
+                reg_code.email,
+                reg_code.code,
+                reg_code.registration_url,
+                expires_at,
+            ]
+            for reg_code in reg_codes
+        )
+
+        output = StringIO()
+        if output_format == "csv":
+            writer = csv.writer(output)
+            writer.writerow(fields)
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                output.write(json.dumps(dict(zip(fields, row))) + "\n")
+
+        return {
+            "success": True,
+            "data": {
+                "count": len(reg_codes),
+                "format": output_format,
+                "expires_at": expires_at,
+                "content": output.getvalue(),
+            },
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
 def validate_registration_code(args: dict):
     """Validate a registration code"""
     try:
@@ -321,41 +683,151 @@ def validate_registration_code(args: dict):
         return {"success": False, "error": str(e)}
 
 
+# Fields of get_registration_codes rows, computed only when projected
+REGISTRATION_CODE_FIELDS = {
+    "code": lambda code: code.code,
+    "user_id": lambda code: code.user_id,
+    "email": lambda code: code.email,
+    "registration_url": lambda code: code.registration_url,
+    "expires_at": lambda code: datetime.fromtimestamp(code.expires_at).isoformat(),
+    "used": lambda code: code.used == 1,
+    "used_at": lambda code: (
+        datetime.fromtimestamp(code.used_at).isoformat() if code.used_at > 0 else None
+    ),
+    "created_by": lambda code: code.created_by,
+    "is_valid": lambda code: code.is_valid(),
+}
+
+
 def get_registration_codes(args: dict):
-    """Get registration codes with optional filtering"""
+    """
+    Get registration codes with optional filtering
+
+    Codes are ordered by `order_by` ("created" or "expires"). With `limit`
+    a single page is returned; pass its `next_cursor` as `cursor` to get
+    the next one. `fields` selects which fields each code includes.
+    """
     try:
+        if isinstance(args, str):
+            args = json.loads(args) if args else {}
+
         user_id = args.get("user_id")
         include_used = args.get("include_used", False)
+        order_by = args.get("order_by", "created")
+        limit = args.get("limit")
+        cursor = args.get("cursor")
+        fields = args.get("fields") or list(REGISTRATION_CODE_FIELDS)
+
+        unknown_fields = [f for f in fields if f not in REGISTRATION_CODE_FIELDS]
+        if unknown_fields:
+            return {"success": False, "error": f"Unknown fields: {unknown_fields}"}
+
+        if order_by == "created":
+            after = (int(cursor),) if cursor else None
+
+            def sort_key(code):
+                return (code.numeric_id,)
+
+        elif order_by == "expires":
+            if cursor:
+                expires_at, _, last_code = str(cursor).partition(":")
+                after = (int(expires_at), last_code)
+            else:
+                after = None
+
+            def sort_key(code):
+                return (code.expires_at, code.code)
+
+        else:
+            return {"success": False, "error": "order_by must be created or expires"}
 
         if user_id:
             codes = RegistrationCode.find_by_user_id(user_id)
+            # Filter out used codes if requested
+            if not include_used:
+                codes = [code for code in codes if code.used == 0]
+            total = len(codes)
+            codes = sorted(codes, key=sort_key)
+            if after:
+                codes = [code for code in codes if sort_key(code) > after]
+        else:
+            total = RegistrationCode.count() if include_used else None
+            if order_by == "created":
+                from_id = after[0] + 1 if after else 1
+                if include_used:
+                    codes = RegistrationCode.iter_by_creation(from_id)
+                else:
+                    codes = RegistrationCode.iter_unused_by_creation(from_id)
+            else:
+                codes = RegistrationCode.iter_by_expiry(
+                    include_used, after[0] if after else 0
+                )
+                if after:
+                    codes = (code for code in codes if sort_key(code) > after)
+            if total is None:
+                total = RegistrationCode.count_unused()
+
+        if limit:
+            limit = min(int(limit), 1000)
+            page = list(islice(codes, limit + 1))
+            has_more = len(page) > limit
+            page = page[:limit]
         else:
-            codes = RegistrationCode.instances()
+            page = list(codes)
+            has_more = False
 
-        # Filter out used codes if requested
-        if not include_used:
-            codes = [code for code in codes if code.used == 0]
+        next_cursor = None
+        if has_more:
+            next_cursor = ":".join(str(value) for value in sort_key(page[-1]))
 
         return {
             "success": True,
             "data": [
-                {
-                    "code": code.code,
-                    "user_id": code.user_id,
-                    "email": code.email,
-                    "registration_url": code.registration_url,
-                    "expires_at": datetime.fromtimestamp(code.expires_at).isoformat(),
-                    "used": code.used == 1,
-                    "used_at": (
-                        datetime.fromtimestamp(code.used_at).isoformat()
-                        if code.used_at > 0
-                        else None
-                    ),
-                    "created_by": code.created_by,
-                    "is_valid": code.is_valid(),
-                }
-                for code in codes
+                {field: REGISTRATION_CODE_FIELDS[field](code) for field in fields}
+                for code in page
             ],
+            "total": total,
+            "next_cursor": next_cursor,
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
+
+
+def sweep_registration_codes(args: dict):
+    """Purge expired and used registration codes past the retention period now"""
+    try:
+        if isinstance(args, str):
+            args = json.loads(args) if args else {}
+
+        max_instructions = int(
+            args.get("max_instructions", sweeper.SWEEP_INSTRUCTION_BUDGET)
+        )
+        result = sweeper.sweep(max_instructions)
+
+        return {"success": True, "data": {**result, **sweeper.get_status()}}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def configure_registration_code_sweeper(args: dict):
+    """Set the retention period and interval of the registration code sweeper"""
+    try:
+        if isinstance(args, str):
+            args = json.loads(args) if args else {}
+
+        state = RegistrationCodeSweeper.get_state()
+        if "retention_hours" in args:
+            retention_hours = int(args["retention_hours"])
+            if retention_hours < 0:
+                return {"success": False, "error": "retention_hours must be >= 0"}
+            state.retention_hours = retention_hours
+        if "interval_seconds" in args:
+            interval_seconds = int(args["interval_seconds"])
+            if interval_seconds < 60:
+                return {"success": False, "error": "interval_seconds must be >= 60"}
+            state.interval_seconds = interval_seconds
+            sweeper.start_timer()
+
+        return {"success": True, "data": sweeper.get_status()}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
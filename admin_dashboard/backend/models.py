@@ -4,18 +4,81 @@ Admin Dashboard Models
 This module contains database models specific to the admin dashboard extension.
 """
 
+import bisect
+import hashlib
+import heapq
+import json
 import secrets
 import string
 from datetime import datetime, timedelta
+from typing import Iterator
 
 from kybra_simple_db import Entity, TimestampedMixin
 from kybra_simple_db.properties import Integer, String
 
+from .indexes import SortedListIndex
+
+# Length of generated registration codes
+CODE_LENGTH = 16
+
+# Width of the expires_at buckets of the registration code expiry index
+EXPIRY_BUCKET_SECONDS = 3600
+
+# Registration code IDs covered by one page of a paged index key
+INDEX_PAGE_SIZE = 500
+
+# Layout version of RegistrationCodeIndex; the index is rebuilt when it changes
+INDEX_VERSION = 4
+
+# Keys of RegistrationCodeIndex holding the progress of RegistrationCode.catch_up
+INDEX_STATE_KEYS = ("version", "indexed", "stale")
+
+
+class RegistrationCodeIndex(Entity, SortedListIndex):
+    """
+    Model for one entry of the registration code secondary indexes.
+
+    Lists that can grow with the number of codes are paged (see
+    SortedListIndex): the codes of a paged key are split by registration
+    code ID into pages of INDEX_PAGE_SIZE IDs.
+
+    Keys used by RegistrationCode:
+        user:<user_id>       codes created for a user
+        created              [ID, code] pairs of all codes (paged)
+        expires:<bucket>     [expires_at, code] pairs of the codes expiring
+                             within an EXPIRY_BUCKET_SECONDS window (paged)
+        unused               codes that have not been used (paged)
+        used:<bucket>        codes used within an EXPIRY_BUCKET_SECONDS
+                             window (paged)
+        buckets              sorted list of non-empty expiry buckets
+        used_buckets         sorted list of non-empty used buckets
+        count:unused         number of unused codes (a JSON number)
+        version              INDEX_VERSION of the stored layout
+        indexed              ID of the last code indexed by catch_up
+        stale                [first, last] IDs of the entries of an older
+                             layout still to be deleted by catch_up
+
+    Attributes:
+        key (str): Index key (alias)
+        values (str): JSON list of registration codes (or pairs, or bucket
+            numbers)
+    """
+
+    __alias__ = "key"
+    __export__ = False
+
+    key = String(max_length=128)
+    values = String()
+
 
 class RegistrationCode(Entity, TimestampedMixin):
     """
     Model for storing registration codes used for user signup.
 
+    Codes are indexed as they are created or loaded as data; catch_up()
+    indexes any other codes, and rebuilds the index when its layout
+    changes, a bounded batch per call (see backfill.py).
+
     Attributes:
         code (str): Unique registration code (indexed)
         user_id (str): ID of the user this code is for (indexed)
@@ -50,24 +113,84 @@ class RegistrationCode(Entity, TimestampedMixin):
         expires_in_hours: int = 24,
     ) -> "RegistrationCode":
         """Create a new registration code."""
-        # Generate a random 16-character alphanumeric code
-        alphabet = string.ascii_letters + string.digits
-        code = "".join(secrets.choice(alphabet) for _ in range(16))
+        return cls.create_many(
+            [(user_id, email)], created_by, frontend_url, expires_in_hours
+        )[0]
+
+    @classmethod
+    def create_many(
+        cls,
+        users: list[tuple],
+        created_by: str,
+        frontend_url: str,
+        expires_in_hours: int = 24,
+    ) -> list["RegistrationCode"]:
+        """
+        Create registration codes for a list of (user_id, email) pairs.
 
+        Index entries shared by the new codes (pages of the expiry bucket
+        and of the unused codes, bucket list) are written once per batch.
+        """
         expires_timestamp = int(
             (datetime.utcnow() + timedelta(hours=expires_in_hours)).timestamp()
         )
+        frontend_url = frontend_url.rstrip("/")
 
-        return cls(
-            code=code,
-            user_id=user_id,
-            email=email or "",
-            expires_at=expires_timestamp,
-            used=0,
-            used_at=0,
-            created_by=created_by,
-            frontend_url=frontend_url.rstrip("/"),
-        )
+        reg_codes = [
+            cls(
+                code=code,
+                user_id=user_id,
+                email=email or "",
+                expires_at=expires_timestamp,
+                used=0,
+                used_at=0,
+                created_by=created_by,
+                frontend_url=frontend_url,
+            )
+            for (user_id, email), code in zip(users, cls.generate_codes(len(users)))
+        ]
+
+        cls._index_many(reg_codes)
+        if (
+            reg_codes
+            and cls._get_state("indexed") == int(reg_codes[0]._id) - 1
+            and not cls._get_state("stale")
+        ):
+            # Every earlier code is indexed, so catch_up can skip these
+            cls._set_state("indexed", int(reg_codes[-1]._id))
+
+        return reg_codes
+
+    @classmethod
+    def generate_codes(cls, count: int) -> list[str]:
+        """
+        Generate unused random 16-character alphanumeric codes.
+
+        Random bytes are drawn in one batch and mapped onto the alphabet,
+        rejecting bytes that would bias the result towards its first
+        characters.
+        """
+        alphabet = string.ascii_letters + string.digits
+        limit = 256 - 256 % len(alphabet)
+
+        codes = []
+        taken = set()
+        while len(codes) < count:
+            missing = count - len(codes)
+            chars = [
+                alphabet[byte % len(alphabet)]
+                for byte in secrets.token_bytes(missing * CODE_LENGTH * 5 // 4 + 16)
+                if byte < limit
+            ]
+            for i in range(0, len(chars) - CODE_LENGTH + 1, CODE_LENGTH):
+                code = "".join(chars[i : i + CODE_LENGTH])
+                if code in taken or cls.db().load(cls._alias_key(), code):
+                    continue
+                taken.add(code)
+                codes.append(code)
+                if len(codes) == count:
+                    break
+        return codes
 
     @property
     def registration_url(self) -> str:
@@ -78,8 +201,134 @@ class RegistrationCode(Entity, TimestampedMixin):
         """Mark this code as used."""
         self.used = 1
         self.used_at = int(datetime.utcnow().timestamp())
+        if RegistrationCodeIndex.remove_paged("unused", self.index_page, [self.code]):
+            self._adjust_unused_count(-1)
+        RegistrationCodeIndex.add_paged(
+            f"used:{self.used_bucket}", self.index_page, [self.code]
+        )
+        RegistrationCodeIndex.add("used_buckets", self.used_bucket)
         self.save()
 
+    @property
+    def expiry_bucket(self) -> int:
+        """Get the expiry index bucket of this code."""
+        return self.expires_at // EXPIRY_BUCKET_SECONDS
+
+    @property
+    def used_bucket(self) -> int:
+        """Get the used index bucket of this code."""
+        return self.used_at // EXPIRY_BUCKET_SECONDS
+
+    @property
+    def numeric_id(self) -> int:
+        """Get the _id of this code as a number, 0 if it is not numeric."""
+        return int(self._id) if str(self._id).isdigit() else 0
+
+    @property
+    def index_page(self) -> int:
+        """Get the page of this code in the paged index keys."""
+        return self.numeric_id // INDEX_PAGE_SIZE
+
+    @property
+    def created_pair(self) -> list:
+        """Get the value of this code in the creation order index."""
+        return [self.numeric_id, self.code]
+
+    @property
+    def expiry_pair(self) -> list:
+        """Get the value of this code in the expiry index."""
+        return [self.expires_at, self.code]
+
+    @classmethod
+    def _index_many(cls, reg_codes: list["RegistrationCode"]) -> None:
+        # Add codes to the indexes, writing each index entry once
+        by_key = {}
+        pages = {}
+        for reg_code in reg_codes:
+            page = reg_code.index_page
+            expires = f"expires:{reg_code.expiry_bucket}"
+            by_key.setdefault(f"user:{reg_code.user_id}", []).append(reg_code.code)
+            by_key.setdefault("buckets", []).append(reg_code.expiry_bucket)
+            pages.setdefault(("created", page), []).append(reg_code.created_pair)
+            pages.setdefault((expires, page), []).append(reg_code.expiry_pair)
+            if reg_code.used == 0:
+                pages.setdefault(("unused", page), []).append(reg_code.code)
+            else:
+                used = f"used:{reg_code.used_bucket}"
+                by_key.setdefault("used_buckets", []).append(reg_code.used_bucket)
+                pages.setdefault((used, page), []).append(reg_code.code)
+        unused = 0
+        for key, values in by_key.items():
+            RegistrationCodeIndex.add_many(key, values)
+        for (name, page), values in pages.items():
+            added = RegistrationCodeIndex.add_paged(name, page, values)
+            if name == "unused":
+                unused += added
+        # Codes indexed already are not counted again
+        cls._adjust_unused_count(unused)
+
+    @classmethod
+    def _unindex_many(cls, reg_codes: list["RegistrationCode"]) -> None:
+        # Remove codes from the indexes, writing each index entry once
+        by_user = {}
+        pages = {}
+        buckets = {}
+        for reg_code in reg_codes:
+            page = reg_code.index_page
+            by_user.setdefault(reg_code.user_id, []).append(reg_code.code)
+            pages.setdefault(("created", page), []).append(reg_code.created_pair)
+            expires = f"expires:{reg_code.expiry_bucket}"
+            pages.setdefault((expires, page), []).append(reg_code.expiry_pair)
+            buckets[expires] = ("buckets", reg_code.expiry_bucket)
+            if reg_code.used == 0:
+                pages.setdefault(("unused", page), []).append(reg_code.code)
+            else:
+                used = f"used:{reg_code.used_bucket}"
+                pages.setdefault((used, page), []).append(reg_code.code)
+                buckets[used] = ("used_buckets", reg_code.used_bucket)
+        for user_id, codes in by_user.items():
+            RegistrationCodeIndex.remove_many(f"user:{user_id}", codes)
+        for (name, page), codes in pages.items():
+            removed = RegistrationCodeIndex.remove_paged(name, page, codes)
+            if name == "unused":
+                cls._adjust_unused_count(-removed)
+        for name, (buckets_key, bucket) in buckets.items():
+            if not RegistrationCodeIndex["key", name]:
+                RegistrationCodeIndex.remove(buckets_key, bucket)
+
+    @classmethod
+    def unindex_missing(cls, name: str, page: int, values: list) -> None:
+        """
+        Remove the values of codes deleted without being unindexed from a
+        page of a paged key, and the codes from the unused and created
+        codes, which share its page numbers.
+        """
+        RegistrationCodeIndex.remove_paged(name, page, values)
+        codes = [value[1] if isinstance(value, list) else value for value in values]
+        cls._adjust_unused_count(
+            -RegistrationCodeIndex.remove_paged("unused", page, codes)
+        )
+        missing = set(codes)
+        created = RegistrationCodeIndex.get(f"created:{page}")
+        RegistrationCodeIndex.remove_paged(
+            "created", page, [pair for pair in created if pair[1] in missing]
+        )
+
+    def add_to_indexes(self):
+        """Add this code to the user, expiry, unused and used indexes."""
+        self._index_many([self])
+
+    def remove_from_indexes(self):
+        """Remove this code from all indexes."""
+        self._unindex_many([self])
+
+    @classmethod
+    def purge_many(cls, reg_codes: list["RegistrationCode"]) -> None:
+        """Delete codes, removing them from the indexes in one pass."""
+        cls._unindex_many(reg_codes)
+        for reg_code in reg_codes:
+            reg_code.delete()
+
     def is_valid(self) -> bool:
         """Check if this code is valid (not used and not expired)."""
         current_timestamp = int(datetime.utcnow().timestamp())
@@ -90,7 +339,296 @@ class RegistrationCode(Entity, TimestampedMixin):
         """Find a registration code by its code value."""
         return cls[code]
 
+    @classmethod
+    def _load_codes(cls, codes: list) -> list["RegistrationCode"]:
+        loaded = (cls["code", code] for code in codes)
+        return [reg_code for reg_code in loaded if reg_code]
+
     @classmethod
     def find_by_user_id(cls, user_id: str) -> list["RegistrationCode"]:
         """Find all registration codes for a specific user."""
-        return [code for code in cls.instances() if code.user_id == user_id]
+        return cls._load_codes(RegistrationCodeIndex.get(f"user:{user_id}"))
+
+    @classmethod
+    def find_unused(cls) -> list["RegistrationCode"]:
+        """Find all registration codes that have not been used, by expiry."""
+        return list(cls.iter_by_expiry(include_used=False))
+
+    @classmethod
+    def count_unused(cls) -> int:
+        """Get the number of unused codes from the maintained counter."""
+        entry = RegistrationCodeIndex["key", "count:unused"]
+        if entry is None:
+            # Counted once from the unused pages, then kept up to date
+            count = sum(
+                len(RegistrationCodeIndex.get(f"unused:{page}"))
+                for page in RegistrationCodeIndex.get("unused")
+            )
+            entry = RegistrationCodeIndex(key="count:unused", values=str(count))
+        return int(entry.values)
+
+    @classmethod
+    def _adjust_unused_count(cls, delta: int) -> None:
+        # A missing counter is computed from the index on first read instead
+        entry = RegistrationCodeIndex["key", "count:unused"]
+        if entry is not None:
+            entry.values = str(int(entry.values) + delta)
+
+    @classmethod
+    def iter_by_creation(cls, from_id: int = 1) -> Iterator["RegistrationCode"]:
+        """Iterate over registration codes in creation (ID) order."""
+        pages = RegistrationCodeIndex.get("created")
+        first_page = max(from_id, 1) // INDEX_PAGE_SIZE
+        for page in pages[bisect.bisect_left(pages, first_page) :]:
+            pairs = RegistrationCodeIndex.get(f"created:{page}")
+            for _, code in pairs[bisect.bisect_left(pairs, [from_id]) :]:
+                reg_code = cls["code", code]
+                if reg_code:
+                    yield reg_code
+
+    @classmethod
+    def iter_unused_by_creation(cls, from_id: int = 1) -> Iterator["RegistrationCode"]:
+        """Iterate over unused registration codes in creation (ID) order."""
+        pages = RegistrationCodeIndex.get("unused")
+        first_page = max(from_id, 1) // INDEX_PAGE_SIZE
+        for page in pages[bisect.bisect_left(pages, first_page) :]:
+            codes = cls._load_codes(RegistrationCodeIndex.get(f"unused:{page}"))
+            codes.sort(key=lambda reg_code: reg_code.numeric_id)
+            for reg_code in codes:
+                if reg_code.numeric_id >= from_id:
+                    yield reg_code
+
+    @classmethod
+    def iter_by_expiry(
+        cls, include_used: bool = True, from_timestamp: int = 0
+    ) -> Iterator["RegistrationCode"]:
+        """
+        Iterate over registration codes ordered by expiry time.
+
+        The sorted pages of each bucket are merged, so codes are loaded
+        only as they are reached.
+        """
+        from_bucket = from_timestamp // EXPIRY_BUCKET_SECONDS
+        buckets = RegistrationCodeIndex.get("buckets")
+        for bucket in buckets[bisect.bisect_left(buckets, from_bucket) :]:
+            name = f"expires:{bucket}"
+            pages = []
+            for page in RegistrationCodeIndex.get(name):
+                pairs = RegistrationCodeIndex.get(f"{name}:{page}")
+                pairs = pairs[bisect.bisect_left(pairs, [from_timestamp]) :]
+                if not include_used:
+                    unused = set(RegistrationCodeIndex.get(f"unused:{page}"))
+                    pairs = [pair for pair in pairs if pair[1] in unused]
+                pages.append(pairs)
+            for _, code in heapq.merge(*pages):
+                reg_code = cls["code", code]
+                if reg_code:
+                    yield reg_code
+
+    @classmethod
+    def deserialize(cls, data: dict, level: int = 1) -> "RegistrationCode":
+        """Load a code from serialized data, such as an import, and index it."""
+        existing = cls.load(str(data["_id"])) if data.get("_id") else None
+        if not existing and data.get("code"):
+            existing = cls["code", data["code"]]
+        if existing:
+            # The loaded fields may move the code to other index entries
+            existing.remove_from_indexes()
+        reg_code = super().deserialize(data, level=level)
+        reg_code.add_to_indexes()
+        return reg_code
+
+    @staticmethod
+    def _get_state(key: str):
+        entry = RegistrationCodeIndex["key", key]
+        return json.loads(entry.values) if entry else None
+
+    @staticmethod
+    def _set_state(key: str, value) -> None:
+        entry = RegistrationCodeIndex["key", key]
+        if entry:
+            entry.values = json.dumps(value)
+        else:
+            RegistrationCodeIndex(key=key, values=json.dumps(value))
+
+    @classmethod
+    def catch_up(cls, limit: int) -> bool:
+        """
+        Index up to `limit` of the codes stored since the last catch_up.
+
+        When INDEX_VERSION changes, the entries of the older layout are
+        deleted first, up to `limit` per call, and every code is then
+        indexed again; codes are found by numeric _id, so one stored with
+        another _id is only indexed as it is loaded.
+
+        Returns whether every code is indexed.
+        """
+        if cls._get_state("version") != INDEX_VERSION:
+            cls._set_state("stale", [1, RegistrationCodeIndex.max_id()])
+            cls._set_state("indexed", 0)
+            cls._set_state("version", INDEX_VERSION)
+
+        stale = cls._get_state("stale")
+        if stale:
+            first, last = stale
+            entries = [
+                entry
+                for entry in RegistrationCodeIndex.load_some(first, limit)
+                if int(entry._id) <= last
+            ]
+            for entry in entries:
+                if entry.key not in INDEX_STATE_KEYS:
+                    entry.delete()
+            if len(entries) == limit:
+                cls._set_state("stale", [int(entries[-1]._id) + 1, last])
+            else:
+                RegistrationCodeIndex["key", "stale"].delete()
+            return False
+
+        indexed = cls._get_state("indexed") or 0
+        max_id = cls.max_id()
+        if max_id <= indexed:
+            return True
+        reg_codes = cls.load_some(indexed + 1, limit)
+        cls._index_many(reg_codes)
+        indexed = int(reg_codes[-1]._id) if len(reg_codes) == limit else max_id
+        cls._set_state("indexed", indexed)
+        return indexed >= max_id
+
+
+class RegistrationCodeSweeper(Entity):
+    """
+    Model for the settings and progress of the registration code sweeper.
+
+    There is a single entry, named "default".
+
+    Attributes:
+        name (str): Entry name (alias)
+        retention_hours (int): How long expired or used codes are kept
+        interval_seconds (int): Time between timer-driven sweeps
+        pending (int): 1 if the last sweep stopped at its instruction budget
+        last_run_at (int): Timestamp of the last sweep
+        last_purged (int): Codes purged by the last sweep
+        total_purged (int): Codes purged since the sweeper was created
+    """
+
+    __alias__ = "name"
+    __export__ = False
+
+    name = String(max_length=32)
+    retention_hours = Integer(default=168)
+    interval_seconds = Integer(default=3600)
+    pending = Integer(default=0)
+    last_run_at = Integer(default=0)
+    last_purged = Integer(default=0)
+    total_purged = Integer(default=0)
+
+    @classmethod
+    def get_state(cls) -> "RegistrationCodeSweeper":
+        """Get the sweeper entry, creating it with defaults on first use."""
+        return cls["name", "default"] or cls(name="default")
+
+
+class ImportSession(Entity, TimestampedMixin):
+    """
+    Model for one import_data run.
+
+    Error records of a session are created within a single call, so they
+    occupy the contiguous ImportErrorRecord ID range starting at
+    error_id_start, which is what makes the error ledger pageable by ID.
+
+    Attributes:
+        format (str): Input format ("json" or "csv")
+        total_records (int): Number of records processed
+        successful (int): Number of records imported
+        failed (int): Number of records that failed
+        error_id_start (int): ID of the first ImportErrorRecord, 0 if none
+    """
+
+    __export__ = False
+
+    format = String(max_length=16)
+    total_records = Integer(default=0)
+    successful = Integer(default=0)
+    failed = Integer(default=0)
+    error_id_start = Integer(default=0)
+
+    def record_error(
+        self, record_index: int, record, error_code: str, message: str
+    ) -> "ImportErrorRecord":
+        """Persist a compact error entry for a failed record."""
+        is_dict = isinstance(record, dict)
+        error = ImportErrorRecord(
+            session_id=self._id,
+            record_index=record_index,
+            entity_type=str(record.get("_type") or "")[:64] if is_dict else "",
+            entity_id=str(record.get("_id") or "")[:64] if is_dict else "",
+            error_code=error_code,
+            message=message[:256],
+        )
+        if not self.error_id_start:
+            self.error_id_start = int(error._id)
+        return error
+
+    def errors(self, offset: int = 0, limit: int = 100) -> list["ImportErrorRecord"]:
+        """Load a page of this session's error records."""
+        if not self.error_id_start or offset >= self.failed or limit < 1:
+            return []
+        limit = min(limit, self.failed - offset)
+        return ImportErrorRecord.load_some(self.error_id_start + offset, limit)
+
+
+class ImportErrorRecord(Entity):
+    """
+    Model for a single failed record of an import session.
+
+    Attributes:
+        session_id (str): ID of the ImportSession
+        record_index (int): Position of the record in the submitted data
+        entity_type (str): `_type` of the record, if any
+        entity_id (str): `_id` of the record, if any
+        error_code (str): Short machine-readable error code
+        message (str): Truncated error message
+    """
+
+    __export__ = False
+
+    session_id = String(max_length=64)
+    record_index = Integer()
+    entity_type = String(max_length=64)
+    entity_id = String(max_length=64)
+    error_code = String(max_length=32)
+    message = String(max_length=256)
+
+
+class CodexHash(Entity):
+    """
+    Model for the index of imported codex bodies by content hash.
+
+    A body is stored once, in the Codex.code it was imported with, where the
+    realm runtime executes it; this only maps its hash to that Codex.
+
+    Attributes:
+        hash (str): SHA-256 hex digest of the code (alias)
+        codex_id (str): _id of the Codex holding the code
+    """
+
+    __alias__ = "hash"
+    __export__ = False
+
+    hash = String(max_length=64)
+    codex_id = String(max_length=64)
+
+    @staticmethod
+    def hash_code(code: str) -> str:
+        """Return the content address of a codex body."""
+        return hashlib.sha256(code.encode()).hexdigest()
+
+    @classmethod
+    def add(cls, code_hash: str, codex_id: str) -> None:
+        """Point a hash at the Codex that was last imported with its body."""
+        entry = cls["hash", code_hash]
+        if not entry:
+            cls(hash=code_hash, codex_id=codex_id)
+        elif entry.codex_id != codex_id:
+            entry.codex_id = codex_id
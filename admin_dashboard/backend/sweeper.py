@@ -0,0 +1,155 @@
+"""
+Admin Dashboard Registration Code Sweeper
+
+Purges registration codes that expired, or were used, longer ago than the
+configured retention. Codes are walked in expiry, then use, order through
+the bucketed indexes, and a sweep stops once it has spent its instruction
+budget, so a backlog of old codes is worked off over several timer ticks
+instead of exhausting a single message.
+"""
+
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from kybra import Duration, TimerId, ic
+from kybra_simple_logging import get_logger
+
+from .models import (
+    EXPIRY_BUCKET_SECONDS,
+    RegistrationCode,
+    RegistrationCodeIndex,
+    RegistrationCodeSweeper,
+)
+
+logger = get_logger("extensions.admin_dashboard.sweeper")
+
+# Instructions a single sweep may use before yielding to the next tick
+SWEEP_INSTRUCTION_BUDGET = 2_000_000_000
+
+_timer_id: Optional[TimerId] = None
+
+
+def start_timer() -> None:
+    """(Re)start the periodic sweep with the configured interval."""
+    global _timer_id
+    if _timer_id is not None:
+        ic.clear_timer(_timer_id)
+    state = RegistrationCodeSweeper.get_state()
+    _timer_id = ic.set_timer_interval(Duration(state.interval_seconds), _on_timer)
+
+
+def _on_timer() -> None:
+    try:
+        result = sweep()
+        if result["purged"]:
+            logger.info(
+                f"Purged {result['expired']} expired and {result['used']} used "
+                f"registration codes (complete: {result['complete']})"
+            )
+    except Exception as e:
+        logger.error(f"Registration code sweep failed: {str(e)}")
+
+
+def sweep(max_instructions: int = SWEEP_INSTRUCTION_BUDGET) -> Dict[str, Any]:
+    """
+    Delete registration codes past the retention period.
+
+    Expired codes are found in the expiry buckets, and used codes in the
+    used buckets, that end before the cutoff; the walk over each stops at
+    the first later bucket. Every index page is purged with one write per
+    index entry, and emptied buckets drop out of the index, so a sweep
+    interrupted by its budget simply continues from the oldest bucket left.
+
+    Returns:
+        Dict with the `expired`, `used` and total `purged` counts, and
+        whether the sweep reached the end of the purgeable buckets
+        (`complete`)
+    """
+    state = RegistrationCodeSweeper.get_state()
+    now = int(datetime.utcnow().timestamp())
+    cutoff = now - state.retention_hours * 3600
+
+    expired, complete = _purge_buckets(
+        "buckets",
+        "expires",
+        cutoff,
+        max_instructions,
+        lambda reg_code: reg_code.expires_at < cutoff,
+    )
+    used = 0
+    if complete:
+        used, complete = _purge_buckets(
+            "used_buckets",
+            "used",
+            cutoff,
+            max_instructions,
+            lambda reg_code: reg_code.used and reg_code.used_at < cutoff,
+        )
+
+    state.pending = 0 if complete else 1
+    state.last_run_at = now
+    state.last_purged = expired + used
+    state.total_purged = state.total_purged + expired + used
+
+    return {
+        "expired": expired,
+        "used": used,
+        "purged": expired + used,
+        "complete": complete,
+    }
+
+
+def _purge_buckets(
+    buckets_key: str,
+    prefix: str,
+    cutoff: int,
+    max_instructions: int,
+    is_purgeable: Callable[[RegistrationCode], bool],
+) -> Tuple[int, bool]:
+    """
+    Purge the codes of the buckets of a paged index that end by the cutoff.
+
+    Returns the number of codes purged and whether all of them were.
+    """
+    purged = 0
+    for bucket in RegistrationCodeIndex.get(buckets_key):
+        if (bucket + 1) * EXPIRY_BUCKET_SECONDS > cutoff:
+            break
+        name = f"{prefix}:{bucket}"
+        for page in RegistrationCodeIndex.get(name):
+            batch, missing = [], []
+            complete = True
+            for value in RegistrationCodeIndex.get(f"{name}:{page}"):
+                if ic.instruction_counter() > max_instructions:
+                    complete = False
+                    break
+                # Expiry pages hold [expires_at, code] pairs, used pages codes
+                code = value[1] if isinstance(value, list) else value
+                reg_code = RegistrationCode["code", code]
+                if not reg_code:
+                    # Deleted without being removed from the index
+                    missing.append(value)
+                elif is_purgeable(reg_code):
+                    batch.append(reg_code)
+            RegistrationCode.purge_many(batch)
+            if missing:
+                RegistrationCode.unindex_missing(name, page, missing)
+            purged += len(batch)
+            if not complete:
+                return purged, False
+        if RegistrationCodeIndex["key", name] is None:
+            RegistrationCodeIndex.remove(buckets_key, bucket)
+    return purged, True
+
+
+def get_status() -> Dict[str, Any]:
+    """Return the sweeper settings and the outcome of its last run."""
+    state = RegistrationCodeSweeper.get_state()
+    return {
+        "retention_hours": state.retention_hours,
+        "interval_seconds": state.interval_seconds,
+        "last_run_at": state.last_run_at,
+        "last_purged": state.last_purged,
+        "total_purged": state.total_purged,
+        "pending": state.pending == 1,
+    }
@@ -0,0 +1,271 @@
+"""
+Admin Dashboard Import Validation
+
+Per-entity-type validators and column coercion for import records.
+Nothing here writes to the database.
+"""
+
+import base64
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from kybra_simple_db import Database
+from kybra_simple_db.properties import Property, Relation
+
+# Compiled validators, keyed by the `_type` value they were built for
+_validators: Dict[str, "EntityValidator"] = {}
+
+
+def resolve_entity_class(type_name: str):
+    """Look up an entity class the same way Entity.deserialize does."""
+    db = Database.get_instance()
+    entity_class = db._entity_types.get(type_name)
+    if not entity_class:
+        entity_class = db._entity_types.get(db._extract_class_name(type_name))
+    return entity_class
+
+
+class EntityValidator:
+    """
+    Validator compiled once per entity type.
+
+    Mirrors the checks that Property.__set__ performs during a real import
+    (type coercion from strings, min/max length and range validators) and
+    adds the alias field as a required field, since it is the lookup key.
+    """
+
+    def __init__(self, entity_class):
+        self.entity_class = entity_class
+        self.type_name = entity_class.get_full_type_name()
+        self.alias_field = getattr(entity_class, "__alias__", None)
+        self.properties: Dict[str, Property] = {}
+        self.relations: Dict[str, List[str]] = {}
+
+        for cls in reversed(entity_class.__mro__):
+            for name, attr in cls.__dict__.items():
+                if name.startswith("_"):
+                    continue
+                if isinstance(attr, Property):
+                    self.properties[name] = attr
+                elif isinstance(attr, Relation):
+                    types = attr.entity_types
+                    self.relations[name] = [types] if isinstance(types, str) else types
+
+        self.required_fields = [self.alias_field] if self.alias_field else []
+
+        # Per-column converters for text input (e.g. CSV), only for non-string types
+        self.coercers = {
+            name: _coercer(prop.type)
+            for name, prop in self.properties.items()
+            if prop.type in (int, float, bool)
+        }
+
+    def coerce(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert text values to the declared property types.
+
+        Empty cells of numeric or boolean columns become None. Values that
+        cannot be converted are left untouched so the import reports them.
+        """
+        for field, convert in self.coercers.items():
+            value = row.get(field)
+            if not isinstance(value, str):
+                continue
+            value = value.strip()
+            if value == "":
+                row[field] = None
+                continue
+            try:
+                row[field] = convert(value)
+            except (ValueError, TypeError):
+                pass
+        return row
+
+    def validate(self, record: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+        """Return a list of (field, code, message) tuples for this record."""
+        errors = []
+
+        for field in self.required_fields:
+            if record.get(field) in (None, ""):
+                errors.append((field, "missing_field", f"{field} is required"))
+
+        for field, prop in self.properties.items():
+            if field not in record or record[field] is None:
+                continue
+            value = record[field]
+            if not isinstance(value, prop.type):
+                if isinstance(value, str) and prop.type in (int, float):
+                    try:
+                        value = prop.type(value)
+                    except (ValueError, TypeError):
+                        errors.append(
+                            (
+                                field,
+                                "invalid_type",
+                                f"{field} must be of type {prop.type.__name__}",
+                            )
+                        )
+                        continue
+                elif isinstance(value, str) and prop.type == bool:
+                    value = value.lower() in ("true", "1", "yes", "on")
+                else:
+                    errors.append(
+                        (
+                            field,
+                            "invalid_type",
+                            f"{field} must be of type {prop.type.__name__}",
+                        )
+                    )
+                    continue
+            if prop.validator and not prop.validator(value):
+                errors.append(
+                    (field, "invalid_value", f"Invalid value for {field}: {value}")
+                )
+
+        if self.type_name == "Codex" or self.entity_class.__name__ == "Codex":
+            code = record.get("code")
+            if isinstance(code, str) and code.startswith("base64:"):
+                try:
+                    base64.b64decode(code[7:], validate=True).decode()
+                except Exception:
+                    errors.append(("code", "invalid_value", "code is not valid base64"))
+
+        return errors
+
+
+def _to_int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        # Accept integral floats such as "8.0" written by spreadsheet tools
+        number = float(value)
+        if not number.is_integer():
+            raise
+        return int(number)
+
+
+def _coercer(target_type):
+    if target_type == bool:
+        return lambda value: value.lower() in ("true", "1", "yes", "on")
+    if target_type == int:
+        return _to_int
+    return target_type
+
+
+def get_validator(type_name: str) -> Optional[EntityValidator]:
+    """Return the compiled validator for a type, building it on first use."""
+    validator = _validators.get(type_name)
+    if validator is None:
+        entity_class = resolve_entity_class(type_name)
+        if not entity_class:
+            return None
+        validator = EntityValidator(entity_class)
+        _validators[type_name] = validator
+    return validator
+
+
+def _exists(type_name: str, entity_class, ref: Any) -> bool:
+    """Check whether an entity exists by ID or alias without loading it."""
+    db = Database.get_instance()
+    ref = str(ref)
+    if db.load(type_name, ref) is not None:
+        return True
+    if getattr(entity_class, "__alias__", None):
+        return db.load(entity_class._alias_key(), ref) is not None
+    return False
+
+
+def validate_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Validate import records without writing anything.
+
+    Relation references are checked against both the existing database and
+    the other records in the same batch, so an import that creates a User
+    and the Services pointing to it validates cleanly.
+
+    Returns:
+        Dict with `valid`, `invalid` counts and the complete `errors` list
+    """
+    errors = []
+    invalid_indexes: Set[int] = set()
+
+    # Keys that the batch itself will create: (class name, id or alias value)
+    batch_keys: Set[Tuple[str, str]] = set()
+    for record in records:
+        if not isinstance(record, dict) or not record.get("_type"):
+            continue
+        class_name = record["_type"].split("::")[-1]
+        if record.get("_id") is not None:
+            batch_keys.add((class_name, str(record["_id"])))
+        validator = get_validator(record["_type"])
+        if validator and validator.alias_field and record.get(validator.alias_field):
+            batch_keys.add((class_name, str(record[validator.alias_field])))
+
+    def add_error(index, record, field, code, message):
+        invalid_indexes.add(index)
+        errors.append(
+            {
+                "index": index,
+                "_type": record.get("_type") if isinstance(record, dict) else None,
+                "_id": record.get("_id") if isinstance(record, dict) else None,
+                "field": field,
+                "code": code,
+                "error": message,
+            }
+        )
+
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            add_error(index, record, None, "invalid_record", "Record must be an object")
+            continue
+
+        type_name = record.get("_type")
+        if not type_name:
+            add_error(index, record, "_type", "missing_type", "_type is required")
+            continue
+
+        validator = get_validator(type_name)
+        if not validator:
+            add_error(
+                index,
+                record,
+                "_type",
+                "unknown_type",
+                f"Unknown entity type: {type_name}",
+            )
+            continue
+
+        for field, code, message in validator.validate(record):
+            add_error(index, record, field, code, message)
+
+        for field, target_types in validator.relations.items():
+            value = record.get(field)
+            if value is None:
+                continue
+            refs = value if isinstance(value, list) else [value]
+            for ref in refs:
+                found = False
+                for target in target_types:
+                    target_name = target.split("::")[-1]
+                    if (target_name, str(ref)) in batch_keys:
+                        found = True
+                        break
+                    target_class = resolve_entity_class(target)
+                    if target_class and _exists(
+                        target_class.get_full_type_name(), target_class, ref
+                    ):
+                        found = True
+                        break
+                if not found:
+                    add_error(
+                        index,
+                        record,
+                        field,
+                        "missing_reference",
+                        f"{field} references unknown {'/'.join(target_types)} '{ref}'",
+                    )
+
+    return {
+        "valid": len(records) - len(invalid_indexes),
+        "invalid": len(invalid_indexes),
+        "errors": errors,
+    }
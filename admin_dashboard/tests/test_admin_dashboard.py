@@ -3,6 +3,8 @@ Admin Dashboard Backend Integration Tests
 Tests data import and administrative functions
 """
 
+import base64
+import hashlib
 import sys
 
 sys.path.append("/app/extension-root/_shared/testing/utils")
@@ -96,6 +98,46 @@ def async_task():
     except Exception as e:
         print_error(f"✗ Exception querying entities: {e}")
 
+    # Test 4: Codex bodies are stored once and can be imported by hash
+    print_info("Test 4: Testing content-addressed codex import...")
+    try:
+        code = "print('hello from a shared codex')"
+        encoded = "base64:" + base64.b64encode(code.encode()).decode()
+        code_hash = hashlib.sha256(code.encode()).hexdigest()
+
+        call_realm_extension(
+            "admin_dashboard",
+            "import_data",
+            {
+                "format": "json",
+                "data": [{"_type": "Codex", "name": "shared_codex_a", "code": encoded}],
+            },
+        )
+
+        result = call_realm_extension(
+            "admin_dashboard",
+            "import_data",
+            {
+                "format": "json",
+                "data": [
+                    {"_type": "Codex", "name": "shared_codex_b", "hash": code_hash}
+                ],
+            },
+        )
+
+        if result.get("success") and result["data"].get("successful") == 1:
+            print_ok("✓ Codex imported by hash without resending its body")
+        else:
+            print_error(f"✗ Codex import by hash failed: {result}")
+
+        hashes = call_realm_extension("admin_dashboard", "get_codex_hashes", {})
+        if code_hash in hashes.get("data", {}).get("hashes", []):
+            print_ok("✓ Codex body listed in stored hashes")
+        else:
+            print_error("✗ Codex body hash not found in stored hashes")
+    except Exception as e:
+        print_error(f"✗ Exception during codex import test: {e}")
+
     print_info("Admin dashboard tests completed!")
 
     return {"success": True, "message": "Admin dashboard tests completed"}
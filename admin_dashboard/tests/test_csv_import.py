@@ -147,6 +147,35 @@ Jane,jane@example.com"""
     except Exception as e:
         print_error(f"✗ Exception during special characters test: {e}")
 
+    # Test 7: Typed columns are coerced to the target entity's property types
+    print_info("Test 7: Test CSV with typed columns and entity_type...")
+    try:
+        csv_typed = """_id,name,symbol,instrument_type,decimals,total_supply
+csv_typed_1,Typed Token,TYP,token,8,1000000
+csv_typed_2,Other Typed Token,OTT,token,6,"""
+
+        result = call_realm_extension(
+            "admin_dashboard",
+            "import_data",
+            {
+                "format": "csv",
+                "data": csv_typed,
+                "entity_type": "Instrument",
+                "batch_size": 1,
+            },
+        )
+
+        if result.get("success"):
+            data = result.get("data", {})
+            if data.get("successful", 0) == 2:
+                print_ok("✓ Typed CSV rows imported in batches")
+            else:
+                print_error(f"✗ Typed CSV import reported: {data}")
+        else:
+            print_error(f"✗ Typed CSV import failed: {result.get('error')}")
+    except Exception as e:
+        print_error(f"✗ Exception during typed CSV test: {e}")
+
     print_info("CSV import tests completed!")
 
     return {"success": True, "message": "CSV import tests completed"}
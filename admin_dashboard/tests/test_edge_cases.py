@@ -303,6 +303,65 @@ def async_task():
     except Exception as e:
         print_error(f"✗ Exception during long values test: {e}")
 
+    # Test 11: Dry-run validation reports every invalid record
+    print_info("Test 11: Validate-only import...")
+    try:
+        validate_data = [
+            {"_type": "Instrument", "_id": "validate_only_1", "name": "Valid Token"},
+            {"_type": "NonExistentEntity", "_id": "validate_only_2"},
+            {"_type": "Instrument", "_id": "validate_only_3", "name": 12345},
+        ]
+
+        result = call_realm_extension(
+            "admin_dashboard",
+            "import_data",
+            {"format": "json", "data": validate_data, "validate_only": True},
+        )
+
+        if result.get("success"):
+            data = result.get("data", {})
+            if data.get("invalid") == 2 and len(data.get("errors", [])) == 2:
+                print_ok("✓ Validate-only import reported all invalid records")
+            else:
+                print_error(f"✗ Unexpected validation report: {data}")
+        else:
+            print_error(f"✗ Validate-only import failed: {result.get('error')}")
+    except Exception as e:
+        print_error(f"✗ Exception during validate-only test: {e}")
+
+    # Test 12: Every failed record is kept in the paginated error ledger
+    print_info("Test 12: Import error ledger pagination...")
+    try:
+        failing_data = [
+            {"_type": "NonExistentEntity", "_id": f"ledger_{i}"} for i in range(15)
+        ]
+
+        result = call_realm_extension(
+            "admin_dashboard", "import_data", {"format": "json", "data": failing_data}
+        )
+        session_id = result.get("data", {}).get("session_id")
+
+        collected = []
+        cursor = 0
+        while session_id and cursor is not None:
+            page = call_realm_extension(
+                "admin_dashboard",
+                "get_import_errors",
+                {"session_id": session_id, "cursor": cursor, "limit": 10},
+            )
+            if not page.get("success"):
+                print_error(f"✗ Failed to read error ledger: {page.get('error')}")
+                break
+            collected.extend(page["data"]["errors"])
+            cursor = page["data"]["next_cursor"]
+
+        if [error["index"] for error in collected] == list(range(15)):
+            print_ok("✓ Error ledger returned all 15 failed records")
+        else:
+            print_error(f"✗ Error ledger returned {len(collected)} records")
+    except Exception as e:
+        print_error(f"✗ Exception during error ledger test: {e}")
+
     print_info("Edge case and error handling tests completed!")
 
     return {"success": True, "message": "Edge case tests completed"}
@@ -118,6 +118,118 @@ def async_task():
     except Exception as e:
         print_error(f"✗ Exception testing invalid code: {e}")
 
+    # Test 5: Per-user listing only returns that user's codes
+    print_info("Test 5: List registration codes by user...")
+    try:
+        for _ in range(2):
+            call_realm_extension(
+                "admin_dashboard",
+                "generate_registration_url",
+                {
+                    "user_id": "indexed_user",
+                    "email": "indexed@example.com",
+                    "created_by": "admin",
+                    "frontend_url": "http://localhost:8000",
+                },
+            )
+
+        result = call_realm_extension(
+            "admin_dashboard",
+            "get_registration_codes",
+            {"user_id": "indexed_user", "include_used": True},
+        )
+
+        codes = result.get("data", [])
+        if len(codes) >= 2 and all(c["user_id"] == "indexed_user" for c in codes):
+            print_ok(f"✓ Found {len(codes)} codes for indexed_user")
+        else:
+            print_error(f"✗ Unexpected per-user listing: {result}")
+    except Exception as e:
+        print_error(f"✗ Exception listing codes by user: {e}")
+
+    # Test 6: Sweeper keeps live codes and reports what it purged
+    print_info("Test 6: Sweep expired and used registration codes...")
+    try:
+        result = call_realm_extension(
+            "admin_dashboard",
+            "configure_registration_code_sweeper",
+            {"retention_hours": 24},
+        )
+        if result.get("success") and result["data"]["retention_hours"] == 24:
+            print_ok("✓ Sweeper retention configured")
+        else:
+            print_error(f"✗ Failed to configure sweeper: {result}")
+
+        result = call_realm_extension("admin_dashboard", "sweep_registration_codes", {})
+        remaining = call_realm_extension(
+            "admin_dashboard", "get_registration_codes", {"user_id": "indexed_user"}
+        )
+        if result.get("success") and len(remaining.get("data", [])) >= 2:
+            print_ok(f"✓ Sweep purged {result['data']['purged']} codes")
+        else:
+            print_error(f"✗ Unexpected sweep result: {result}")
+    except Exception as e:
+        print_error(f"✗ Exception sweeping codes: {e}")
+
+    # Test 7: Bulk generation returns one CSV row per user
+    print_info("Test 7: Generate registration URLs in bulk...")
+    try:
+        users = [
+            {"user_id": f"bulk_user_{i}", "email": f"bulk{i}@example.com"}
+            for i in range(50)
+        ]
+        result = call_realm_extension(
+            "admin_dashboard",
+            "generate_registration_urls_bulk",
+            {"users": users, "frontend_url": "http://localhost:8000"},
+        )
+
+        if result.get("success"):
+            lines = result["data"]["content"].strip().splitlines()
+            codes = {line.split(",")[2] for line in lines[1:]}
+            if len(lines) == 51 and len(codes) == 50:
+                print_ok("✓ Bulk generation returned 50 distinct codes")
+            else:
+                print_error(f"✗ Unexpected bulk output with {len(lines)} lines")
+        else:
+            print_error(f"✗ Bulk generation failed: {result.get('error')}")
+    except Exception as e:
+        print_error(f"✗ Exception generating codes in bulk: {e}")
+
+    # Test 8: Paginated listing visits every code once
+    print_info("Test 8: Paginated registration code listing...")
+    try:
+        seen = []
+        cursor = None
+        total = None
+        while True:
+            result = call_realm_extension(
+                "admin_dashboard",
+                "get_registration_codes",
+                {
+                    "include_used": True,
+                    "order_by": "expires",
+                    "limit": 20,
+                    "cursor": cursor,
+                    "fields": ["code", "expires_at"],
+                },
+            )
+            if not result.get("success"):
+                print_error(f"✗ Paginated listing failed: {result.get('error')}")
+                break
+            seen.extend(row["code"] for row in result["data"])
+            total = result["total"]
+            cursor = result["next_cursor"]
+            if not cursor:
+                break
+
+        if total is not None and len(seen) == len(set(seen)) == total:
+            print_ok(f"✓ Listed all {total} codes in pages of 20")
+        else:
+            print_error(f"✗ Listed {len(seen)} codes, total reported {total}")
+    except Exception as e:
+        print_error(f"✗ Exception during paginated listing: {e}")
+
     print_info("Registration code tests completed!")
 
     return {"success": True, "message": "Registration code tests completed"}
@@ -0,0 +1,157 @@
+"""
+Citizen Dashboard Response Cache
+
+Keeps the serialized responses of the dashboard endpoints in a bounded
+LRU cache, keyed by endpoint, user and request arguments. Writes to a
+user's Service, TaxRecord and User records drop the user's cached
+responses, so a stale response is never returned and is rebuilt on the
+next read.
+
+Field writes and deletions are seen by the kybra_simple_db `on_event`
+hook of these types. Relation writes fire no hook, so the relation
+methods of User, UserProfile, Service and TaxRecord are wrapped instead:
+a change of one of the user's TRACKED_RELATIONS, from either side, such
+as a change of the user's profiles or moving a record to another user,
+drops the responses of the users involved.
+
+Only users with cached responses are tracked, so the cache holds at most
+CACHE_SIZE responses and no state for any other user. It is held in
+memory and starts empty after every upgrade.
+"""
+
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from ggg import Service, TaxRecord, User, UserProfile
+from kybra_simple_db import ACTION_DELETE, ACTION_MODIFY
+from kybra_simple_db.properties import PROPERTY_STORAGE_PREFIX
+from kybra_simple_logging import get_logger
+
+logger = get_logger("citizen_dashboard.cache")
+
+# Maximum number of responses kept
+CACHE_SIZE = 200
+
+# User relations that cached responses are built from
+TRACKED_RELATIONS = ("profiles", "services", "tax_records")
+
+_responses: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+# Keys of the cached responses of each user that has any
+_user_keys: Dict[str, Set[Tuple[str, str, str]]] = {}
+_hooks_installed = False
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop the cached responses of a user."""
+    for key in _user_keys.pop(user_id, ()):
+        del _responses[key]
+
+
+def _key(endpoint: str, user_id: str, params: Dict[str, Any]) -> Tuple[str, str, str]:
+    return endpoint, user_id, json.dumps(params, sort_keys=True)
+
+
+def _cacheable(user_id: str) -> bool:
+    # Anonymous responses cover every record, so no user write drops them
+    return bool(user_id) and user_id != "anonymous"
+
+
+def get(endpoint: str, user_id: str, params: Dict[str, Any]) -> Optional[str]:
+    """Get a cached response still valid for the user, or None."""
+    if not _cacheable(user_id):
+        return None
+    key = _key(endpoint, user_id, params)
+    response = _responses.get(key)
+    if response is not None:
+        _responses.move_to_end(key)
+    return response
+
+
+def put(endpoint: str, user_id: str, params: Dict[str, Any], response: str) -> None:
+    """Cache a response built for the user."""
+    if not _cacheable(user_id):
+        return
+    key = _key(endpoint, user_id, params)
+    _responses[key] = response
+    _responses.move_to_end(key)
+    _user_keys.setdefault(user_id, set()).add(key)
+    while len(_responses) > CACHE_SIZE:
+        evicted, _ = _responses.popitem(last=False)
+        keys = _user_keys[evicted[1]]
+        keys.discard(evicted)
+        if not keys:
+            del _user_keys[evicted[1]]
+
+
+def _owner_id(entity) -> Optional[str]:
+    if isinstance(entity, User):
+        return entity.id
+    return entity.user.id if entity.user else None
+
+
+def _is_loading(entity, field_name: str) -> bool:
+    # Loading an entity sets its fields while saving is off, before they are
+    # stored; fields never set before are not stored either, but are then
+    # assigned with saving on
+    return (
+        getattr(entity, "_do_not_save", False)
+        and f"_{PROPERTY_STORAGE_PREFIX}_{field_name}" not in entity.__dict__
+    )
+
+
+def _versioned(previous_hook):
+    """Wrap an entity hook so that writes drop the owning user's responses."""
+
+    def on_event(entity, field_name, old_value, new_value, action):
+        try:
+            if action == ACTION_DELETE or (
+                action == ACTION_MODIFY
+                and old_value != new_value
+                and not _is_loading(entity, field_name)
+            ):
+                user_id = _owner_id(entity)
+                if user_id:
+                    invalidate_user(user_id)
+        except Exception as e:
+            logger.error(f"Error invalidating cached responses: {str(e)}")
+        if previous_hook:
+            return previous_hook(entity, field_name, old_value, new_value, action)
+        return True, new_value
+
+    return staticmethod(on_event)
+
+
+def _relation_tracked(method):
+    """Wrap a relation method so that it drops the responses of the users
+    whose tracked relations it changes."""
+
+    def wrapper(self, from_rel: str, to_rel: str, other) -> None:
+        method(self, from_rel, to_rel, other)
+        try:
+            for entity, relation in ((self, from_rel), (other, to_rel)):
+                if isinstance(entity, User) and relation in TRACKED_RELATIONS:
+                    invalidate_user(entity.id)
+        except Exception as e:
+            logger.error(f"Error invalidating cached responses: {str(e)}")
+
+    return wrapper
+
+
+def install_hooks() -> None:
+    """
+    Drop cached responses on Service, TaxRecord and User writes, and on
+    changes of the users' tracked relations.
+
+    Hooks already attached to these types, such as the summary counters,
+    keep running after the invalidation.
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    for entity_type in (Service, TaxRecord, User):
+        entity_type.on_event = _versioned(getattr(entity_type, "on_event", None))
+    for entity_type in (Service, TaxRecord, User, UserProfile):
+        for name in ("add_relation", "remove_relation"):
+            setattr(entity_type, name, _relation_tracked(getattr(entity_type, name)))
+    _hooks_installed = True
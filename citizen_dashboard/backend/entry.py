@@ -5,12 +5,34 @@ from typing import Any, Dict
 
 from ggg import Service, TaxRecord, User
 from kybra import Async
+from kybra_simple_db import Database
 from kybra_simple_logging import get_logger
 
+from . import cache, summary
+from .users import get_user
+
 # Initialize logger
 logger = get_logger("citizen_dashboard")
 
 
+def initialize(args: str):
+    """
+    Attach the summary counter hooks to Service and TaxRecord, and the
+    response cache hooks to Service, TaxRecord and User.
+
+    Called once during canister initialization.
+    """
+    summary.install_hooks()
+    cache.install_hooks()
+
+
+def _cached_response(endpoint: str, user_id: str, params: Dict[str, Any]):
+    """Get a cached response of an endpoint for the user, or None."""
+    # Counting new records in the summary invalidates their users' responses
+    summary.flush_pending()
+    return cache.get(endpoint, user_id, params)
+
+
 def _service_to_dict(service: Service) -> Dict[str, Any]:
     """Convert Service entity to dictionary format"""
     return {
@@ -37,43 +59,188 @@ def _tax_record_to_dict(tax_record: TaxRecord) -> Dict[str, Any]:
     }
 
 
+def _user_records(user_id: str, relation: str, entity_type) -> list:
+    """
+    Get a user's records through the reverse side of their `user` relation.
+
+    User.services and User.tax_records are stored with the user, so this
+    costs one alias lookup plus the user's own records instead of a scan
+    over every record in the realm. Without a user_id all records are
+    returned.
+    """
+    if not user_id or user_id == "anonymous":
+        return list(entity_type.instances())
+    user = get_user(user_id)
+    if not user:
+        return []
+    return list(getattr(user, relation))
+
+
+def _user_record_page(
+    user_id: str, relation: str, entity_type, offset: int = 0, limit: int = None
+) -> list:
+    """
+    Load one page of a user's records.
+
+    Reads the stored references of the user's relation without loading the
+    user, whose load would bring in every related record, and then loads
+    only the referenced records of the page.
+    """
+    db = Database.get_instance()
+    user_entity_id = db.load(User._alias_key(), user_id)
+    if not user_entity_id:
+        return []
+    user_data = db.load(User.get_full_type_name(), user_entity_id) or {}
+
+    refs = user_data.get(relation) or []
+    if not isinstance(refs, list):
+        refs = [refs]
+    end = offset + int(limit) if limit else None
+
+    records = []
+    alias_field = getattr(entity_type, "__alias__", None)
+    for ref in refs[offset:end]:
+        # References are stored by alias value, or by _id when there is none
+        record = entity_type[alias_field, ref] if alias_field else None
+        record = record or entity_type.load(str(ref))
+        if record:
+            records.append(record)
+    return records
+
+
+def _summary_data(user_id: str) -> Dict[str, Any]:
+    """Build the dashboard summary section"""
+    if user_id and user_id != "anonymous":
+        # Counters maintained on Service and TaxRecord writes
+        citizen_summary = summary.get_summary(user_id)
+        services_count = citizen_summary.services_count
+        services_approaching = citizen_summary.services_approaching
+        tax_records_count = citizen_summary.tax_records
+        tax_overdue = citizen_summary.tax_overdue
+    else:
+        all_services = Service.instances()
+        all_tax_records = TaxRecord.instances()
+        services_count = len(all_services)
+        services_approaching = len(
+            [s for s in all_services if s.status == "Approaching"]
+        )
+        tax_records_count = len(all_tax_records)
+        tax_overdue = len([t for t in all_tax_records if t.status == "Overdue"])
+
+    return {
+        "user_name": user_id,
+        "services_count": services_count,
+        "services_approaching": services_approaching,
+        "tax_records": tax_records_count,
+        "tax_overdue": tax_overdue,
+        "personal_data_items": 0,
+        "personal_data_updated": 0,
+    }
+
+
+def _services_data(user_id: str, services: list = None) -> Dict[str, Any]:
+    """Build the public services section"""
+    if services is None:
+        services = _user_records(user_id, "services", Service)
+
+    # Convert to dict format
+    services_list = [_service_to_dict(s) for s in services]
+    return {"services": services_list, "total_count": len(services_list)}
+
+
+def _tax_data(
+    user_id: str, offset: int = 0, limit: int = None, tax_records: list = None
+) -> Dict[str, Any]:
+    """
+    Build the tax information section
+
+    `tax_records` are the user's records when the caller has loaded them
+    already; otherwise only the requested page is loaded.
+    """
+    end = offset + int(limit) if limit else None
+
+    if user_id and user_id != "anonymous":
+        # Totals maintained on TaxRecord writes
+        citizen_summary = summary.get_summary(user_id)
+        status_totals = json.loads(citizen_summary.tax_status_totals)
+        period_totals = json.loads(citizen_summary.tax_period_totals)
+        total_count = citizen_summary.tax_records
+        if tax_records is None:
+            tax_records = _user_record_page(
+                user_id, "tax_records", TaxRecord, offset, limit
+            )
+        else:
+            tax_records = tax_records[offset:end]
+    else:
+        tax_records = list(TaxRecord.instances())
+        status_totals, period_totals = {}, {}
+        for t in tax_records:
+            amount = t.amount or 0
+            status_totals[t.status] = status_totals.get(t.status, 0) + amount
+            period_totals[t.period] = period_totals.get(t.period, 0) + amount
+        total_count = len(tax_records)
+        tax_records = tax_records[offset:end]
+
+    # Convert to dict format
+    tax_records_list = [_tax_record_to_dict(t) for t in tax_records]
+
+    # Calculate summary
+    total_paid = status_totals.get("Paid", 0)
+    total_pending = status_totals.get("Pending", 0)
+    total_overdue = status_totals.get("Overdue", 0)
+
+    tax_summary = {
+        "total_paid": total_paid,
+        "total_pending": total_pending,
+        "total_overdue": total_overdue,
+        "total_amount": total_paid + total_pending + total_overdue,
+        "totals_by_period": period_totals,
+    }
+
+    next_offset = offset + len(tax_records_list)
+    return {
+        "tax_records": tax_records_list,
+        "summary": tax_summary,
+        "total_count": total_count,
+        "next_offset": next_offset if next_offset < total_count else None,
+    }
+
+
+def _personal_data_to_dict(user: User) -> Dict[str, Any]:
+    """Convert User entity to the personal data section"""
+    return {
+        "name": user.name or "",
+        "id_number": user.id or "",
+        "date_of_birth": "",
+        "citizenship_status": (
+            "Full Citizenship"
+            if user.profiles and "member" in user.profiles
+            else "Pending"
+        ),
+        "registration_date": (
+            str(user.timestamp_created) if hasattr(user, "timestamp_created") else ""
+        ),
+        "address": "",
+        "email": user.email or "",
+        "phone": "",
+    }
+
+
 def get_dashboard_summary(args: str) -> Async[str]:
     try:
-        args = "{}"
         logger.info(f"get_dashboard_summary called with args: {args}")
-        params = json.loads(args)
+        params = json.loads(args) if args else {}
         user_id = params.get("user_id", "anonymous")
 
-        # Get data from database
-        all_services = Service.instances()
-        all_tax_records = TaxRecord.instances()
-        
-        # Filter by user if provided
-        if user_id and user_id != "anonymous":
-            user_services = [s for s in all_services if s.user and s.user.id == user_id]
-            user_tax_records = [t for t in all_tax_records if t.user and t.user.id == user_id]
-        else:
-            user_services = list(all_services)
-            user_tax_records = list(all_tax_records)
-        
-        # Calculate summary
-        services_approaching = len([s for s in user_services if s.status == "Approaching"])
-        tax_overdue = len([t for t in user_tax_records if t.status == "Overdue"])
-        
-        summary_data = {
-            "user_name": user_id,
-            "services_count": len(user_services),
-            "services_approaching": services_approaching,
-            "tax_records": len(user_tax_records),
-            "tax_overdue": tax_overdue,
-            "personal_data_items": 0,
-            "personal_data_updated": 0,
-        }
-
-        response = {"success": True, "data": summary_data}
+        cached = _cached_response("get_dashboard_summary", user_id, params)
+        if cached:
+            return cached
+
+        response = json.dumps({"success": True, "data": _summary_data(user_id)})
+        cache.put("get_dashboard_summary", user_id, params, response)
 
         logger.info(f"get_dashboard_summary successful for user: {user_id}")
-        return json.dumps(response)
+        return response
     except Exception as e:
         logger.error(
             f"Error in get_dashboard_summary: {str(e)}\n{traceback.format_exc()}"
@@ -96,25 +263,15 @@ def get_public_services(args: str) -> Async[str]:
         params = json.loads(args)
         user_id = params.get("user_id", "anonymous")
 
-        # Get services from database
-        all_services = Service.instances()
-        
-        # Filter by user if user_id provided
-        if user_id and user_id != "anonymous":
-            services = [s for s in all_services if s.user and s.user.id == user_id]
-        else:
-            services = list(all_services)
-        
-        # Convert to dict format
-        services_list = [_service_to_dict(s) for s in services]
+        cached = _cached_response("get_public_services", user_id, params)
+        if cached:
+            return cached
 
-        response = {
-            "success": True,
-            "data": {"services": services_list, "total_count": len(services_list)},
-        }
+        response = json.dumps({"success": True, "data": _services_data(user_id)})
+        cache.put("get_public_services", user_id, params, response)
 
         logger.info(f"get_public_services successful for user: {user_id}")
-        return json.dumps(response)
+        return response
     except Exception as e:
         logger.error(f"Error in get_public_services: {str(e)}\n{traceback.format_exc()}")
         return json.dumps({"success": False, "error": str(e)})
@@ -125,7 +282,8 @@ def get_tax_information(args: str) -> str:
     Get tax information for the citizen.
 
     Args:
-        args (str): JSON string containing user_id
+        args (str): JSON string containing user_id, and optionally `limit`
+            and `offset` to page through the tax records
 
     Returns:
         str: JSON string with tax information data
@@ -134,44 +292,20 @@ def get_tax_information(args: str) -> str:
         logger.info(f"get_tax_information called with args: {args}")
         params = json.loads(args) if args else {}
         user_id = params.get("user_id", "anonymous")
+        offset = int(params.get("offset", 0))
+        limit = params.get("limit")
 
-        # Get tax records from database
-        all_tax_records = TaxRecord.instances()
-        
-        # Filter by user if user_id provided
-        if user_id and user_id != "anonymous":
-            tax_records = [t for t in all_tax_records if t.user and t.user.id == user_id]
-        else:
-            tax_records = list(all_tax_records)
-        
-        # Convert to dict format
-        tax_records_list = [_tax_record_to_dict(t) for t in tax_records]
-
-        # Calculate summary
-        total_paid = sum(
-            record["amount"] for record in tax_records_list if record["status"] == "Paid"
-        )
-        total_pending = sum(
-            record["amount"] for record in tax_records_list if record["status"] == "Pending"
-        )
-        total_overdue = sum(
-            record["amount"] for record in tax_records_list if record["status"] == "Overdue"
-        )
-
-        summary = {
-            "total_paid": total_paid,
-            "total_pending": total_pending,
-            "total_overdue": total_overdue,
-            "total_amount": total_paid + total_pending + total_overdue,
-        }
+        cached = _cached_response("get_tax_information", user_id, params)
+        if cached:
+            return cached
 
-        response = {
-            "success": True,
-            "data": {"tax_records": tax_records_list, "summary": summary},
-        }
+        response = json.dumps(
+            {"success": True, "data": _tax_data(user_id, offset, limit)}
+        )
+        cache.put("get_tax_information", user_id, params, response)
 
         logger.info(f"get_tax_information successful for user: {user_id}")
-        return json.dumps(response)
+        return response
     except Exception as e:
         logger.error(
             f"Error in get_tax_information: {str(e)}\n{traceback.format_exc()}"
@@ -190,36 +324,98 @@ def get_personal_data(args: str) -> str:
         str: JSON string with personal data
     """
     try:
-        args = "{}"
         logger.info(f"get_personal_data called with args: {args}")
-        params = json.loads(args)
+        params = json.loads(args) if args else {}
         user_id = params.get("user_id", "anonymous")
 
-        # Get user from database
-        user = None
-        for u in User.instances():
-            if u.id == user_id:
-                user = u
-                break
-        
+        cached = _cached_response("get_personal_data", user_id, params)
+        if cached:
+            return cached
+
+        user = get_user(user_id)
         if not user:
             return json.dumps({"success": False, "error": "User not found"})
 
-        personal_data = {
-            "name": user.name or "",
-            "id_number": user.id or "",
-            "date_of_birth": "",
-            "citizenship_status": "Full Citizenship" if user.profiles and "member" in user.profiles else "Pending",
-            "registration_date": str(user.timestamp_created) if hasattr(user, 'timestamp_created') else "",
-            "address": "",
-            "email": user.email or "",
-            "phone": "",
-        }
+        personal_data = _personal_data_to_dict(user)
 
-        response = {"success": True, "data": {"personal_data": personal_data}}
+        response = json.dumps(
+            {"success": True, "data": {"personal_data": personal_data}}
+        )
+        cache.put("get_personal_data", user_id, params, response)
 
         logger.info(f"get_personal_data successful for user: {user_id}")
-        return json.dumps(response)
+        return response
     except Exception as e:
         logger.error(f"Error in get_personal_data: {str(e)}\n{traceback.format_exc()}")
         return json.dumps({"success": False, "error": str(e)})
+
+
+# Sections get_dashboard_bundle can return
+DASHBOARD_SECTIONS = ("summary", "services", "tax", "personal_data")
+
+
+def get_dashboard_bundle(args: str) -> Async[str]:
+    """
+    Get several dashboard sections in one call.
+
+    The user and their related records are loaded once and shared by the
+    sections that need them.
+
+    Args:
+        args (str): JSON string containing user_id and `sections`, a list of
+            "summary", "services", "tax" and "personal_data" (default: all),
+            plus the optional tax `limit` and `offset`
+
+    Returns:
+        str: JSON string with one entry per requested section
+    """
+    try:
+        logger.info(f"get_dashboard_bundle called with args: {args}")
+        params = json.loads(args) if args else {}
+        user_id = params.get("user_id", "anonymous")
+        sections = params.get("sections") or list(DASHBOARD_SECTIONS)
+
+        unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+        if unknown:
+            return json.dumps(
+                {"success": False, "error": f"Unknown sections: {unknown}"}
+            )
+
+        cached = _cached_response("get_dashboard_bundle", user_id, params)
+        if cached:
+            return cached
+
+        # One load of the user brings in their services and tax records
+        user = None
+        needs_user = {"services", "tax", "personal_data"} & set(sections)
+        if needs_user and user_id and user_id != "anonymous":
+            user = get_user(user_id)
+
+        data = {}
+        if "summary" in sections:
+            data["summary"] = _summary_data(user_id)
+        if "services" in sections:
+            services = list(user.services) if user else None
+            data["services"] = _services_data(user_id, services)
+        if "tax" in sections:
+            data["tax"] = _tax_data(
+                user_id,
+                int(params.get("offset", 0)),
+                params.get("limit"),
+                list(user.tax_records) if user else None,
+            )
+        if "personal_data" in sections:
+            data["personal_data"] = (
+                {"personal_data": _personal_data_to_dict(user)} if user else None
+            )
+
+        response = json.dumps({"success": True, "data": data})
+        cache.put("get_dashboard_bundle", user_id, params, response)
+
+        logger.info(f"get_dashboard_bundle successful for user: {user_id}")
+        return response
+    except Exception as e:
+        logger.error(
+            f"Error in get_dashboard_bundle: {str(e)}\n{traceback.format_exc()}"
+        )
+        return json.dumps({"success": False, "error": str(e)})
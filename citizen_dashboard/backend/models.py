@@ -0,0 +1,71 @@
+"""
+Citizen Dashboard Models
+
+This module contains database models specific to the citizen dashboard extension.
+"""
+
+from core.extensions import create_extension_entity_class
+from kybra_simple_db import Integer, String
+
+ExtensionEntity = create_extension_entity_class("citizen_dashboard")
+
+
+class CitizenSummary(ExtensionEntity):
+    """
+    Model for the dashboard counters of one citizen.
+
+    Stored with namespace: ext_citizen_dashboard::CitizenSummary
+
+    Attributes:
+        user_id (str): ID of the user (alias)
+        version (int): Summary layout the counters were built with
+        services_count (int): Number of services of the user
+        services_approaching (int): Services with status "Approaching"
+        tax_records (int): Number of tax records of the user
+        tax_overdue (int): Tax records with status "Overdue"
+        tax_status_totals (str): JSON object of tax amounts by status
+        tax_period_totals (str): JSON object of tax amounts by period
+    """
+
+    __alias__ = "user_id"
+    __export__ = False
+
+    user_id = String()
+    version = Integer(default=1)
+    services_count = Integer(default=0)
+    services_approaching = Integer(default=0)
+    tax_records = Integer(default=0)
+    tax_overdue = Integer(default=0)
+    tax_status_totals = String(default="{}")
+    tax_period_totals = String(default="{}")
+
+
+class PendingSummaryRecord(ExtensionEntity):
+    """
+    Model for a new Service or TaxRecord not yet counted in its user's summary.
+
+    Records are created before their user relation is attached, so they are
+    queued here and counted once the user is known.
+
+    Attributes:
+        record_key (str): "<entity type>:<entity _id>" (alias)
+    """
+
+    __alias__ = "record_key"
+    __export__ = False
+
+    record_key = String(max_length=128)
+
+
+class DashboardState(ExtensionEntity):
+    """
+    Model for internal key/value state of the citizen dashboard.
+
+    Stored with namespace: ext_citizen_dashboard::DashboardState
+    """
+
+    __alias__ = "key"
+    __export__ = False
+
+    key = String()
+    value = String()
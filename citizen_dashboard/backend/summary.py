@@ -0,0 +1,251 @@
+"""
+Citizen Dashboard Summary Counters
+
+Keeps a CitizenSummary per user up to date from Service and TaxRecord
+writes, through the kybra_simple_db `on_event` hook of both entity types:
+
+- a new record is queued in PendingSummaryRecord, because its user
+  relation is attached after the hook runs, and is counted by
+  flush_pending(), at most FLUSH_BATCH_SIZE records per call, on the next
+  summary read or, for a larger backlog, from a timer;
+- a change to a tracked field (status, plus amount and period of tax
+  records) moves the record's contribution from the old value to the
+  new one;
+- a deleted record's contribution is subtracted.
+
+A summary is built from the user's records the first time it is read,
+and rebuilt when SUMMARY_VERSION changes.
+Moving a record to another user is not tracked.
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+from ggg import Service, TaxRecord, User
+from kybra import Duration, TimerId, ic
+from kybra_simple_db import ACTION_CREATE, ACTION_DELETE, ACTION_MODIFY
+from kybra_simple_db.properties import PROPERTY_STORAGE_PREFIX
+from kybra_simple_logging import get_logger
+
+from . import cache
+from .models import CitizenSummary, DashboardState, PendingSummaryRecord
+
+logger = get_logger("citizen_dashboard.summary")
+
+# Bumped whenever the summary gains fields, so stored summaries are rebuilt
+SUMMARY_VERSION = 2
+
+# Entity types counted in the summary, by class name
+RECORD_TYPES = {"Service": Service, "TaxRecord": TaxRecord}
+
+# Fields whose changes alter a record's contribution, by class name
+TRACKED_FIELDS = {"Service": ("status",), "TaxRecord": ("status", "amount", "period")}
+
+# Queued records counted per flush_pending call
+FLUSH_BATCH_SIZE = 500
+
+_flush_timer_id: Optional[TimerId] = None
+_hooks_installed = False
+
+
+def _contribution(record_type: str, values: Dict[str, Any]) -> Dict[Any, Any]:
+    """
+    Totals a record with these field values adds to its user's summary.
+
+    Plain keys are integer counters; (field, name) keys are amounts added
+    to the `name` entry of a JSON totals field.
+    """
+    if record_type == "Service":
+        return {
+            "services_count": 1,
+            "services_approaching": int(values.get("status") == "Approaching"),
+        }
+    amount = values.get("amount") or 0
+    return {
+        "tax_records": 1,
+        "tax_overdue": int(values.get("status") == "Overdue"),
+        ("tax_status_totals", values.get("status") or ""): amount,
+        ("tax_period_totals", values.get("period") or ""): amount,
+    }
+
+
+def _values(entity) -> Dict[str, Any]:
+    return {
+        field: getattr(entity, field, None)
+        for field in TRACKED_FIELDS[entity.__class__.__name__]
+    }
+
+
+def _add_amount(amounts: Dict[str, float], name: str, amount: float) -> None:
+    # Rounded so that repeated additions and removals do not leave float noise
+    amounts[name] = round(amounts.get(name, 0) + amount, 6)
+
+
+def _apply(user_id: str, contribution: Dict[Any, Any], sign: int) -> None:
+    # Summaries that were never read are built from scratch on first read
+    summary = CitizenSummary["user_id", user_id]
+    if not summary:
+        return
+    totals = {}
+    for key, delta in contribution.items():
+        if not delta:
+            continue
+        if isinstance(key, tuple):
+            field, name = key
+            if field not in totals:
+                totals[field] = json.loads(getattr(summary, field) or "{}")
+            _add_amount(totals[field], name, sign * delta)
+        else:
+            setattr(summary, key, getattr(summary, key) + sign * delta)
+    for field, amounts in totals.items():
+        setattr(summary, field, json.dumps(amounts))
+
+
+def _record_key(entity) -> str:
+    return f"{entity.__class__.__name__}:{entity._id}"
+
+
+def _on_record_event(entity, field_name, old_value, new_value, action):
+    record_type = entity.__class__.__name__
+    try:
+        if action == ACTION_DELETE:
+            pending = PendingSummaryRecord["record_key", _record_key(entity)]
+            if pending:
+                pending.delete()
+            elif entity.user:
+                _apply(entity.user.id, _contribution(record_type, _values(entity)), -1)
+        elif action == ACTION_CREATE:
+            if not getattr(entity, "_summary_queued", False):
+                entity._summary_queued = True
+                PendingSummaryRecord(record_key=_record_key(entity))
+        elif (
+            action == ACTION_MODIFY
+            and field_name in TRACKED_FIELDS[record_type]
+            # Loading a record also sets its fields, before they are stored
+            and f"_{PROPERTY_STORAGE_PREFIX}_{field_name}" in entity.__dict__
+            and old_value != new_value
+            and entity.user
+            and not PendingSummaryRecord["record_key", _record_key(entity)]
+        ):
+            old_values = _values(entity)
+            new_values = dict(old_values, **{field_name: new_value})
+            _apply(entity.user.id, _contribution(record_type, old_values), -1)
+            _apply(entity.user.id, _contribution(record_type, new_values), 1)
+    except Exception as e:
+        logger.error(f"Error updating citizen summary for {record_type}: {str(e)}")
+    return True, new_value
+
+
+def _chained(previous_hook):
+    """Wrap an entity hook so that the summary counters are updated first."""
+
+    def on_event(entity, field_name, old_value, new_value, action):
+        _on_record_event(entity, field_name, old_value, new_value, action)
+        if previous_hook:
+            return previous_hook(entity, field_name, old_value, new_value, action)
+        return True, new_value
+
+    return staticmethod(on_event)
+
+
+def install_hooks() -> None:
+    """
+    Attach the summary hook to Service and TaxRecord.
+
+    Hooks already attached to these types keep running after it.
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    for entity_type in RECORD_TYPES.values():
+        entity_type.on_event = _chained(getattr(entity_type, "on_event", None))
+    _hooks_installed = True
+
+
+def _schedule_flush() -> None:
+    global _flush_timer_id
+    if _flush_timer_id is None:
+        _flush_timer_id = ic.set_timer(Duration(0), _on_flush_timer)
+
+
+def _on_flush_timer() -> None:
+    global _flush_timer_id
+    _flush_timer_id = None
+    try:
+        flush_pending()
+    except Exception as e:
+        logger.error(f"Error counting queued summary records: {str(e)}")
+
+
+def flush_pending(limit: int = FLUSH_BATCH_SIZE) -> int:
+    """
+    Count up to `limit` queued new records in their users' summaries.
+
+    The cached responses of those users are invalidated as well. When more
+    records are queued, a timer counts the next batch.
+    """
+    # Queue entries get increasing IDs; everything up to `flushed` is done
+    state = DashboardState["key", "summary_flushed_id"]
+    flushed = int(state.value) if state else 0
+    max_id = PendingSummaryRecord.max_id()
+    if max_id <= flushed:
+        return 0
+
+    # Entries counted and deleted ahead of the cursor are skipped by load_some
+    pending_records = PendingSummaryRecord.load_some(flushed + 1, limit)
+    if len(pending_records) == limit:
+        flushed = int(pending_records[-1]._id)
+    else:
+        flushed = max_id
+    if state:
+        state.value = str(flushed)
+    else:
+        DashboardState(key="summary_flushed_id", value=str(flushed))
+    if flushed < max_id:
+        _schedule_flush()
+
+    for pending in pending_records:
+        record_type, _, record_id = pending.record_key.partition(":")
+        entity = RECORD_TYPES[record_type].load(record_id)
+        pending.delete()
+        if entity and entity.user:
+            _apply(entity.user.id, _contribution(record_type, _values(entity)), 1)
+            cache.invalidate_user(entity.user.id)
+    return len(pending_records)
+
+
+def get_summary(user_id: str) -> CitizenSummary:
+    """
+    Get the summary of a user, building it from their records if missing.
+
+    Records still queued when the summary is built are counted by the
+    build and taken off the queue.
+    """
+    flush_pending()
+    summary = CitizenSummary["user_id", user_id]
+    if summary and summary.version == SUMMARY_VERSION:
+        return summary
+    if summary:
+        summary.delete()
+
+    counters: Dict[str, int] = {}
+    totals: Dict[str, Dict[str, float]] = {}
+    user = User["id", user_id]
+    if user:
+        for record in list(user.services) + list(user.tax_records):
+            pending = PendingSummaryRecord["record_key", _record_key(record)]
+            if pending:
+                # Counted here, so flush_pending must not count it again
+                pending.delete()
+            contribution = _contribution(record.__class__.__name__, _values(record))
+            for key, delta in contribution.items():
+                if isinstance(key, tuple):
+                    _add_amount(totals.setdefault(key[0], {}), key[1], delta)
+                else:
+                    counters[key] = counters.get(key, 0) + delta
+    return CitizenSummary(
+        user_id=user_id,
+        version=SUMMARY_VERSION,
+        **counters,
+        **{field: json.dumps(amounts) for field, amounts in totals.items()},
+    )
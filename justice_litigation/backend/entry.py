@@ -7,10 +7,14 @@ import traceback
 from datetime import datetime
 from typing import Any, Dict
 
-from ggg import Dispute, User
+from ggg import Dispute
 from kybra import Async
 from kybra_simple_logging import get_logger
 
+from .models import IdSequence
+from .users import get_users
+
+
 logger = get_logger("extensions.justice_litigation")
 
 
@@ -392,17 +396,14 @@ def create_litigation(args: str) -> str:
             )
 
         # Find requester and defendant users
-        requester_user = None
-        defendant_user = None
-        for u in User.instances():
-            if u.id == requester_principal:
-                requester_user = u
-            if u.id == defendant_principal:
-                defendant_user = u
+        users = get_users([requester_principal, defendant_principal])
+        requester_user = users.get(requester_principal)
+        defendant_user = users.get(defendant_principal)
         
-        # Generate dispute ID
-        existing_disputes = Dispute.instances()
-        dispute_id = f"lit_{len(existing_disputes) + 1:03d}"
+        # Generate dispute ID; numbering continues after the entity IDs,
+        # which disputes numbered before the sequence existed match
+        dispute_num = IdSequence.next_id("dispute", start=Dispute.max_id())
+        dispute_id = f"lit_{dispute_num:03d}"
         
         # Create Dispute entity
         new_dispute = Dispute(
@@ -0,0 +1,47 @@
+"""
+Justice Litigation Models
+
+This module contains database models specific to the justice litigation extension.
+"""
+
+from core.extensions import create_extension_entity_class
+from kybra_simple_db import Integer, String
+
+ExtensionEntity = create_extension_entity_class("justice_litigation")
+
+
+class IdSequence(ExtensionEntity):
+    """
+    Model for a persistent counter handing out sequential numbers.
+
+    Stored with namespace: ext_justice_litigation::IdSequence
+
+    Attributes:
+        namespace (str): Name of the sequence (alias)
+        value (int): Last number handed out
+    """
+
+    __alias__ = "namespace"
+    __export__ = False
+
+    namespace = String(max_length=64)
+    value = Integer(default=0)
+
+    @classmethod
+    def reserve(cls, namespace: str, count: int = 1, start: int = 0) -> range:
+        """
+        Reserve the next `count` numbers of a sequence in one write.
+
+        The sequence continues after `start` when that is higher, such as
+        for a sequence used for the first time, or after entities were
+        loaded as data.
+        """
+        sequence = cls["namespace", namespace] or cls(namespace=namespace, value=start)
+        first = max(sequence.value, start) + 1
+        sequence.value = first + count - 1
+        return range(first, first + count)
+
+    @classmethod
+    def next_id(cls, namespace: str, start: int = 0) -> int:
+        """Get the next number of a sequence."""
+        return cls.reserve(namespace, 1, start)[0]
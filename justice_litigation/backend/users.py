@@ -0,0 +1,58 @@
+"""
+User Lookups
+
+Resolves users by id (principal) through the User alias index. Recently
+resolved users are kept in a bounded LRU cache, so that a repeated lookup
+neither reads the alias index nor loads the user again. A cached user is
+returned only while it is still the live entity of its _id, which stops
+being the case once the user is deleted.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from ggg import User
+
+# Maximum number of users kept; the least recently used are evicted first
+USER_CACHE_SIZE = 1000
+
+_users: "OrderedDict[str, User]" = OrderedDict()
+
+
+def _cached_user(user_id: str) -> Optional[User]:
+    user = _users.get(user_id)
+    if user is None:
+        return None
+    live = User.db().get_entity(User.get_full_type_name(), user._id)
+    if live is not user or user.id != user_id:
+        del _users[user_id]
+        return None
+    _users.move_to_end(user_id)
+    return user
+
+
+def get_users(user_ids: Iterable[str]) -> Dict[str, User]:
+    """
+    Resolve several users by id (principal).
+
+    Returns the users that exist, keyed by id.
+    """
+    users = {}
+    for user_id in user_ids:
+        if not user_id or user_id in users:
+            continue
+        user = _cached_user(user_id)
+        if not user:
+            user = User["id", user_id]
+            if not user:
+                continue
+            _users[user_id] = user
+            while len(_users) > USER_CACHE_SIZE:
+                _users.popitem(last=False)
+        users[user_id] = user
+    return users
+
+
+def get_user(user_id: str) -> Optional[User]:
+    """Resolve a user by id (principal), or None if there is no such user."""
+    return get_users([user_id]).get(user_id)
@@ -6,9 +6,11 @@ import json
 import traceback
 from typing import Any, Dict
 
-from ggg import Land, LandType, Organization, User
+from ggg import Land, LandType, Organization
 from kybra_simple_logging import get_logger
 
+from .users import get_user
+
 logger = get_logger("extensions.land_registry")
 
 
@@ -138,12 +140,7 @@ def update_land_ownership(args: str) -> str:
                     }
                 )
 
-            user = None
-            for existing_user in User.instances():
-                if existing_user.id == owner_user_id:
-                    user = existing_user
-                    break
-
+            user = get_user(owner_user_id)
             if not user:
                 return json.dumps({"success": False, "error": "User not found"})
 
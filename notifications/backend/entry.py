@@ -1,14 +1,33 @@
 import json
 import traceback
 from datetime import datetime, timezone
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from ggg import Notification, User
+from ggg import Notification
 from kybra_simple_logging import get_logger
 
+from . import feed
+from .models import IdSequence, NotificationFeed
+from .users import get_user
+
 logger = get_logger("notifications.entry")
 
 
+def initialize(args: str):
+    """
+    Attach the notification feed hook and index the notifications stored
+    so far, such as those loaded as data: a first batch now, the rest
+    from a timer.
+
+    Called once during canister initialization.
+    """
+    try:
+        feed.install_hooks()
+        feed.catch_up()
+    except Exception as e:
+        logger.error(f"Error indexing notifications: {str(e)}")
+
+
 def _notification_to_dict(notification: Notification) -> Dict[str, Any]:
     """Convert Notification entity to dictionary format"""
     # Handle timestamp - it could be string or datetime object
@@ -30,40 +49,89 @@ def _notification_to_dict(notification: Notification) -> Dict[str, Any]:
     }
 
 
+def _cursor_param(params: Dict[str, Any], name: str) -> Optional[int]:
+    value = params.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a cursor returned by get_notifications")
+
+
 def get_notifications(args: str = "{}"):
-    """Get all notifications for the current user"""
+    """
+    Get the notifications of the current user, most recent first
+
+    With a `user_id`, the notifications are read from the user's feed in
+    the order they were created and can be paged: `limit` caps their
+    number, `before` (the `next_before` of the previous page) continues
+    with older ones, and `since` (the `cursor` of an earlier response)
+    returns only those newer than it, for polling. With both `since` and
+    `limit`, the oldest of the newer ones are returned, and the `cursor`
+    continues after them.
+    """
     try:
         logger.info("Fetching notifications")
         
         params = json.loads(args) if args else {}
         user_id = params.get("user_id")
         
-        # Get all notifications from database
-        notifications = Notification.instances()
-        
-        # Filter by user if user_id provided
+        # Load the user's notifications through their feed index, or all
+        # notifications without a user_id
         if user_id:
-            notifications = [n for n in notifications if n.user and n.user.id == user_id]
-        
-        # Convert to dict format
-        notifications_list = [_notification_to_dict(n) for n in notifications]
-        
-        # Sort by timestamp, most recent first
-        notifications_list.sort(key=lambda x: x["timestamp"], reverse=True)
-        
-        unread_count = sum(1 for n in notifications if not n.read)
-
-        response = {
-            "notifications": notifications_list,
-            "unread_count": unread_count,
-            "total_count": len(notifications_list),
-        }
+            limit = params.get("limit")
+            if limit is not None and (not isinstance(limit, int) or limit < 1):
+                return json.dumps({"error": "limit must be a positive integer"})
+            before = _cursor_param(params, "before")
+            since = _cursor_param(params, "since")
+
+            feed.catch_up()
+            if since is not None and limit is not None and before is None:
+                # Page forward from `since`, so a poller skips nothing
+                notifications, cursor = feed.notifications_since(
+                    user_id, since, limit
+                )
+                next_before = None
+            else:
+                notifications, next_before = feed.user_notifications(
+                    user_id, limit=limit, before=before, since=since
+                )
+                cursor = feed.latest_id(user_id)
+            user_feed = NotificationFeed["user_id", user_id]
+            unread_count = user_feed.unread if user_feed else 0
+            total_count = user_feed.total if user_feed else 0
+            notifications_list = [_notification_to_dict(n) for n in notifications]
+            response = {
+                "notifications": notifications_list,
+                "unread_count": unread_count,
+                "total_count": total_count,
+                "next_before": str(next_before) if next_before else None,
+                "cursor": str(cursor) if cursor else params.get("since"),
+            }
+        else:
+            notifications = Notification.instances()
+            unread_count = sum(1 for n in notifications if not n.read)
+
+            # Convert to dict format
+            notifications_list = [_notification_to_dict(n) for n in notifications]
+
+            # Sort by timestamp, most recent first
+            notifications_list.sort(key=lambda x: x["timestamp"], reverse=True)
+
+            response = {
+                "notifications": notifications_list,
+                "unread_count": unread_count,
+                "total_count": len(notifications_list),
+            }
 
         logger.info(
             f"Returning {len(notifications_list)} notifications, {unread_count} unread"
         )
         return json.dumps(response)
 
+    except ValueError as e:
+        return json.dumps({"error": str(e), "notifications": [], "unread_count": 0})
     except Exception as e:
         error_msg = f"Error fetching notifications: {e}\n{traceback.format_exc()}"
         logger.error(error_msg)
@@ -81,12 +149,9 @@ def mark_as_read(args: str):
 
         logger.info(f"Marking notification {notification_id} as read")
 
-        # Find notification in database
-        notification = None
-        for n in Notification.instances():
-            if n.notification_id == notification_id:
-                notification = n
-                break
+        # Find notification through the notification_id index
+        feed.catch_up()
+        notification = feed.find(notification_id)
         
         if notification:
             notification.read = True
@@ -115,18 +180,15 @@ def create_notification(args: str):
             if field not in args_dict:
                 return json.dumps({"error": f"{field} is required"})
 
-        # Generate notification ID
-        existing_notifications = Notification.instances()
-        notification_id = f"notif_{len(existing_notifications) + 1:03d}"
+        # Generate notification ID; numbering continues after the entity
+        # IDs, which notifications numbered before the sequence existed match
+        notification_num = IdSequence.next_id(
+            "notification", start=Notification.max_id()
+        )
+        notification_id = f"notif_{notification_num:03d}"
         
         # Get user if user_id provided
-        user = None
-        user_id = args_dict.get("user_id")
-        if user_id:
-            for u in User.instances():
-                if u.id == user_id:
-                    user = u
-                    break
+        user = get_user(args_dict.get("user_id"))
 
         # Create notification entity
         new_notification = Notification(
@@ -141,6 +203,9 @@ def create_notification(args: str):
             metadata=args_dict.get("metadata", "{}")
         )
 
+        # Count it in the user's feed right away
+        feed.catch_up()
+
         logger.info(f"Created new notification: {notification_id}")
         return json.dumps({"success": True, "notification_id": notification_id})
 
@@ -148,3 +213,32 @@ def create_notification(args: str):
         error_msg = f"Error creating notification: {e}\n{traceback.format_exc()}"
         logger.error(error_msg)
         return json.dumps({"error": error_msg})
+
+
+def get_unread_count(args: str = "{}"):
+    """
+    Get the number of unread notifications of a user.
+
+    Read from the user's maintained counters, without loading any
+    notification, for frequent polling such as the notification bell.
+    Notifications not indexed yet are counted by a timer shortly after.
+    """
+    try:
+        params = json.loads(args) if args else {}
+        user_id = params.get("user_id")
+        if not user_id:
+            return json.dumps({"error": "user_id is required"})
+
+        feed.is_current()
+        user_feed = NotificationFeed["user_id", user_id]
+        return json.dumps(
+            {
+                "unread_count": user_feed.unread if user_feed else 0,
+                "total_count": user_feed.total if user_feed else 0,
+            }
+        )
+
+    except Exception as e:
+        error_msg = f"Error counting notifications: {e}\n{traceback.format_exc()}"
+        logger.error(error_msg)
+        return json.dumps({"error": error_msg, "unread_count": 0})
@@ -0,0 +1,374 @@
+"""
+Notifications Feed Index
+
+Indexes notifications per user, so that reading a user's notifications
+loads only theirs and their unread count is a stored counter:
+
+- NotificationPage entries hold each user's notification IDs in creation
+  order, PAGE_SIZE per page, so that indexing a notification rewrites a
+  single page, and a range of a user's notifications is found by a binary
+  search over their pages;
+- NotificationFeed holds the user's total and unread counters;
+- NotificationIndex maps notification_id to the notification.
+
+New notifications, however they are created, are indexed by catch_up(),
+from the Notification IDs above the `indexed_notification_id` cursor,
+because their user relation is attached after their write hooks run.
+catch_up() indexes at most CATCH_UP_BATCH_SIZE notifications per call and
+advances the cursor after each batch; a larger backlog, such as
+notifications loaded as data, is indexed by a timer. Callers run
+catch_up() before reading the index, and then only index the
+notifications created since the last batch. Later changes to the read
+state of indexed notifications, and their deletion, update the counters
+through the kybra_simple_db `on_event` hook of Notification.
+Moving a notification to another user is not tracked.
+"""
+
+import bisect
+import json
+from typing import Dict, List, Optional, Tuple
+
+from ggg import Notification
+from kybra import Duration, TimerId, ic
+from kybra_simple_db import ACTION_DELETE, ACTION_MODIFY
+from kybra_simple_db.properties import PROPERTY_STORAGE_PREFIX
+from kybra_simple_logging import get_logger
+
+from .models import (
+    NotificationFeed,
+    NotificationIndex,
+    NotificationPage,
+    NotificationState,
+)
+
+logger = get_logger("notifications.feed")
+
+# Notification IDs kept per NotificationPage
+PAGE_SIZE = 100
+
+# Notifications indexed per catch_up call
+CATCH_UP_BATCH_SIZE = 500
+
+# The stored cursor, read once; only this module writes it
+_indexed: Optional[int] = None
+
+_timer_id: Optional[TimerId] = None
+_hooks_installed = False
+
+
+def _cursor() -> int:
+    global _indexed
+    if _indexed is None:
+        state = NotificationState["key", "indexed_notification_id"]
+        _indexed = int(state.value) if state else 0
+    return _indexed
+
+
+def _set_cursor(entity_id: int) -> None:
+    global _indexed
+    state = NotificationState["key", "indexed_notification_id"]
+    if state:
+        state.value = str(entity_id)
+    else:
+        NotificationState(key="indexed_notification_id", value=str(entity_id))
+    _indexed = entity_id
+
+
+def _update(entity, **fields) -> None:
+    # Set several fields with a single write
+    entity._do_not_save = True
+    try:
+        for field, value in fields.items():
+            setattr(entity, field, value)
+    finally:
+        entity._do_not_save = False
+    entity._save()
+
+
+def _page_key(user_id: str, page: int) -> str:
+    return f"{user_id}:{page}"
+
+
+def _index_id(notification: Notification) -> None:
+    if not notification.notification_id:
+        return
+    entry = NotificationIndex["notification_id", notification.notification_id]
+    if not entry:
+        NotificationIndex(
+            notification_id=notification.notification_id,
+            entity_id=notification._id,
+        )
+    elif entry.entity_id != notification._id:
+        entry.entity_id = notification._id
+
+
+def _append(user_id: str, notifications: List[Notification]) -> None:
+    """Add notifications, oldest first, to the feed of a user."""
+    feed = NotificationFeed["user_id", user_id] or NotificationFeed(user_id=user_id)
+    pages = feed.pages
+    page = NotificationPage["key", _page_key(user_id, pages - 1)] if pages else None
+    entity_ids = json.loads(page.entity_ids) if page else []
+
+    changed = False
+    for notification in notifications:
+        if not page or len(entity_ids) == PAGE_SIZE:
+            if changed:
+                page.entity_ids = json.dumps(entity_ids)
+            page = NotificationPage(key=_page_key(user_id, pages), entity_ids="[]")
+            pages += 1
+            entity_ids = []
+        entity_ids.append(int(notification._id))
+        changed = True
+    if changed:
+        page.entity_ids = json.dumps(entity_ids)
+
+    _update(
+        feed,
+        total=feed.total + len(notifications),
+        unread=feed.unread + sum(1 for n in notifications if not n.read),
+        pages=pages,
+    )
+
+
+def _schedule() -> None:
+    global _timer_id
+    if _timer_id is None:
+        _timer_id = ic.set_timer(Duration(0), _on_timer)
+
+
+def _on_timer() -> None:
+    global _timer_id
+    _timer_id = None
+    try:
+        catch_up()
+    except Exception as e:
+        logger.error(f"Error indexing notifications: {str(e)}")
+
+
+def is_current() -> bool:
+    """
+    Whether every notification is indexed, scheduling catch_up() from a
+    timer if not; reads no notification.
+    """
+    if Notification.max_id() <= _cursor():
+        return True
+    _schedule()
+    return False
+
+
+def catch_up(limit: int = CATCH_UP_BATCH_SIZE) -> bool:
+    """
+    Index up to `limit` of the notifications created since the last
+    catch_up.
+
+    Returns whether every notification is indexed; if not, a timer indexes
+    the next batch.
+    """
+    indexed = _cursor()
+    max_id = Notification.max_id()
+    if max_id <= indexed:
+        return True
+
+    by_user: Dict[str, List[Notification]] = {}
+    notifications = Notification.load_some(indexed + 1, limit)
+    for notification in notifications:
+        _index_id(notification)
+        if notification.user:
+            by_user.setdefault(notification.user.id, []).append(notification)
+    for user_id, user_notifications in by_user.items():
+        _append(user_id, user_notifications)
+    indexed = int(notifications[-1]._id) if len(notifications) == limit else max_id
+    _set_cursor(indexed)
+    if indexed < max_id:
+        _schedule()
+        return False
+    return True
+
+
+def _add_counts(user_id: str, total: int = 0, unread: int = 0) -> None:
+    feed = NotificationFeed["user_id", user_id]
+    if feed:
+        _update(
+            feed, total=max(feed.total + total, 0), unread=max(feed.unread + unread, 0)
+        )
+
+
+def _is_loading(entity, field_name: str) -> bool:
+    # Loading an entity sets its fields while saving is off, before they are
+    # stored; fields never set before are not stored either, but are then
+    # assigned with saving on
+    return (
+        getattr(entity, "_do_not_save", False)
+        and f"_{PROPERTY_STORAGE_PREFIX}_{field_name}" not in entity.__dict__
+    )
+
+
+def _on_notification_event(entity, field_name, old_value, new_value, action):
+    if action != ACTION_DELETE and not (
+        action == ACTION_MODIFY and field_name == "read"
+    ):
+        return True, new_value
+    try:
+        # Notifications not indexed yet are counted as they are by catch_up()
+        if int(entity._id) > _cursor():
+            return True, new_value
+        if action == ACTION_DELETE:
+            if entity.notification_id:
+                entry = NotificationIndex["notification_id", entity.notification_id]
+                if entry and entry.entity_id == entity._id:
+                    entry.delete()
+            if entity.user:
+                _add_counts(entity.user.id, total=-1, unread=-int(not entity.read))
+        elif (
+            bool(old_value) != bool(new_value)
+            and not _is_loading(entity, field_name)
+            and entity.user
+        ):
+            _add_counts(entity.user.id, unread=-1 if new_value else 1)
+    except Exception as e:
+        logger.error(f"Error updating notification feed: {str(e)}")
+    return True, new_value
+
+
+def _chained(previous_hook):
+    """Wrap an entity hook so that the feed counters are updated first."""
+
+    def on_event(entity, field_name, old_value, new_value, action):
+        _on_notification_event(entity, field_name, old_value, new_value, action)
+        if previous_hook:
+            return previous_hook(entity, field_name, old_value, new_value, action)
+        return True, new_value
+
+    return staticmethod(on_event)
+
+
+def install_hooks() -> None:
+    """
+    Attach the feed counter hook to Notification.
+
+    A hook already attached to Notification keeps running after it.
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    Notification.on_event = _chained(getattr(Notification, "on_event", None))
+    _hooks_installed = True
+
+
+def find(notification_id: str) -> Optional[Notification]:
+    """Get a notification by notification_id, or None."""
+    entry = NotificationIndex["notification_id", notification_id]
+    if not entry:
+        return None
+    notification = Notification.load(entry.entity_id)
+    if not notification or notification.notification_id != notification_id:
+        # Deleted or renumbered since it was indexed
+        entry.delete()
+        return None
+    return notification
+
+
+def _page_ids(user_id: str, page_number: int) -> List[int]:
+    page = NotificationPage["key", _page_key(user_id, page_number)]
+    return json.loads(page.entity_ids) if page and page.entity_ids else []
+
+
+def _last_page_below(user_id: str, pages: int, below: int) -> int:
+    # Binary search for the last page starting below an ID, -1 if none
+    low, high, found = 0, pages - 1, -1
+    while low <= high:
+        middle = (low + high) // 2
+        entity_ids = _page_ids(user_id, middle)
+        if entity_ids and entity_ids[0] < below:
+            found, low = middle, middle + 1
+        else:
+            high = middle - 1
+    return found
+
+
+def latest_id(user_id: str) -> Optional[int]:
+    """ID of the most recent notification of a user, None if none."""
+    feed = NotificationFeed["user_id", user_id]
+    if not feed or not feed.pages:
+        return None
+    entity_ids = _page_ids(user_id, feed.pages - 1)
+    return entity_ids[-1] if entity_ids else None
+
+
+def user_notifications(
+    user_id: str,
+    limit: Optional[int] = None,
+    before: Optional[int] = None,
+    since: Optional[int] = None,
+) -> Tuple[List[Notification], Optional[int]]:
+    """
+    Notifications of a user, most recent first.
+
+    Args:
+        user_id: ID of the user
+        limit: Maximum number of notifications, all if None
+        before: Only notifications with a lower ID
+        since: Only notifications with a higher ID
+
+    Returns:
+        The notifications, and the ID to pass as `before` for the next
+        ones (None when there are no more)
+    """
+    feed = NotificationFeed["user_id", user_id]
+    if not feed:
+        return [], None
+
+    if before is None:
+        page_number = feed.pages - 1
+    else:
+        page_number = _last_page_below(user_id, feed.pages, before)
+
+    notifications: List[Notification] = []
+    while page_number >= 0:
+        entity_ids = _page_ids(user_id, page_number)
+        if before is not None:
+            entity_ids = entity_ids[: bisect.bisect_left(entity_ids, before)]
+        for entity_id in reversed(entity_ids):
+            if since is not None and entity_id <= since:
+                return notifications, None
+            if limit is not None and len(notifications) == limit:
+                return notifications, int(notifications[-1]._id)
+            notification = Notification.load(str(entity_id))
+            # Deleted notifications stay listed in their page
+            if notification:
+                notifications.append(notification)
+        page_number -= 1
+    return notifications, None
+
+
+def notifications_since(
+    user_id: str, since: int, limit: int
+) -> Tuple[List[Notification], int]:
+    """
+    The `limit` notifications of a user created right after `since`, most
+    recent first.
+
+    Returns:
+        The notifications, and the ID to pass as `since` for the next ones:
+        the last ID read, so that nothing newer than `since` is skipped
+    """
+    feed = NotificationFeed["user_id", user_id]
+    if not feed:
+        return [], since
+
+    # The page holding the first ID above `since`, or the first page
+    page_number = max(_last_page_below(user_id, feed.pages, since + 1), 0)
+    notifications: List[Notification] = []
+    cursor = since
+    while page_number < feed.pages and len(notifications) < limit:
+        entity_ids = _page_ids(user_id, page_number)
+        for entity_id in entity_ids[bisect.bisect_right(entity_ids, since) :]:
+            if len(notifications) == limit:
+                break
+            cursor = entity_id
+            notification = Notification.load(str(entity_id))
+            # Deleted notifications stay listed in their page
+            if notification:
+                notifications.append(notification)
+        page_number += 1
+    return notifications[::-1], cursor
@@ -0,0 +1,119 @@
+"""
+Notifications Models
+
+This module contains database models specific to the notifications extension.
+"""
+
+from core.extensions import create_extension_entity_class
+from kybra_simple_db import Integer, String
+
+ExtensionEntity = create_extension_entity_class("notifications")
+
+
+class NotificationState(ExtensionEntity):
+    """
+    Model for internal key/value state of the notifications extension.
+
+    Stored with namespace: ext_notifications::NotificationState
+    """
+
+    __alias__ = "key"
+    __export__ = False
+
+    key = String()
+    value = String()
+
+
+class IdSequence(ExtensionEntity):
+    """
+    Model for a persistent counter handing out sequential numbers.
+
+    Stored with namespace: ext_notifications::IdSequence
+
+    Attributes:
+        namespace (str): Name of the sequence (alias)
+        value (int): Last number handed out
+    """
+
+    __alias__ = "namespace"
+    __export__ = False
+
+    namespace = String(max_length=64)
+    value = Integer(default=0)
+
+    @classmethod
+    def reserve(cls, namespace: str, count: int = 1, start: int = 0) -> range:
+        """
+        Reserve the next `count` numbers of a sequence in one write.
+
+        The sequence continues after `start` when that is higher, such as
+        for a sequence used for the first time, or after entities were
+        loaded as data.
+        """
+        sequence = cls["namespace", namespace] or cls(namespace=namespace, value=start)
+        first = max(sequence.value, start) + 1
+        sequence.value = first + count - 1
+        return range(first, first + count)
+
+    @classmethod
+    def next_id(cls, namespace: str, start: int = 0) -> int:
+        """Get the next number of a sequence."""
+        return cls.reserve(namespace, 1, start)[0]
+
+
+class NotificationIndex(ExtensionEntity):
+    """
+    Model for the lookup of notifications by notification_id.
+
+    Stored with namespace: ext_notifications::NotificationIndex
+
+    Attributes:
+        notification_id (str): notification_id of the Notification (alias)
+        entity_id (str): _id of the Notification
+    """
+
+    __alias__ = "notification_id"
+    __export__ = False
+
+    notification_id = String(max_length=64)
+    entity_id = String(max_length=64)
+
+
+class NotificationFeed(ExtensionEntity):
+    """
+    Model for the notification counters and page count of a user.
+
+    Stored with namespace: ext_notifications::NotificationFeed
+
+    Attributes:
+        user_id (str): ID of the user (alias)
+        total (int): Number of notifications of the user
+        unread (int): Number of those not read yet
+        pages (int): Number of NotificationPage entries of the user
+    """
+
+    __alias__ = "user_id"
+    __export__ = False
+
+    user_id = String(max_length=128)
+    total = Integer(default=0)
+    unread = Integer(default=0)
+    pages = Integer(default=0)
+
+
+class NotificationPage(ExtensionEntity):
+    """
+    Model for one page of the notifications of a user, oldest first.
+
+    Stored with namespace: ext_notifications::NotificationPage
+
+    Attributes:
+        key (str): "<user_id>:<page number>", numbered from 0 (alias)
+        entity_ids (str): JSON list of Notification _ids, ascending
+    """
+
+    __alias__ = "key"
+    __export__ = False
+
+    key = String(max_length=192)
+    entity_ids = String()
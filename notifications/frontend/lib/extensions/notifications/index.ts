@@ -8,7 +8,8 @@ export const metadata = {
   "entry_points": [
     "get_notifications",
     "mark_as_read",
-    "create_notification"
+    "create_notification",
+    "get_unread_count"
   ],
   "profiles": [
     "member",
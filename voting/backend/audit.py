@@ -0,0 +1,169 @@
+"""
+Voting Audit Log
+
+Every vote cast or changed through this extension appends a leaf to an
+append-only Merkle tree of its proposal, so that an auditor can check any
+single ballot against a published root instead of the whole vote table.
+
+The root commits to the ballots only. It does not bind the tally: the
+vote counters are kept apart from the log, and the leaves of weighted
+and quadratic proposals carry no weight, which comes from the balance
+snapshot. Checking a result takes replaying every leaf of the log, and
+for weighted proposals the snapshotted weights as well.
+
+A leaf is the compact JSON list [voter id, choice, sequence], where the
+sequence is the position of the leaf in the log and the choice of a
+ranked ballot is its ranking. A changed vote appends
+a new leaf; each voter's vote is the leaf with their highest sequence.
+The tree is hashed as in RFC 6962 (Certificate Transparency):
+
+    leaf hash  SHA-256(0x00 || leaf)
+    node hash  SHA-256(0x01 || left || right)
+
+and inclusion proofs are the audit paths of RFC 6962, checked with the
+algorithm of RFC 9162 section 2.1.3.2 (see verify_inclusion).
+
+Complete subtrees are stored as MerkleNode entries once their last leaf is
+appended and never change, so appending takes amortized O(1) writes, and
+the root or an inclusion proof at any past log size takes O(log n) reads.
+"""
+
+import hashlib
+import json
+from typing import Any, List
+
+from .models import MerkleNode, VoteLog
+
+# Root of a log without leaves, the hash of the empty string
+EMPTY_ROOT = hashlib.sha256(b"").hexdigest()
+
+
+def leaf_data(voter_id: str, choice: Any, sequence: int) -> bytes:
+    return json.dumps([voter_id, choice, sequence], separators=(",", ":")).encode()
+
+
+def hash_leaf(data: bytes) -> str:
+    return hashlib.sha256(b"\x00" + data).hexdigest()
+
+
+def hash_children(left: str, right: str) -> str:
+    return hashlib.sha256(
+        b"\x01" + bytes.fromhex(left) + bytes.fromhex(right)
+    ).hexdigest()
+
+
+def _node_key(proposal_id: str, level: int, index: int) -> str:
+    return f"{proposal_id}:{level}:{index}"
+
+
+def _split(size: int) -> int:
+    # Largest power of two smaller than size
+    return 1 << ((size - 1).bit_length() - 1)
+
+
+def _put_node(proposal_id: str, level: int, index: int, node_hash: str) -> None:
+    # A node is only ever rewritten after an append whose log size was not
+    # saved, and then gets the hash of the leaves appended in its place
+    key = _node_key(proposal_id, level, index)
+    node = MerkleNode["key", key]
+    if not node:
+        MerkleNode(key=key, hash=node_hash)
+    elif node.hash != node_hash:
+        node.hash = node_hash
+
+
+def size(proposal_id: str) -> int:
+    """Number of leaves in the log of a proposal."""
+    log = VoteLog["proposal_id", proposal_id]
+    return log.size if log else 0
+
+
+def subtree_hash(proposal_id: str, start: int, end: int) -> str:
+    """Hash of the leaves start up to end, which must all be appended."""
+    width = end - start
+    if width & (width - 1) == 0 and start % width == 0:
+        level = width.bit_length() - 1
+        return MerkleNode["key", _node_key(proposal_id, level, start >> level)].hash
+    middle = start + _split(width)
+    return hash_children(
+        subtree_hash(proposal_id, start, middle),
+        subtree_hash(proposal_id, middle, end),
+    )
+
+
+def root(proposal_id: str, tree_size: int) -> str:
+    """Root of the log of a proposal when it held `tree_size` leaves."""
+    return subtree_hash(proposal_id, 0, tree_size) if tree_size else EMPTY_ROOT
+
+
+def inclusion_proof(proposal_id: str, sequence: int, tree_size: int) -> List[str]:
+    """Audit path of a leaf in the log when it held `tree_size` leaves."""
+    proof = []
+    start, end = 0, tree_size
+    # Descend from the root, collecting the sibling subtrees on the way down
+    while end - start > 1:
+        middle = start + _split(end - start)
+        if sequence < middle:
+            proof.append(subtree_hash(proposal_id, middle, end))
+            end = middle
+        else:
+            proof.append(subtree_hash(proposal_id, start, middle))
+            start = middle
+    # Audit paths list the siblings from the leaf up
+    return proof[::-1]
+
+
+def verify_inclusion(
+    leaf_hash: str, sequence: int, tree_size: int, proof: List[str], root_hash: str
+) -> bool:
+    """Check an inclusion proof as an auditor would (RFC 9162, 2.1.3.2)."""
+    if sequence >= tree_size:
+        return False
+    fn, sn, r = sequence, tree_size - 1, leaf_hash
+    for p in proof:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            r = hash_children(p, r)
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            r = hash_children(r, p)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and r == root_hash
+
+
+class Accumulator:
+    """
+    Appends leaves to the log of a proposal; the log size is written once,
+    by save(), however many leaves were appended.
+    """
+
+    def __init__(self, proposal_id: str):
+        self.proposal_id = proposal_id
+        self.log = VoteLog["proposal_id", proposal_id]
+        self.size = self.log.size if self.log else 0
+
+    def append(self, voter_id: str, choice: Any) -> int:
+        """Append a vote to the log, returning its sequence."""
+        sequence = self.size
+        node_hash = hash_leaf(leaf_data(voter_id, choice, sequence))
+        level, index = 0, sequence
+        _put_node(self.proposal_id, level, index, node_hash)
+        # Every right child completes its parent
+        while index & 1:
+            left = MerkleNode["key", _node_key(self.proposal_id, level, index - 1)]
+            node_hash = hash_children(left.hash, node_hash)
+            level, index = level + 1, index >> 1
+            _put_node(self.proposal_id, level, index, node_hash)
+        self.size += 1
+        return sequence
+
+    def save(self) -> None:
+        if not self.log:
+            if self.size:
+                self.log = VoteLog(proposal_id=self.proposal_id, size=self.size)
+        elif self.log.size != self.size:
+            self.log.size = self.size
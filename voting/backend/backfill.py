@@ -0,0 +1,64 @@
+"""
+Voting Index Backfill
+
+Votes created outside this extension, such as by data import, reach the
+VoteIndex through VoteIndex.catch_up(), and ranking buckets stored that
+way reach the rankings of their proposal through ranked.catch_up(),
+CATCH_UP_BATCH_SIZE entities per call: a first batch from initialize(),
+then one per timer tick until the cursors reach the last entity. Each
+batch advances its cursor, so a backlog of any size is indexed across
+calls without exceeding the instruction limit of one.
+
+Calls that look votes up or tabulate ranked ballots run catch_up() first,
+which then only has the entities created since the last batch to index.
+While a backlog remains, an earlier vote of a voter may not be indexed
+yet, so they refuse rather than record a second vote.
+"""
+
+from typing import Optional
+
+from kybra import Duration, TimerId, ic
+from kybra_simple_logging import get_logger
+
+from . import ranked
+from .models import VoteIndex
+
+logger = get_logger("extensions.voting.backfill")
+
+# Votes, then ranking buckets, indexed per catch_up call
+CATCH_UP_BATCH_SIZE = 500
+
+# Error returned while votes are still being indexed
+INDEXING_ERROR = "Votes are still being indexed, please try again shortly"
+
+_timer_id: Optional[TimerId] = None
+
+
+def _schedule() -> None:
+    global _timer_id
+    if _timer_id is None:
+        _timer_id = ic.set_timer(Duration(0), _on_timer)
+
+
+def _on_timer() -> None:
+    global _timer_id
+    _timer_id = None
+    try:
+        catch_up()
+    except Exception as e:
+        logger.error(f"Error indexing votes: {str(e)}")
+
+
+def catch_up() -> bool:
+    """
+    Index the next batch of votes, or once they are all indexed, of
+    ranking buckets created since the last one.
+
+    Returns whether everything is indexed; if not, a timer indexes the
+    next batch.
+    """
+    limit = CATCH_UP_BATCH_SIZE
+    if VoteIndex.catch_up(limit) and ranked.catch_up(limit):
+        return True
+    _schedule()
+    return False
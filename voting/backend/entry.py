@@ -5,25 +5,69 @@ Governance voting system using GGG entities
 
 import hashlib
 import json
+import math
 import traceback
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 from ggg import Proposal, User, Vote
+from kybra import ic
 from kybra_simple_logging import get_logger
 
+from . import audit, backfill, lifecycle, listing, ranked, tally
+from .models import IdSequence, VoteIndex
+from .users import get_user
+
 logger = get_logger("extensions.voting")
 
 
+def initialize(args: str):
+    """
+    Index proposals, such as those loaded as data, for listing, queue those
+    in voting for finalization at their deadline and start the lifecycle
+    timer. Proposals and votes loaded as data are indexed in batches, from
+    timers.
+
+    Called once during canister initialization.
+    """
+    try:
+        listing.install_hooks()
+        listing.rebuild_indexes()
+    except Exception as e:
+        logger.error(f"Error indexing proposals: {str(e)}")
+    try:
+        lifecycle.rebuild_queue()
+        lifecycle.start_timer()
+    except Exception as e:
+        logger.error(f"Error starting proposal lifecycle: {str(e)}")
+    try:
+        backfill.catch_up()
+    except Exception as e:
+        logger.error(f"Error indexing votes: {str(e)}")
+
+
+def _proposer_id(proposal: Proposal) -> str:
+    # Stored in the metadata at submission, so listings need not load the
+    # proposer; older proposals fall back to the relation
+    try:
+        proposer_id = json.loads(proposal.metadata or "{}").get("proposer_id")
+    except ValueError:
+        proposer_id = None
+    if proposer_id:
+        return proposer_id
+    return proposal.proposer.id if proposal.proposer else "unknown"
+
+
 def _proposal_to_dict(proposal: Proposal) -> Dict[str, Any]:
     """Convert Proposal entity to dictionary"""
+    tally_mode = tally.get_mode(proposal)
     return {
         "id": proposal.proposal_id,
         "title": proposal.title,
         "description": proposal.description,
         "code_url": proposal.code_url,
         "code_checksum": proposal.code_checksum,
-        "proposer": proposal.proposer.id if proposal.proposer else "unknown",
+        "proposer": _proposer_id(proposal),
         "status": proposal.status,
         "created_at": proposal.timestamp_created,
         "voting_deadline": proposal.voting_deadline if proposal.voting_deadline else None,
@@ -34,11 +78,22 @@ def _proposal_to_dict(proposal: Proposal) -> Dict[str, Any]:
         },
         "total_voters": int(proposal.total_voters),
         "required_threshold": proposal.required_threshold,
+        "tally_mode": tally_mode,
+        "voting_power": tally.totals(proposal) if tally_mode != "count" else None,
+        "ballot": "ranked" if ranked.is_ranked(proposal) else "choice",
+        "candidates": ranked.candidates(proposal) or None,
     }
 
 
 def get_proposals(args: str) -> Dict[str, Any]:
-    """Get all proposals with optional filtering"""
+    """
+    Get proposals with optional filtering and pagination
+
+    Args:
+        args: JSON with optional `status`, `order_by` ("created", the
+            default, or "deadline"), `limit` and `cursor` (the `next_cursor`
+            of the previous page); without a limit all proposals are returned
+    """
     logger.info(f"get_proposals called with args: {args}")
     
     try:
@@ -49,21 +104,40 @@ def get_proposals(args: str) -> Dict[str, Any]:
             args_dict = args
 
         status_filter = args_dict.get("status", None)
-        
-        # Load proposals from database
-        all_proposals = Proposal.instances()
-        
-        # Filter by status if requested
-        if status_filter:
-            filtered_proposals = [p for p in all_proposals if p.status == status_filter]
-        else:
-            filtered_proposals = all_proposals
+        order_by = args_dict.get("order_by", "created")
+        if order_by not in listing.ORDERS:
+            return json.dumps(
+                {
+                    "success": False,
+                    "error": f"order_by must be one of {list(listing.ORDERS)}",
+                }
+            )
+        limit = args_dict.get("limit")
+        if limit is not None and (not isinstance(limit, int) or limit < 1):
+            return json.dumps(
+                {"success": False, "error": "limit must be a positive integer"}
+            )
+
+        if not listing.rebuild_indexes():
+            return json.dumps({"success": False, "error": listing.INDEXING_ERROR})
+
+        # Load the page of proposals through the listing indexes
+        page, total, next_cursor = listing.page(
+            status_filter, order_by, limit, args_dict.get("cursor")
+        )
 
         # Convert to dictionaries
-        proposals = [_proposal_to_dict(p) for p in filtered_proposals]
+        proposals = [_proposal_to_dict(p) for p in page]
 
         return json.dumps(
-            {"success": True, "data": {"proposals": proposals, "total": len(proposals)}}
+            {
+                "success": True,
+                "data": {
+                    "proposals": proposals,
+                    "total": total,
+                    "next_cursor": next_cursor,
+                },
+            }
         )
     except Exception as e:
         logger.error(f"Error in get_proposals: {str(e)}\n{traceback.format_exc()}")
@@ -86,9 +160,7 @@ def get_proposal(args: str) -> Dict[str, Any]:
             return json.dumps({"success": False, "error": "proposal_id is required"})
 
         # Find proposal in database
-        all_proposals = Proposal.instances()
-        proposal = next((p for p in all_proposals if p.proposal_id == proposal_id), None)
-        
+        proposal = Proposal["proposal_id", proposal_id]
         if not proposal:
             return json.dumps({"success": False, "error": "Proposal not found"})
 
@@ -116,8 +188,7 @@ def submit_proposal(args: str) -> Dict[str, Any]:
 
         # Find proposer user
         proposer_id = args_dict["proposer"]
-        all_users = User.instances()
-        proposer = next((u for u in all_users if u.id == proposer_id), None)
+        proposer = get_user(proposer_id)
         
         if not proposer:
             return json.dumps({"success": False, "error": f"User {proposer_id} not found"})
@@ -125,9 +196,9 @@ def submit_proposal(args: str) -> Dict[str, Any]:
         # Generate checksum
         code_checksum = f"sha256:{hashlib.sha256(args_dict['code_url'].encode()).hexdigest()[:16]}..."
 
-        # Generate unique proposal ID
-        existing_proposals = Proposal.instances()
-        proposal_num = len(existing_proposals) + 1
+        # Generate unique proposal ID; numbering continues after the entity
+        # IDs, which proposals numbered before the sequence existed match
+        proposal_num = IdSequence.next_id("proposal", start=Proposal.max_id())
         proposal_id = f"prop_{proposal_num:03d}"
 
         # Create new proposal in database
@@ -145,7 +216,7 @@ def submit_proposal(args: str) -> Dict[str, Any]:
             votes_abstain=0.0,
             total_voters=0.0,
             required_threshold=0.6,
-            metadata="{}",
+            metadata=json.dumps({"proposer_id": proposer.id}),
         )
 
         return json.dumps({"success": True, "data": _proposal_to_dict(new_proposal)})
@@ -154,6 +225,74 @@ def submit_proposal(args: str) -> Dict[str, Any]:
         return json.dumps({"success": False, "error": str(e)})
 
 
+# Maximum number of ballots accepted by one cast_votes_bulk call
+MAX_BULK_VOTES = 10000
+
+# Instructions cast_votes_bulk and update_vote_weights may spend on their
+# items before they stop, leaving headroom below the per-message limit to
+# write the tally and audit log
+BULK_INSTRUCTION_BUDGET = 20_000_000_000
+
+
+def _parse_ballot(ballot) -> Tuple[str, Any]:
+    """Split a cast_votes_bulk ballot into voter and vote, or raise ValueError."""
+    if isinstance(ballot, dict):
+        voter_id = ballot.get("voter")
+        vote_choice = ballot.get("ranking", ballot.get("vote"))
+    elif isinstance(ballot, list) and len(ballot) == 2:
+        voter_id, vote_choice = ballot
+    else:
+        raise ValueError("ballot must be a {voter, vote} object or a pair")
+    if not isinstance(voter_id, str) or not voter_id:
+        raise ValueError("voter must be a user id")
+    return voter_id, vote_choice
+
+
+def _record_vote(
+    proposal: Proposal,
+    voter: User,
+    vote_choice: str,
+    delta: tally.TallyDelta,
+    log: audit.Accumulator,
+) -> None:
+    """
+    Create or change the vote of a voter on a proposal.
+
+    The resulting changes of the proposal tally are collected in `delta`
+    rather than written, so that the changes of many votes can be applied
+    at once. The vote is appended to the proposal's audit `log`, and its
+    sequence there is kept in the vote metadata.
+    """
+    existing_vote = VoteIndex.find(proposal.proposal_id, voter.id)
+    if existing_vote:
+        if existing_vote.vote_choice == vote_choice:
+            return
+        delta.move(voter.id, existing_vote.vote_choice, vote_choice)
+        try:
+            metadata = json.loads(existing_vote.metadata or "{}")
+        except ValueError:
+            metadata = {}
+        metadata["sequence"] = log.append(voter.id, vote_choice)
+        # Both fields in one write
+        existing_vote._do_not_save = True
+        try:
+            existing_vote.vote_choice = vote_choice
+            existing_vote.metadata = json.dumps(metadata)
+        finally:
+            existing_vote._do_not_save = False
+        existing_vote._save()
+    else:
+        sequence = log.append(voter.id, vote_choice)
+        new_vote = Vote(
+            proposal=proposal,
+            voter=voter,
+            vote_choice=vote_choice,
+            metadata=json.dumps({"sequence": sequence}),
+        )
+        VoteIndex.add(new_vote)
+        delta.move(voter.id, None, vote_choice)
+
+
 def cast_vote(args: str) -> Dict[str, Any]:
     """Cast a vote on a proposal"""
     logger.info(f"cast_vote called with args: {args}")
@@ -180,60 +319,705 @@ def cast_vote(args: str) -> Dict[str, Any]:
             )
 
         # Find proposal
-        all_proposals = Proposal.instances()
-        proposal = next((p for p in all_proposals if p.proposal_id == proposal_id), None)
-        
+        proposal = Proposal["proposal_id", proposal_id]
         if not proposal:
             return json.dumps({"success": False, "error": "Proposal not found"})
 
+        if lifecycle.is_closed(proposal):
+            return json.dumps(
+                {"success": False, "error": "Voting on this proposal is closed"}
+            )
+        if ranked.is_ranked(proposal):
+            return json.dumps(
+                {
+                    "success": False,
+                    "error": "This proposal takes ranked ballots, see cast_ranked_vote",
+                }
+            )
+
         # Find voter
-        all_users = User.instances()
-        voter = next((u for u in all_users if u.id == voter_id), None)
+        voter = get_user(voter_id)
         
         if not voter:
             return json.dumps({"success": False, "error": f"User {voter_id} not found"})
 
-        # Check if user already voted
-        all_votes = Vote.instances()
-        existing_vote = next(
-            (v for v in all_votes if v.proposal.id == proposal.id and v.voter.id == voter.id),
-            None
+        if not tally.is_ready(proposal):
+            return json.dumps({"success": False, "error": tally.SNAPSHOT_ERROR})
+        if not backfill.catch_up():
+            return json.dumps({"success": False, "error": backfill.INDEXING_ERROR})
+        delta = tally.TallyDelta(proposal)
+        log = audit.Accumulator(proposal.proposal_id)
+        _record_vote(proposal, voter, vote_choice, delta, log)
+        delta.apply()
+        log.save()
+        if delta.counters.get("total_voters"):
+            # Every earlier vote was indexed by catch_up(), and the new one
+            # on creation
+            VoteIndex.set_cursor(Vote.max_id())
+
+        return json.dumps(
+            {"success": True, "data": {"message": "Vote cast successfully"}}
         )
-        
-        if existing_vote:
-            # Update existing vote counts
-            if existing_vote.vote_choice == "yes":
-                proposal.votes_yes -= 1
-            elif existing_vote.vote_choice == "no":
-                proposal.votes_no -= 1
-            elif existing_vote.vote_choice == "abstain":
-                proposal.votes_abstain -= 1
-            
-            # Update vote choice
-            existing_vote.vote_choice = vote_choice
+    except Exception as e:
+        logger.error(f"Error in cast_vote: {str(e)}\n{traceback.format_exc()}")
+        return json.dumps({"success": False, "error": str(e)})
+
+
+def cast_votes_bulk(args: str) -> Dict[str, Any]:
+    """
+    Cast many votes on a proposal in one call (admin only).
+
+    Meant for admins submitting the ballots delegates collected and for
+    loading off-chain snapshots. Each ballot creates or changes the voter's
+    vote like cast_vote does, and the net change of the proposal counters
+    is written once. Ballots are processed in order until
+    BULK_INSTRUCTION_BUDGET is spent; the rest are left for another call.
+
+    Args:
+        args (str): JSON string with proposal_id and `votes`, a list of
+            {"voter": ..., "vote": ...} objects or [voter, vote] pairs;
+            on ranked-choice proposals the vote is a ranking, also accepted
+            as "ranking"; when a voter appears more than once the last
+            ballot counts
+
+    Returns:
+        str: JSON string with the number of ballots `recorded`, the
+            `errors` of the ballots that were skipped, by `index`, and the
+            `next_index` of the first ballot not processed (None when all
+            were), to resubmit the `unprocessed` rest from
+    """
+    logger.info("cast_votes_bulk called")
+
+    try:
+        if isinstance(args, str):
+            args_dict = json.loads(args) if args.strip() else {}
         else:
-            # Create new vote
-            new_vote = Vote(
-                proposal=proposal,
-                voter=voter,
-                vote_choice=vote_choice,
-                metadata="{}"
-            )
-            proposal.total_voters += 1
-
-        # Update proposal vote counts
-        if vote_choice == "yes":
-            proposal.votes_yes += 1
-        elif vote_choice == "no":
-            proposal.votes_no += 1
-        elif vote_choice == "abstain":
-            proposal.votes_abstain += 1
+            args_dict = args
+
+        if not _caller_is_admin():
+            return json.dumps(
+                {"success": False, "error": "Only admins can cast votes in bulk"}
+            )
+
+        ballots = args_dict.get("votes") or []
+        if not isinstance(ballots, list) or not ballots:
+            return json.dumps(
+                {"success": False, "error": "votes must be a non-empty list"}
+            )
+        if len(ballots) > MAX_BULK_VOTES:
+            return json.dumps(
+                {
+                    "success": False,
+                    "error": f"At most {MAX_BULK_VOTES} votes can be cast at once",
+                }
+            )
+
+        proposal = Proposal["proposal_id", args_dict.get("proposal_id")]
+        if not proposal:
+            return json.dumps({"success": False, "error": "Proposal not found"})
+        if lifecycle.is_closed(proposal):
+            return json.dumps(
+                {"success": False, "error": "Voting on this proposal is closed"}
+            )
+
+        if not tally.is_ready(proposal):
+            return json.dumps({"success": False, "error": tally.SNAPSHOT_ERROR})
+        if not backfill.catch_up():
+            return json.dumps({"success": False, "error": backfill.INDEXING_ERROR})
+        delta = tally.TallyDelta(proposal)
+        log = audit.Accumulator(proposal.proposal_id)
+        ranked_delta = (
+            ranked.RankedDelta(proposal, log) if ranked.is_ranked(proposal) else None
+        )
+        errors = []
+        recorded = 0
+        next_index = None
+        for index, ballot in enumerate(ballots):
+            if ic.instruction_counter() > BULK_INSTRUCTION_BUDGET:
+                next_index = index
+                break
+            try:
+                voter_id, vote_choice = _parse_ballot(ballot)
+                if ranked_delta:
+                    ranked.parse_ranking(proposal, vote_choice)
+                elif (
+                    not isinstance(vote_choice, str)
+                    or vote_choice not in tally.TALLY_FIELDS
+                ):
+                    raise ValueError("vote must be 'yes', 'no', or 'abstain'")
+            except ValueError as e:
+                errors.append({"index": index, "error": str(e)})
+                continue
+            voter = get_user(voter_id)
+            if not voter:
+                errors.append({"index": index, "error": f"User {voter_id} not found"})
+            elif ranked_delta:
+                ranked_delta.record(voter_id, vote_choice)
+                recorded += 1
+            else:
+                _record_vote(proposal, voter, vote_choice, delta, log)
+                recorded += 1
+
+        delta.apply()
+        if ranked_delta:
+            ranked_delta.apply()
+        log.save()
+        if delta.counters.get("total_voters"):
+            VoteIndex.set_cursor(Vote.max_id())
+
+        unprocessed = 0 if next_index is None else len(ballots) - next_index
+        logger.info(
+            f"cast_votes_bulk recorded {recorded} votes, {len(errors)} errors, "
+            f"{unprocessed} unprocessed"
+        )
+        return json.dumps(
+            {
+                "success": True,
+                "data": {
+                    "recorded": recorded,
+                    "errors": errors,
+                    "next_index": next_index,
+                    "unprocessed": unprocessed,
+                },
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error in cast_votes_bulk: {str(e)}\n{traceback.format_exc()}")
+        return json.dumps({"success": False, "error": str(e)})
+
+
+def cast_ranked_vote(args: str) -> Dict[str, Any]:
+    """
+    Cast a ranked ballot on a ranked-choice proposal.
+
+    Args:
+        args (str): JSON string with proposal_id, voter and `ranking`, a
+            list of candidates, most preferred first; candidates left out
+            are not ranked. Casting again replaces the voter's ranking
+
+    Returns:
+        str: JSON string with the success status
+    """
+    logger.info(f"cast_ranked_vote called with args: {args}")
+
+    try:
+        if isinstance(args, str):
+            args_dict = json.loads(args) if args.strip() else {}
+        else:
+            args_dict = args
+
+        proposal = Proposal["proposal_id", args_dict.get("proposal_id")]
+        if not proposal:
+            return json.dumps({"success": False, "error": "Proposal not found"})
+        if not ranked.is_ranked(proposal):
+            return json.dumps(
+                {"success": False, "error": "This proposal takes single-choice votes"}
+            )
+        if lifecycle.is_closed(proposal):
+            return json.dumps(
+                {"success": False, "error": "Voting on this proposal is closed"}
+            )
+
+        try:
+            ranking = ranked.parse_ranking(proposal, args_dict.get("ranking"))
+        except ValueError as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+        voter_id = args_dict.get("voter")
+        voter = get_user(voter_id) if voter_id else None
+        if not voter:
+            return json.dumps({"success": False, "error": f"User {voter_id} not found"})
+
+        log = audit.Accumulator(proposal.proposal_id)
+        delta = ranked.RankedDelta(proposal, log)
+        delta.record(voter.id, ranking)
+        delta.apply()
+        log.save()
 
         return json.dumps(
             {"success": True, "data": {"message": "Vote cast successfully"}}
         )
     except Exception as e:
-        logger.error(f"Error in cast_vote: {str(e)}\n{traceback.format_exc()}")
+        logger.error(f"Error in cast_ranked_vote: {str(e)}\n{traceback.format_exc()}")
+        return json.dumps({"success": False, "error": str(e)})
+
+
+def open_voting(args: str) -> Dict[str, Any]:
+    """
+    Open voting on a proposal until its deadline (admin only).
+
+    Args:
+        args (str): JSON string with proposal_id and either voting_deadline
+            (ISO timestamp) or duration_hours, plus the optional quorum
+            (minimum number of voters), required_threshold and `tally`
+            mode; the "weighted" and "quadratic" modes take the
+            `instrument` whose balances are snapshotted as vote weights.
+            A `ballot` of "ranked" makes it an instant-runoff election
+            among its `candidates`
+
+    Returns:
+        str: JSON string with the updated proposal
+    """
+    logger.info(f"open_voting called with args: {args}")
+
+    try:
+        if isinstance(args, str):
+            args_dict = json.loads(args) if args.strip() else {}
+        else:
+            args_dict = args
+
+        if not _caller_is_admin():
+            return json.dumps(
+                {"success": False, "error": "Only admins can open voting"}
+            )
+
+        proposal = Proposal["proposal_id", args_dict.get("proposal_id")]
+        if not proposal:
+            return json.dumps({"success": False, "error": "Proposal not found"})
+        if proposal.status in ("accepted", "rejected"):
+            return json.dumps(
+                {"success": False, "error": f"Proposal is already {proposal.status}"}
+            )
+
+        voting_deadline = args_dict.get("voting_deadline")
+        if not voting_deadline and args_dict.get("duration_hours"):
+            deadline = lifecycle.now() + int(
+                float(args_dict["duration_hours"]) * 3600
+            )
+            voting_deadline = datetime.utcfromtimestamp(deadline).isoformat() + "Z"
+        if not voting_deadline:
+            return json.dumps(
+                {
+                    "success": False,
+                    "error": "voting_deadline or duration_hours is required",
+                }
+            )
+        if lifecycle.parse_deadline(voting_deadline) <= lifecycle.now():
+            return json.dumps(
+                {"success": False, "error": "voting_deadline must be in the future"}
+            )
+
+        metadata = json.loads(proposal.metadata or "{}")
+        tally_mode = args_dict.get("tally", metadata.get("tally", "count"))
+        if tally_mode not in tally.TALLY_MODES:
+            return json.dumps(
+                {"success": False, "error": f"tally must be one of {tally.TALLY_MODES}"}
+            )
+        if tally_mode != metadata.get("tally", "count") and proposal.total_voters:
+            return json.dumps(
+                {
+                    "success": False,
+                    "error": "The tally mode cannot change once votes were cast",
+                }
+            )
+        instrument = args_dict.get("instrument", metadata.get("instrument"))
+        if tally_mode != "count" and not instrument:
+            return json.dumps(
+                {
+                    "success": False,
+                    "error": f"instrument is required for {tally_mode} voting",
+                }
+            )
+
+        ballot = args_dict.get("ballot", metadata.get("ballot", "choice"))
+        if ballot not in ranked.BALLOT_TYPES:
+            return json.dumps(
+                {
+                    "success": False,
+                    "error": f"ballot must be one of {ranked.BALLOT_TYPES}",
+                }
+            )
+        candidates = args_dict.get("candidates", metadata.get("candidates"))
+        if ballot == "ranked":
+            if tally_mode != "count":
+                return json.dumps(
+                    {
+                        "success": False,
+                        "error": "Ranked ballots are counted one per voter",
+                    }
+                )
+            if (
+                not isinstance(candidates, list)
+                or len(candidates) < 2
+                or len(set(candidates)) != len(candidates)
+                or not all(isinstance(c, str) and c for c in candidates)
+            ):
+                return json.dumps(
+                    {
+                        "success": False,
+                        "error": "candidates must list at least two distinct names",
+                    }
+                )
+        if (
+            ballot != metadata.get("ballot", "choice")
+            or candidates != metadata.get("candidates")
+        ) and proposal.total_voters:
+            return json.dumps(
+                {
+                    "success": False,
+                    "error": "The ballot cannot change once votes were cast",
+                }
+            )
+
+        if "quorum" in args_dict:
+            metadata["quorum"] = int(args_dict["quorum"])
+        if ballot == "ranked":
+            metadata["ballot"] = ballot
+            metadata["candidates"] = candidates
+        else:
+            metadata.pop("ballot", None)
+            metadata.pop("candidates", None)
+        if tally_mode != "count" and (
+            tally_mode != metadata.get("tally")
+            or instrument != metadata.get("instrument")
+        ):
+            # Weights are taken once, when weighted voting opens
+            metadata["snapshot"] = tally.snapshot_number(proposal) + 1
+            tally.start_snapshot(proposal, instrument, metadata["snapshot"])
+            metadata["instrument"] = instrument
+        metadata["tally"] = tally_mode
+        proposal.metadata = json.dumps(metadata)
+        if "required_threshold" in args_dict:
+            proposal.required_threshold = float(args_dict["required_threshold"])
+
+        # Reopening moves the proposal to its new deadline in the queue
+        lifecycle.unschedule(proposal.proposal_id, proposal.voting_deadline)
+        proposal.voting_deadline = voting_deadline
+        proposal.status = "voting"
+        lifecycle.schedule(proposal)
+
+        return json.dumps({"success": True, "data": _proposal_to_dict(proposal)})
+    except Exception as e:
+        logger.error(f"Error in open_voting: {str(e)}\n{traceback.format_exc()}")
+        return json.dumps({"success": False, "error": str(e)})
+
+
+def _caller_is_admin() -> bool:
+    caller = get_user(ic.caller().to_str())
+    return bool(caller) and any(
+        profile.name == "admin" for profile in caller.profiles
+    )
+
+
+# Maximum number of weights accepted by one update_vote_weights call
+MAX_WEIGHT_UPDATES = 10000
+
+
+def _parse_weight(item) -> Tuple[str, float]:
+    """Split an update_vote_weights item into voter and weight, or raise
+    ValueError."""
+    if not isinstance(item, dict):
+        raise ValueError("weight must be a {voter, weight} object")
+    voter_id, weight = item.get("voter"), item.get("weight")
+    if not isinstance(voter_id, str) or not voter_id:
+        raise ValueError("voter must be a user id")
+    if (
+        not isinstance(weight, (int, float))
+        or isinstance(weight, bool)
+        or not math.isfinite(weight)
+        or weight < 0
+    ):
+        raise ValueError("weight must be a non-negative number")
+    return voter_id, float(weight)
+
+
+def update_vote_weights(args: str) -> Dict[str, Any]:
+    """
+    Re-snapshot the weights of voters on a weighted or quadratic proposal
+    (admin only).
+
+    Weights are snapshotted when voting opens; an admin can correct them
+    afterwards, for instance to follow balance changes. The voting power
+    of votes already cast moves along, without recounting the other votes.
+
+    Weights are processed in order until BULK_INSTRUCTION_BUDGET is
+    spent; the rest are left for another call.
+
+    Args:
+        args (str): JSON string with proposal_id and `weights`, a list of
+            at most MAX_WEIGHT_UPDATES {"voter": ..., "weight": ...}
+            objects with non-negative weights
+
+    Returns:
+        str: JSON string with the number of weights `updated`, the
+            `errors` of the items that were skipped, by `index`, and the
+            `next_index` of the first item not processed (None when all
+            were), to resubmit the `unprocessed` rest from
+    """
+    logger.info("update_vote_weights called")
+
+    try:
+        if isinstance(args, str):
+            args_dict = json.loads(args) if args.strip() else {}
+        else:
+            args_dict = args
+
+        if not _caller_is_admin():
+            return json.dumps(
+                {"success": False, "error": "Only admins can update vote weights"}
+            )
+
+        weights = args_dict.get("weights") or []
+        if not isinstance(weights, list):
+            return json.dumps({"success": False, "error": "weights must be a list"})
+        if len(weights) > MAX_WEIGHT_UPDATES:
+            return json.dumps(
+                {
+                    "success": False,
+                    "error": f"At most {MAX_WEIGHT_UPDATES} weights can be "
+                    "updated at once",
+                }
+            )
+
+        proposal = Proposal["proposal_id", args_dict.get("proposal_id")]
+        if not proposal:
+            return json.dumps({"success": False, "error": "Proposal not found"})
+        if tally.get_mode(proposal) == "count":
+            return json.dumps({"success": False, "error": "Proposal is not weighted"})
+        if lifecycle.is_closed(proposal):
+            return json.dumps(
+                {"success": False, "error": "Voting on this proposal is closed"}
+            )
+
+        if not tally.is_ready(proposal):
+            return json.dumps({"success": False, "error": tally.SNAPSHOT_ERROR})
+        if not backfill.catch_up():
+            return json.dumps({"success": False, "error": backfill.INDEXING_ERROR})
+        delta = tally.TallyDelta(proposal)
+        errors = []
+        updated = 0
+        next_index = None
+        for index, item in enumerate(weights):
+            if ic.instruction_counter() > BULK_INSTRUCTION_BUDGET:
+                next_index = index
+                break
+            try:
+                voter_id, new_weight = _parse_weight(item)
+            except ValueError as e:
+                errors.append({"index": index, "error": str(e)})
+                continue
+            old_weight = tally.get_weight(
+                proposal.proposal_id, voter_id, delta.snapshot
+            )
+            if new_weight == old_weight:
+                continue
+            tally.set_weight(proposal.proposal_id, voter_id, new_weight, delta.snapshot)
+            vote = VoteIndex.find(proposal.proposal_id, voter_id)
+            if vote:
+                delta.reweigh(vote.vote_choice, old_weight, new_weight)
+            updated += 1
+        delta.apply()
+
+        unprocessed = 0 if next_index is None else len(weights) - next_index
+        return json.dumps(
+            {
+                "success": True,
+                "data": {
+                    "updated": updated,
+                    "errors": errors,
+                    "next_index": next_index,
+                    "unprocessed": unprocessed,
+                },
+            }
+        )
+    except Exception as e:
+        logger.error(
+            f"Error in update_vote_weights: {str(e)}\n{traceback.format_exc()}"
+        )
+        return json.dumps({"success": False, "error": str(e)})
+
+
+def finalize_due_proposals(args: str) -> Dict[str, Any]:
+    """
+    Finalize the proposals whose voting deadline has passed.
+
+    The lifecycle timer does this every minute; this runs it right away.
+
+    Returns:
+        str: JSON string with the IDs of the accepted and rejected proposals
+    """
+    logger.info(f"finalize_due_proposals called with args: {args}")
+
+    try:
+        return json.dumps({"success": True, "data": lifecycle.finalize_due()})
+    except Exception as e:
+        logger.error(
+            f"Error in finalize_due_proposals: {str(e)}\n{traceback.format_exc()}"
+        )
+        return json.dumps({"success": False, "error": str(e)})
+
+
+def get_ranked_results(args: str) -> Dict[str, Any]:
+    """
+    Tabulate a ranked-choice proposal by instant runoff.
+
+    Args:
+        args (str): JSON string with proposal_id
+
+    Returns:
+        str: JSON string with the `winner` (None without ballots) and the
+            `rounds` of the runoff
+    """
+    logger.info(f"get_ranked_results called with args: {args}")
+
+    try:
+        if isinstance(args, str):
+            args_dict = json.loads(args) if args.strip() else {}
+        else:
+            args_dict = args
+
+        proposal = Proposal["proposal_id", args_dict.get("proposal_id")]
+        if not proposal:
+            return json.dumps({"success": False, "error": "Proposal not found"})
+        if not ranked.is_ranked(proposal):
+            return json.dumps(
+                {"success": False, "error": "This proposal takes single-choice votes"}
+            )
+        if not backfill.catch_up():
+            return json.dumps({"success": False, "error": backfill.INDEXING_ERROR})
+
+        result = ranked.tabulate(proposal)
+        result["total_voters"] = int(proposal.total_voters or 0)
+        return json.dumps({"success": True, "data": result})
+    except Exception as e:
+        logger.error(f"Error in get_ranked_results: {str(e)}\n{traceback.format_exc()}")
+        return json.dumps({"success": False, "error": str(e)})
+
+
+def _tree_size(args_dict: Dict[str, Any], proposal_id: str) -> int:
+    # The current log size, or an earlier one the caller already holds a
+    # root for
+    current = audit.size(proposal_id)
+    tree_size = args_dict.get("tree_size", current)
+    if not isinstance(tree_size, int) or not 0 <= tree_size <= current:
+        raise ValueError(f"tree_size must be an integer from 0 to {current}")
+    return tree_size
+
+
+def get_vote_root(args: str) -> Dict[str, Any]:
+    """
+    Get the Merkle root of the vote audit log of a proposal.
+
+    Args:
+        args (str): JSON string with proposal_id and optionally tree_size,
+            to get the root of the log when it held that many votes
+
+    Returns:
+        str: JSON string with the `root`, `tree_size` and current `votes`;
+            the root covers the logged ballots, not the `votes` tally
+    """
+    logger.info(f"get_vote_root called with args: {args}")
+
+    try:
+        if isinstance(args, str):
+            args_dict = json.loads(args) if args.strip() else {}
+        else:
+            args_dict = args
+
+        proposal = Proposal["proposal_id", args_dict.get("proposal_id")]
+        if not proposal:
+            return json.dumps({"success": False, "error": "Proposal not found"})
+
+        tree_size = _tree_size(args_dict, proposal.proposal_id)
+        return json.dumps(
+            {
+                "success": True,
+                "data": {
+                    "proposal_id": proposal.proposal_id,
+                    "tree_size": tree_size,
+                    "root": audit.root(proposal.proposal_id, tree_size),
+                    "votes": tally.totals(proposal),
+                },
+            }
+        )
+    except ValueError as e:
+        return json.dumps({"success": False, "error": str(e)})
+    except Exception as e:
+        logger.error(f"Error in get_vote_root: {str(e)}\n{traceback.format_exc()}")
+        return json.dumps({"success": False, "error": str(e)})
+
+
+def get_vote_proof(args: str) -> Dict[str, Any]:
+    """
+    Get the inclusion proof of a vote in the audit log of a proposal.
+
+    Args:
+        args (str): JSON string with proposal_id and either `voter`, for
+            their current vote, or the `sequence` of a leaf; optionally
+            tree_size, to prove inclusion in an earlier root
+
+    Returns:
+        str: JSON string with the `leaf_hash`, `sequence`, `tree_size`,
+            `root` and `proof` (sibling hashes from the leaf up), plus the
+            `leaf` [voter, choice, sequence] when asked by voter
+    """
+    logger.info(f"get_vote_proof called with args: {args}")
+
+    try:
+        if isinstance(args, str):
+            args_dict = json.loads(args) if args.strip() else {}
+        else:
+            args_dict = args
+
+        proposal = Proposal["proposal_id", args_dict.get("proposal_id")]
+        if not proposal:
+            return json.dumps({"success": False, "error": "Proposal not found"})
+        proposal_id = proposal.proposal_id
+        tree_size = _tree_size(args_dict, proposal_id)
+
+        leaf = None
+        if args_dict.get("voter") and ranked.is_ranked(proposal):
+            ballot = ranked.find_ballot(proposal_id, args_dict["voter"])
+            if not ballot:
+                return json.dumps(
+                    {"success": False, "error": "No logged vote of this voter"}
+                )
+            sequence = ballot.sequence
+            leaf = [args_dict["voter"], json.loads(ballot.ranking), sequence]
+        elif args_dict.get("voter"):
+            if not backfill.catch_up():
+                return json.dumps({"success": False, "error": backfill.INDEXING_ERROR})
+            vote = VoteIndex.find(proposal_id, args_dict["voter"])
+            sequence = (
+                json.loads(vote.metadata or "{}").get("sequence") if vote else None
+            )
+            if sequence is None:
+                return json.dumps(
+                    {"success": False, "error": "No logged vote of this voter"}
+                )
+            leaf = [args_dict["voter"], vote.vote_choice, sequence]
+        else:
+            sequence = args_dict.get("sequence")
+            if not isinstance(sequence, int):
+                return json.dumps(
+                    {"success": False, "error": "voter or sequence is required"}
+                )
+
+        if not 0 <= sequence < tree_size:
+            return json.dumps(
+                {"success": False, "error": "The vote is not in a log of this size"}
+            )
+
+        return json.dumps(
+            {
+                "success": True,
+                "data": {
+                    "proposal_id": proposal_id,
+                    "leaf": leaf,
+                    "leaf_hash": audit.subtree_hash(
+                        proposal_id, sequence, sequence + 1
+                    ),
+                    "sequence": sequence,
+                    "tree_size": tree_size,
+                    "root": audit.root(proposal_id, tree_size),
+                    "proof": audit.inclusion_proof(proposal_id, sequence, tree_size),
+                },
+            }
+        )
+    except ValueError as e:
+        return json.dumps({"success": False, "error": str(e)})
+    except Exception as e:
+        logger.error(f"Error in get_vote_proof: {str(e)}\n{traceback.format_exc()}")
         return json.dumps({"success": False, "error": str(e)})
 
 
@@ -243,4 +1027,12 @@ EXTENSION_FUNCTIONS = {
     "get_proposal": get_proposal,
     "submit_proposal": submit_proposal,
     "cast_vote": cast_vote,
+    "cast_votes_bulk": cast_votes_bulk,
+    "cast_ranked_vote": cast_ranked_vote,
+    "open_voting": open_voting,
+    "update_vote_weights": update_vote_weights,
+    "finalize_due_proposals": finalize_due_proposals,
+    "get_vote_root": get_vote_root,
+    "get_vote_proof": get_vote_proof,
+    "get_ranked_results": get_ranked_results,
 }
@@ -0,0 +1,138 @@
+"""
+Index Helpers
+
+Secondary indexes kept as entities with a `key` alias and a `values`
+field holding a sorted JSON list, such as registration codes or proposal
+IDs listed under an index key.
+"""
+
+import bisect
+import json
+
+
+def _hashable(value):
+    # Index values are strings, numbers or flat [sort key, ID] pairs
+    return tuple(value) if isinstance(value, list) else value
+
+
+class SortedListIndex:
+    """
+    Mixin of the read and write helpers of a sorted-list index entity.
+
+    The entity class defines `key` (its alias) and `values`:
+
+        class ProposalIndex(ExtensionEntity, SortedListIndex):
+            __alias__ = "key"
+
+            key = String(max_length=128)
+            values = String()
+
+    Lists that can grow without bound are paged: the values of a paged key
+    <name> are split into pages, each stored under <name>:<page>, and
+    <name> lists the non-empty page numbers. The caller picks the page of
+    a value, so adding or removing it rewrites a single bounded page.
+    """
+
+    @classmethod
+    def get(cls, key: str) -> list:
+        """Return the values stored under a key."""
+        entry = cls["key", key]
+        return json.loads(entry.values) if entry and entry.values else []
+
+    @classmethod
+    def add(cls, key: str, value) -> None:
+        """Add a value to a key, keeping the list sorted."""
+        entry = cls["key", key]
+        if not entry:
+            cls(key=key, values=json.dumps([value]))
+            return
+        values = json.loads(entry.values) if entry.values else []
+        position = bisect.bisect_left(values, value)
+        if position == len(values) or values[position] != value:
+            values.insert(position, value)
+            entry.values = json.dumps(values)
+
+    @classmethod
+    def add_many(cls, key: str, values: list) -> int:
+        """
+        Add several values to a key with a single write.
+
+        Returns the number of values that were not present yet.
+        """
+        entry = cls["key", key]
+        current = json.loads(entry.values) if entry and entry.values else []
+        merged = {_hashable(value): value for value in current}
+        merged.update((_hashable(value), value) for value in values)
+        if not entry:
+            cls(key=key, values=json.dumps(sorted(merged.values())))
+        elif len(merged) != len(current):
+            entry.values = json.dumps(sorted(merged.values()))
+        return len(merged) - len(current)
+
+    @classmethod
+    def put(cls, key: str, values: list) -> None:
+        """Replace the values of a key, dropping the entry if there are none."""
+        entry = cls["key", key]
+        if not values:
+            if entry:
+                entry.delete()
+        elif not entry:
+            cls(key=key, values=json.dumps(values))
+        elif json.loads(entry.values or "[]") != values:
+            entry.values = json.dumps(values)
+
+    @classmethod
+    def remove(cls, key: str, value) -> bool:
+        """
+        Remove a value from a key, dropping the entry once it is empty.
+
+        Returns whether the value was present.
+        """
+        return cls.remove_many(key, [value]) > 0
+
+    @classmethod
+    def remove_many(cls, key: str, values: list) -> int:
+        """
+        Remove several values from a key with a single write, dropping the
+        entry once it is empty.
+
+        Returns the number of values that were present.
+        """
+        entry = cls["key", key]
+        if not entry:
+            return 0
+        current = json.loads(entry.values) if entry.values else []
+        removed = {_hashable(value) for value in values}
+        remaining = [value for value in current if _hashable(value) not in removed]
+        if len(remaining) == len(current):
+            return 0
+        if remaining:
+            entry.values = json.dumps(remaining)
+        else:
+            entry.delete()
+        return len(current) - len(remaining)
+
+    @classmethod
+    def add_paged(cls, name: str, page: int, values: list) -> int:
+        """
+        Add values to one page of a paged key.
+
+        Returns the number of values that were not present yet.
+        """
+        added = cls.add_many(f"{name}:{page}", values)
+        cls.add(name, page)
+        return added
+
+    @classmethod
+    def remove_paged(cls, name: str, page: int, values: list) -> int:
+        """
+        Remove values from one page of a paged key, dropping the page once
+        it is empty and the key once it has no pages.
+
+        Returns the number of values that were present.
+        """
+        page_key = f"{name}:{page}"
+        removed = cls.remove_many(page_key, values)
+        if removed and not cls["key", page_key]:
+            cls.remove(name, page)
+        return removed
@@ -0,0 +1,243 @@
+"""
+Voting Proposal Lifecycle
+
+Closes voting on proposals once their deadline has passed. Proposals in
+voting are queued by deadline in ProposalIndex buckets, so a timer tick only
+loads the proposals that are due rather than every proposal in the realm.
+Proposals stored without being queued, such as those loaded as data, are
+queued QUEUE_BATCH_SIZE at a time by rebuild_queue(): a first batch from
+initialize(), then one per timer tick until the queue is caught up.
+
+A due proposal is finalized from its maintained tally (see tally.py):
+
+- it is rejected when fewer voters than its quorum took part;
+- otherwise it is accepted when the yes votes make up at least its
+  required_threshold of the yes and no voting power, and rejected if not;
+- a ranked-choice proposal is accepted when the instant runoff elects a
+  winner (see ranked.py), which is kept in its metadata.
+
+The quorum is read from the "quorum" key of the proposal metadata and
+defaults to DEFAULT_QUORUM.
+"""
+
+import bisect
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from ggg import Proposal
+from kybra import Duration, TimerId, ic
+from kybra_simple_logging import get_logger
+
+from . import backfill, ranked, tally
+from .models import ProposalIndex, VotingState
+
+logger = get_logger("extensions.voting.lifecycle")
+
+# Width of the deadline buckets of the proposal deadline queue
+DEADLINE_BUCKET_SECONDS = 3600
+
+# Time between timer-driven checks for due proposals
+LIFECYCLE_INTERVAL_SECONDS = 60
+
+# Voters a proposal needs when its metadata sets no quorum
+DEFAULT_QUORUM = 0
+
+# Proposals checked per rebuild_queue call
+QUEUE_BATCH_SIZE = 500
+
+_timer_id: Optional[TimerId] = None
+_queue_timer_id: Optional[TimerId] = None
+
+
+def parse_deadline(value: str) -> Optional[int]:
+    """Convert an ISO voting deadline to a timestamp, None if unset."""
+    if not value:
+        return None
+    deadline = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if deadline.tzinfo is None:
+        deadline = deadline.replace(tzinfo=timezone.utc)
+    return int(deadline.timestamp())
+
+
+def now() -> int:
+    return int(datetime.utcnow().replace(tzinfo=timezone.utc).timestamp())
+
+
+def is_closed(proposal: Proposal) -> bool:
+    """Whether voting on a proposal has ended, finalized or not."""
+    if proposal.status in ("accepted", "rejected"):
+        return True
+    deadline = parse_deadline(proposal.voting_deadline)
+    return deadline is not None and deadline <= now()
+
+
+def schedule(proposal: Proposal) -> None:
+    """Queue a proposal in voting for finalization at its deadline."""
+    deadline = parse_deadline(proposal.voting_deadline)
+    if proposal.status != "voting" or deadline is None:
+        return
+    bucket = deadline // DEADLINE_BUCKET_SECONDS
+    ProposalIndex.add(f"deadline:{bucket}", proposal.proposal_id)
+    ProposalIndex.add("deadline_buckets", bucket)
+
+
+def unschedule(proposal_id: str, voting_deadline: str) -> None:
+    """Remove a proposal from the deadline queue."""
+    deadline = parse_deadline(voting_deadline)
+    if deadline is None:
+        return
+    bucket = deadline // DEADLINE_BUCKET_SECONDS
+    ProposalIndex.remove(f"deadline:{bucket}", proposal_id)
+    if not ProposalIndex.get(f"deadline:{bucket}"):
+        ProposalIndex.remove("deadline_buckets", bucket)
+
+
+def _schedule_queue() -> None:
+    global _queue_timer_id
+    if _queue_timer_id is None:
+        _queue_timer_id = ic.set_timer(Duration(0), _on_queue_timer)
+
+
+def _on_queue_timer() -> None:
+    global _queue_timer_id
+    _queue_timer_id = None
+    try:
+        rebuild_queue()
+    except Exception as e:
+        logger.error(f"Error queueing proposals: {str(e)}")
+
+
+def rebuild_queue(limit: int = QUEUE_BATCH_SIZE) -> bool:
+    """
+    Queue the proposals in voting among up to `limit` of those stored since
+    the last call, such as those loaded as data.
+
+    Proposals up to the stored "queued_proposal_id" marker were queued
+    already, or are queued as voting opens on them, so only newer ones
+    are loaded.
+
+    Returns whether every proposal was checked; if not, a timer checks the
+    next batch.
+    """
+    state = VotingState["key", "queued_proposal_id"]
+    queued = int(state.value) if state else 0
+    max_id = Proposal.max_id()
+    if max_id <= queued:
+        return True
+    proposals = Proposal.load_some(queued + 1, limit)
+    for proposal in proposals:
+        if proposal.status == "voting" and proposal.voting_deadline:
+            schedule(proposal)
+    queued = int(proposals[-1]._id) if len(proposals) == limit else max_id
+    if state:
+        state.value = str(queued)
+    else:
+        VotingState(key="queued_proposal_id", value=str(queued))
+    if queued >= max_id:
+        return True
+    _schedule_queue()
+    return False
+
+
+def quorum(proposal: Proposal) -> int:
+    try:
+        metadata = json.loads(proposal.metadata or "{}")
+    except ValueError:
+        metadata = {}
+    return int(metadata.get("quorum", DEFAULT_QUORUM))
+
+
+def finalize(proposal: Proposal) -> str:
+    """Set the final status of a proposal from its tally."""
+    if ranked.is_ranked(proposal):
+        return _finalize_ranked(proposal)
+    totals = tally.totals(proposal)
+    yes, no = totals["yes"], totals["no"]
+    if (proposal.total_voters or 0) < quorum(proposal) or yes + no == 0:
+        status = "rejected"
+    elif yes / (yes + no) >= (proposal.required_threshold or 0):
+        status = "accepted"
+    else:
+        status = "rejected"
+    proposal.status = status
+    return status
+
+
+def _finalize_ranked(proposal: Proposal) -> str:
+    # The election is decided when it has a winner, who is kept in the
+    # metadata; get_ranked_results still shows the rounds
+    result = ranked.tabulate(proposal)
+    metadata = json.loads(proposal.metadata or "{}")
+    metadata["winner"] = result["winner"]
+    if (proposal.total_voters or 0) < quorum(proposal) or result["winner"] is None:
+        status = "rejected"
+    else:
+        status = "accepted"
+    proposal.metadata = json.dumps(metadata)
+    proposal.status = status
+    return status
+
+
+def finalize_due(timestamp: int = None) -> Dict[str, Any]:
+    """
+    Finalize the proposals whose deadline is at or before `timestamp`.
+
+    Returns:
+        Dict with the IDs of the `accepted` and `rejected` proposals
+    """
+    timestamp = now() if timestamp is None else timestamp
+    result = {"accepted": [], "rejected": []}
+
+    # Whether ranking buckets loaded as data are listed, checked once
+    indexed = None
+
+    buckets = ProposalIndex.get("deadline_buckets")
+    last_due = bisect.bisect_right(buckets, timestamp // DEADLINE_BUCKET_SECONDS)
+    for bucket in buckets[:last_due]:
+        pending = []
+        for proposal_id in ProposalIndex.get(f"deadline:{bucket}"):
+            proposal = Proposal["proposal_id", proposal_id]
+            if not proposal or proposal.status != "voting":
+                continue
+            deadline = parse_deadline(proposal.voting_deadline)
+            if deadline is not None and deadline > timestamp:
+                # Due later within the current bucket
+                pending.append(proposal_id)
+                continue
+            if ranked.is_ranked(proposal):
+                if indexed is None:
+                    indexed = backfill.catch_up()
+                if not indexed:
+                    # Tabulated once every ranking is listed
+                    pending.append(proposal_id)
+                    continue
+            result[finalize(proposal)].append(proposal_id)
+
+        ProposalIndex.put(f"deadline:{bucket}", pending)
+        if not pending:
+            ProposalIndex.remove("deadline_buckets", bucket)
+
+    return result
+
+
+def start_timer() -> None:
+    """(Re)start the periodic check for due proposals."""
+    global _timer_id
+    if _timer_id is not None:
+        ic.clear_timer(_timer_id)
+    _timer_id = ic.set_timer_interval(Duration(LIFECYCLE_INTERVAL_SECONDS), _on_timer)
+
+
+def _on_timer() -> None:
+    try:
+        # Proposals loaded as data since the last tick
+        rebuild_queue()
+        result = finalize_due()
+        if result["accepted"] or result["rejected"]:
+            logger.info(
+                f"Finalized proposals, accepted: {result['accepted']}, "
+                f"rejected: {result['rejected']}"
+            )
+    except Exception as e:
+        logger.error(f"Proposal finalization failed: {str(e)}")
@@ -0,0 +1,338 @@
+"""
+Voting Proposal Listing
+
+Keeps the ProposalIndex entries that get_proposals pages through, from a
+kybra_simple_db `on_event` hook on Proposal, so that every status or
+deadline change is indexed, whichever code makes it:
+
+    status:<status>            entity IDs of the proposals with a status,
+                               in creation order
+    status_deadline:<status>   [deadline, entity ID] pairs of those
+                               proposals, in deadline order
+    deadline_order             [deadline, entity ID] pairs of all proposals
+
+Each list is paged (see SortedListIndex), so that indexing a proposal
+rewrites one bounded page and a listing page reads only the pages it
+covers: entity IDs by LISTING_PAGE_SIZE IDs, and pairs by
+DEADLINE_PAGE_SECONDS of deadline, which keeps the pages of a list in
+order. The length of each list is kept under count:<list>.
+
+Proposals without a deadline sort after all others. Listing all proposals
+in creation order needs no index, as entity IDs are assigned in that order.
+
+The hook keeps the proposals up to the "listed_proposal_id" cursor
+indexed. Newer proposals, such as those created since or loaded as data,
+are indexed by rebuild_indexes(), REBUILD_BATCH_SIZE at a time: a first
+batch from initialize(), then one per timer tick, and one before each
+listing page. When LISTING_VERSION changes, the entries of the previous
+layout are first deleted in batches the same way and the cursor restarts,
+so no call loads every proposal or index entry at once.
+"""
+
+import bisect
+import json
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from ggg import Proposal
+from kybra import Duration, TimerId, ic
+from kybra_simple_db import ACTION_CREATE, ACTION_DELETE, ACTION_MODIFY
+from kybra_simple_db.properties import PROPERTY_STORAGE_PREFIX
+from kybra_simple_logging import get_logger
+
+from .lifecycle import parse_deadline
+from .models import ProposalIndex, VotingState
+
+logger = get_logger("extensions.voting.listing")
+
+# Sort position of proposals without a voting deadline
+NO_DEADLINE = 2**53
+
+ORDERS = ("created", "deadline")
+
+# Entity IDs covered by one page of a status:<status> list
+LISTING_PAGE_SIZE = 500
+
+# Deadlines covered by one page of a list of [deadline, entity ID] pairs
+DEADLINE_PAGE_SECONDS = 7 * 24 * 3600
+
+# Layout version of the listing index; the index is rebuilt when it changes
+LISTING_VERSION = 3
+
+# Proposals, or index entries of a previous layout, handled per
+# rebuild_indexes call
+REBUILD_BATCH_SIZE = 500
+
+# Error returned while proposals are still being indexed
+INDEXING_ERROR = "Proposals are still being indexed, please try again shortly"
+
+# Prefixes of the ProposalIndex keys kept by this module
+_KEY_PREFIXES = ("status:", "status_deadline:", "deadline_order", "count:")
+
+_hooks_installed = False
+_timer_id: Optional[TimerId] = None
+
+
+def _deadline_key(voting_deadline: str) -> int:
+    try:
+        deadline = parse_deadline(voting_deadline)
+    except ValueError:
+        deadline = None
+    return NO_DEADLINE if deadline is None else deadline
+
+
+def _id_page(entity_id: int) -> int:
+    return entity_id // LISTING_PAGE_SIZE
+
+
+def _pair_page(pair: list) -> int:
+    return pair[0] // DEADLINE_PAGE_SECONDS
+
+
+def _add_count(name: str, delta: int) -> None:
+    if not delta:
+        return
+    key = f"count:{name}"
+    entry = ProposalIndex["key", key]
+    if entry:
+        entry.values = str(int(entry.values) + delta)
+    else:
+        ProposalIndex(key=key, values=str(delta))
+
+
+def _count(name: str) -> int:
+    entry = ProposalIndex["key", f"count:{name}"]
+    return int(entry.values) if entry else 0
+
+
+def _add(name: str, page: int, value) -> None:
+    _add_count(name, ProposalIndex.add_paged(name, page, [value]))
+
+
+def _remove(name: str, page: int, value) -> None:
+    _add_count(name, -ProposalIndex.remove_paged(name, page, [value]))
+
+
+def _entries(entity_id: int, status: str, voting_deadline: str) -> Iterator:
+    # (list, page, value) of each list entry of a proposal
+    pair = [_deadline_key(voting_deadline), entity_id]
+    yield "deadline_order", _pair_page(pair), pair
+    if status:
+        yield f"status:{status}", _id_page(entity_id), entity_id
+        yield f"status_deadline:{status}", _pair_page(pair), pair
+
+
+def _index(entity_id: int, status: str, voting_deadline: str) -> None:
+    for name, page, value in _entries(entity_id, status, voting_deadline):
+        _add(name, page, value)
+
+
+def _unindex(entity_id: int, status: str, voting_deadline: str) -> None:
+    for name, page, value in _entries(entity_id, status, voting_deadline):
+        _remove(name, page, value)
+
+
+def _get_state(key: str, default: Any = None) -> Any:
+    state = VotingState["key", key]
+    return json.loads(state.value) if state else default
+
+
+def _set_state(key: str, value: Any) -> None:
+    state = VotingState["key", key]
+    if value is None:
+        if state:
+            state.delete()
+    elif state:
+        state.value = json.dumps(value)
+    else:
+        VotingState(key=key, value=json.dumps(value))
+
+
+def _is_loading(entity, field_name: str) -> bool:
+    # Loading an entity sets its fields while saving is off, before they are
+    # stored; fields never set before are not stored either, but are then
+    # assigned with saving on
+    return (
+        getattr(entity, "_do_not_save", False)
+        and f"_{PROPERTY_STORAGE_PREFIX}_{field_name}" not in entity.__dict__
+    )
+
+
+def _on_proposal_event(entity, field_name, old_value, new_value, action):
+    try:
+        entity_id = int(entity._id)
+        if entity_id > _get_state("listed_proposal_id", 0):
+            # Indexed by rebuild_indexes() once the cursor reaches it
+            return True, new_value
+        if action == ACTION_DELETE:
+            _unindex(entity_id, entity.status, entity.voting_deadline)
+        elif (
+            action in (ACTION_CREATE, ACTION_MODIFY)
+            and field_name in ("status", "voting_deadline")
+            and old_value != new_value
+            and not (action == ACTION_MODIFY and _is_loading(entity, field_name))
+        ):
+            old = {"status": entity.status, "voting_deadline": entity.voting_deadline}
+            new = dict(old, **{field_name: new_value})
+            old[field_name] = old_value
+            _unindex(entity_id, old["status"], old["voting_deadline"])
+            _index(entity_id, new["status"], new["voting_deadline"])
+    except Exception as e:
+        logger.error(f"Error indexing proposal: {str(e)}")
+    return True, new_value
+
+
+def _chained(previous_hook):
+    """Wrap an entity hook so that the listing index is updated first."""
+
+    def on_event(entity, field_name, old_value, new_value, action):
+        _on_proposal_event(entity, field_name, old_value, new_value, action)
+        if previous_hook:
+            return previous_hook(entity, field_name, old_value, new_value, action)
+        return True, new_value
+
+    return staticmethod(on_event)
+
+
+def install_hooks() -> None:
+    """
+    Attach the listing index hook to Proposal.
+
+    A hook already attached to Proposal keeps running after it.
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    Proposal.on_event = _chained(getattr(Proposal, "on_event", None))
+    _hooks_installed = True
+
+
+def _schedule() -> None:
+    global _timer_id
+    if _timer_id is None:
+        _timer_id = ic.set_timer(Duration(0), _on_timer)
+
+
+def _on_timer() -> None:
+    global _timer_id
+    _timer_id = None
+    try:
+        rebuild_indexes()
+    except Exception as e:
+        logger.error(f"Error indexing proposals: {str(e)}")
+
+
+def _delete_stale(limit: int) -> bool:
+    # Delete the next `limit` index entries of a previous layout, up to the
+    # last entry that existed when the layout changed
+    stale = _get_state("listing_stale")
+    if not stale:
+        return True
+    first, last = stale
+    entries = ProposalIndex.load_some(first, limit)
+    for entry in entries:
+        if int(entry._id) <= last and entry.key.startswith(_KEY_PREFIXES):
+            entry.delete()
+    first = int(entries[-1]._id) + 1 if len(entries) == limit else last + 1
+    _set_state("listing_stale", [first, last] if first <= last else None)
+    return first > last
+
+
+def rebuild_indexes(limit: int = REBUILD_BATCH_SIZE) -> bool:
+    """
+    Index up to `limit` of the proposals past the "listed_proposal_id"
+    cursor, such as those stored before the hook existed or loaded as data.
+
+    When LISTING_VERSION changed, the entries of the previous layout are
+    deleted first, `limit` index entries per call, and every proposal is
+    indexed again.
+
+    Returns whether every proposal is indexed; if not, a timer indexes the
+    next batch.
+    """
+    if _get_state("listing_version") != LISTING_VERSION:
+        max_entry_id = ProposalIndex.max_id()
+        _set_state("listing_stale", [1, max_entry_id] if max_entry_id else None)
+        _set_state("listed_proposal_id", 0)
+        _set_state("listing_version", LISTING_VERSION)
+    if not _delete_stale(limit):
+        _schedule()
+        return False
+
+    listed = _get_state("listed_proposal_id", 0)
+    max_id = Proposal.max_id()
+    if max_id <= listed:
+        return True
+    proposals = Proposal.load_some(listed + 1, limit)
+    pages = {}
+    for proposal in proposals:
+        entity_id = int(proposal._id)
+        for name, page, value in _entries(
+            entity_id, proposal.status, proposal.voting_deadline
+        ):
+            pages.setdefault((name, page), []).append(value)
+    for (name, page), values in pages.items():
+        _add_count(name, ProposalIndex.add_paged(name, page, values))
+    listed = int(proposals[-1]._id) if len(proposals) == limit else max_id
+    _set_state("listed_proposal_id", listed)
+    if listed >= max_id:
+        return True
+    _schedule()
+    return False
+
+
+def _values_after(name: str, after, page_of: Callable) -> Iterator:
+    # Values of a paged list above `after` (all if None), in order
+    pages = ProposalIndex.get(name)
+    first = 0 if after is None else bisect.bisect_left(pages, page_of(after))
+    for page in pages[first:]:
+        values = ProposalIndex.get(f"{name}:{page}")
+        start = 0 if after is None else bisect.bisect_right(values, after)
+        yield from values[start:]
+
+
+def page(
+    status: Optional[str] = None,
+    order_by: str = "created",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Proposal], int, Optional[str]]:
+    """
+    Get one page of proposals, optionally only those with a status.
+
+    Returns:
+        The proposals of the page, the total number of matching proposals
+        and the cursor of the next page (None on the last page)
+    """
+    after = json.loads(cursor) if cursor else None
+
+    if not status and order_by == "created":
+        # Entity IDs follow creation order, so pages come from an ID range
+        total = Proposal.count()
+        first = int(after) + 1 if after else 1
+        max_id = Proposal.max_id()
+        count = max_id - first + 1 if limit is None else limit
+        proposals = Proposal.load_some(first, count) if count > 0 else []
+        last = int(proposals[-1]._id) if proposals else max_id
+        return proposals, total, json.dumps(last) if last < max_id else None
+
+    if order_by == "created":
+        name, page_of = f"status:{status}", _id_page
+    elif status:
+        name, page_of = f"status_deadline:{status}", _pair_page
+    else:
+        name, page_of = "deadline_order", _pair_page
+
+    keys = []
+    next_cursor = None
+    for key in _values_after(name, after, page_of):
+        if limit is not None and len(keys) == limit:
+            next_cursor = json.dumps(keys[-1])
+            break
+        keys.append(key)
+
+    proposals = []
+    for key in keys:
+        proposal = Proposal.load(str(key[1] if isinstance(key, list) else key))
+        if proposal and (not status or proposal.status == status):
+            proposals.append(proposal)
+    return proposals, _count(name), next_cursor
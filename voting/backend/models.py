@@ -0,0 +1,291 @@
+"""
+Voting Models
+
+This module contains database models specific to the voting extension.
+"""
+
+from typing import Optional
+
+from core.extensions import create_extension_entity_class
+from ggg import Vote
+from kybra_simple_db import Float, Integer, String
+
+from .indexes import SortedListIndex
+
+ExtensionEntity = create_extension_entity_class("voting")
+
+
+class VotingState(ExtensionEntity):
+    """
+    Model for internal key/value state of the voting extension.
+
+    Stored with namespace: ext_voting::VotingState
+    """
+
+    __alias__ = "key"
+    __export__ = False
+
+    key = String()
+    value = String()
+
+
+class IdSequence(ExtensionEntity):
+    """
+    Model for a persistent counter handing out sequential numbers.
+
+    Stored with namespace: ext_voting::IdSequence
+
+    Attributes:
+        namespace (str): Name of the sequence (alias)
+        value (int): Last number handed out
+    """
+
+    __alias__ = "namespace"
+    __export__ = False
+
+    namespace = String(max_length=64)
+    value = Integer(default=0)
+
+    @classmethod
+    def reserve(cls, namespace: str, count: int = 1, start: int = 0) -> range:
+        """
+        Reserve the next `count` numbers of a sequence in one write.
+
+        The sequence continues after `start` when that is higher, such as
+        for a sequence used for the first time, or after entities were
+        loaded as data.
+        """
+        sequence = cls["namespace", namespace] or cls(namespace=namespace, value=start)
+        first = max(sequence.value, start) + 1
+        sequence.value = first + count - 1
+        return range(first, first + count)
+
+    @classmethod
+    def next_id(cls, namespace: str, start: int = 0) -> int:
+        """Get the next number of a sequence."""
+        return cls.reserve(namespace, 1, start)[0]
+
+
+class ProposalIndex(ExtensionEntity, SortedListIndex):
+    """
+    Model for one entry of the proposal secondary indexes.
+
+    Keys used by the proposal lifecycle:
+        deadline:<bucket>    open proposals whose voting deadline falls
+                             within a DEADLINE_BUCKET_SECONDS window
+        deadline_buckets     sorted list of non-empty deadline buckets
+
+    Keys of the proposal listing are described in listing.py; ranked-choice
+    proposals list their distinct rankings under the paged
+    ranking_buckets:<proposal_id> key (see ranked.py).
+
+    Stored with namespace: ext_voting::ProposalIndex
+
+    Attributes:
+        key (str): Index key (alias)
+        values (str): JSON list of proposal IDs (or bucket numbers)
+    """
+
+    __alias__ = "key"
+    __export__ = False
+
+    key = String(max_length=128)
+    values = String()
+
+
+class VoteIndex(ExtensionEntity):
+    """
+    Model for the unique (proposal, voter) index of votes.
+
+    Votes cast through this extension are indexed as they are created;
+    votes created any other way, such as by data import, are indexed by
+    catch_up(), from the Vote IDs above the `indexed_vote_id` cursor, in
+    batches (see backfill.py).
+
+    Stored with namespace: ext_voting::VoteIndex
+
+    Attributes:
+        key (str): "<proposal_id>:<voter id>" (alias)
+        vote_id (str): _id of the Vote
+    """
+
+    __alias__ = "key"
+    __export__ = False
+
+    key = String(max_length=256)
+    vote_id = String(max_length=64)
+
+    @staticmethod
+    def make_key(proposal_id: str, voter_id: str) -> str:
+        return f"{proposal_id}:{voter_id}"
+
+    @classmethod
+    def find(cls, proposal_id: str, voter_id: str) -> Optional[Vote]:
+        """Get the vote of a voter on a proposal, or None."""
+        entry = cls["key", cls.make_key(proposal_id, voter_id)]
+        if not entry:
+            return None
+        vote = Vote.load(entry.vote_id)
+        if not vote:
+            # The vote was deleted outside of this extension
+            entry.delete()
+        return vote
+
+    @classmethod
+    def add(cls, vote: Vote) -> None:
+        """Index a vote, unless it is indexed already."""
+        if not vote.proposal or not vote.voter:
+            return
+        key = cls.make_key(vote.proposal.proposal_id, vote.voter.id)
+        entry = cls["key", key]
+        if not entry:
+            cls(key=key, vote_id=vote._id)
+        elif entry.vote_id != vote._id:
+            entry.vote_id = vote._id
+
+    @classmethod
+    def catch_up(cls, limit: int) -> bool:
+        """
+        Index up to `limit` of the votes created since the last catch_up.
+
+        Returns whether every vote is indexed.
+        """
+        state = VotingState["key", "indexed_vote_id"]
+        indexed = int(state.value) if state else 0
+        max_id = Vote.max_id()
+        if max_id <= indexed:
+            return True
+        votes = Vote.load_some(indexed + 1, limit)
+        for vote in votes:
+            cls.add(vote)
+        indexed = int(votes[-1]._id) if len(votes) == limit else max_id
+        cls.set_cursor(indexed)
+        return indexed >= max_id
+
+    @classmethod
+    def set_cursor(cls, vote_id: int) -> None:
+        """Record that every Vote up to `vote_id` is indexed."""
+        state = VotingState["key", "indexed_vote_id"]
+        if state:
+            state.value = str(vote_id)
+        else:
+            VotingState(key="indexed_vote_id", value=str(vote_id))
+
+
+class VoteWeight(ExtensionEntity):
+    """
+    Model for the weight of a voter on a weighted or quadratic proposal.
+
+    Weights are snapshotted from balances when voting opens.
+
+    Stored with namespace: ext_voting::VoteWeight
+
+    Attributes:
+        key (str): "<proposal_id>:<voter id>" (alias)
+        weight (float): Balance of the voter when voting opened
+        snapshot (int): Number of the snapshot that set the weight
+    """
+
+    __alias__ = "key"
+
+    key = String(max_length=256)
+    weight = Float(default=0.0)
+    snapshot = Integer(default=0)
+
+
+class ProposalTally(ExtensionEntity):
+    """
+    Model for the weighted vote totals of a proposal.
+
+    Proposal.votes_yes, votes_no and votes_abstain count voters; these hold
+    the sum of the voting power behind each choice, updated on every vote.
+
+    Stored with namespace: ext_voting::ProposalTally
+
+    Attributes:
+        proposal_id (str): ID of the proposal (alias)
+        yes (float): Voting power of the yes votes
+        no (float): Voting power of the no votes
+        abstain (float): Voting power of the abstain votes
+    """
+
+    __alias__ = "proposal_id"
+
+    proposal_id = String(max_length=64)
+    yes = Float(default=0.0)
+    no = Float(default=0.0)
+    abstain = Float(default=0.0)
+
+
+class VoteLog(ExtensionEntity):
+    """
+    Model for the size of the vote audit log of a proposal.
+
+    Stored with namespace: ext_voting::VoteLog
+
+    Attributes:
+        proposal_id (str): ID of the proposal (alias)
+        size (int): Number of leaves appended to the log
+    """
+
+    __alias__ = "proposal_id"
+
+    proposal_id = String(max_length=64)
+    size = Integer(default=0)
+
+
+class MerkleNode(ExtensionEntity):
+    """
+    Model for one complete subtree of a vote audit log Merkle tree.
+
+    The node at `level` and `index` covers leaves index * 2**level up to
+    (index + 1) * 2**level; it is stored once all of them are appended and
+    never changes afterwards.
+
+    Stored with namespace: ext_voting::MerkleNode
+
+    Attributes:
+        key (str): "<proposal_id>:<level>:<index>" (alias)
+        hash (str): Hex SHA-256 hash of the subtree
+    """
+
+    __alias__ = "key"
+
+    key = String(max_length=128)
+    hash = String(max_length=64)
+
+
+class RankedBallot(ExtensionEntity):
+    """
+    Model for the ballot of a voter on a ranked-choice proposal.
+
+    Stored with namespace: ext_voting::RankedBallot
+
+    Attributes:
+        key (str): "<proposal_id>:<voter id>" (alias)
+        ranking (str): JSON list of candidates, most preferred first
+        sequence (int): Sequence of the ballot in the proposal's audit log
+    """
+
+    __alias__ = "key"
+
+    key = String(max_length=256)
+    ranking = String()
+    sequence = Integer(default=0)
+
+
+class RankingBucket(ExtensionEntity):
+    """
+    Model for the number of voters who cast one ranking on a proposal.
+
+    Stored with namespace: ext_voting::RankingBucket
+
+    Attributes:
+        key (str): "<proposal_id>:<ranking JSON>" (alias)
+        count (int): Number of voters whose ballot is this ranking
+    """
+
+    __alias__ = "key"
+
+    key = String()
+    count = Integer(default=0)
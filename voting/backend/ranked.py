@@ -0,0 +1,260 @@
+"""
+Voting Ranked-Choice Ballots
+
+A proposal opened with the "ranked" ballot elects one of its `candidates`,
+both kept in its metadata, by instant runoff. Voters rank any number of
+candidates, most preferred first; casting again replaces the ranking.
+
+Voters with identical rankings are counted together: every distinct
+ranking is a RankingBucket holding the number of voters who cast it,
+updated as ballots are cast or replaced, and listed under the paged
+"ranking_buckets:<proposal_id>" ProposalIndex key (see SortedListIndex),
+by RANKING_PAGE_SIZE bucket IDs per page, so that listing a new ranking
+rewrites one bounded page. Buckets stored any other way, such as by data
+import, are listed by catch_up(), from the RankingBucket IDs above the
+`paged_ranking_bucket_id` cursor, in batches (see backfill.py); it also
+drops the unpaged "rankings:<proposal_id>" lists of earlier versions.
+Tabulation reads only the buckets, and each round moves only the buckets
+of the eliminated candidate to their next continuing choice, so it takes
+O(distinct rankings x rounds) rather than O(ballots x rounds).
+
+A round elects the candidate holding a majority of the continuing
+ballots; otherwise the candidate with the fewest is eliminated. Ties for
+elimination are broken by the earlier rounds, then against the candidate
+listed last.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from ggg import Proposal
+
+from . import tally
+from .audit import Accumulator
+from .models import ProposalIndex, RankedBallot, RankingBucket, VotingState
+
+BALLOT_TYPES = ("choice", "ranked")
+
+# Ranking bucket IDs covered by one page of a ranking_buckets:<proposal_id> list
+RANKING_PAGE_SIZE = 500
+
+
+def _metadata(proposal: Proposal) -> Dict[str, Any]:
+    try:
+        return json.loads(proposal.metadata or "{}")
+    except ValueError:
+        return {}
+
+
+def is_ranked(proposal: Proposal) -> bool:
+    return _metadata(proposal).get("ballot") == "ranked"
+
+
+def candidates(proposal: Proposal) -> List[str]:
+    return _metadata(proposal).get("candidates", [])
+
+
+def parse_ranking(proposal: Proposal, ranking) -> List[str]:
+    """Check a ranking cast on a proposal, raising ValueError if invalid."""
+    if not isinstance(ranking, list) or not ranking:
+        raise ValueError("ranking must be a non-empty list of candidates")
+    allowed = set(candidates(proposal))
+    for candidate in ranking:
+        if candidate not in allowed:
+            raise ValueError(f"Unknown candidate: {candidate}")
+    if len(set(ranking)) != len(ranking):
+        raise ValueError("ranking lists a candidate more than once")
+    return ranking
+
+
+def _encode(ranking: List[str]) -> str:
+    return json.dumps(ranking, separators=(",", ":"))
+
+
+def _rankings_key(proposal_id: str) -> str:
+    return f"ranking_buckets:{proposal_id}"
+
+
+def _page(bucket: RankingBucket) -> int:
+    return int(bucket._id) // RANKING_PAGE_SIZE
+
+
+def ballot_key(proposal_id: str, voter_id: str) -> str:
+    return f"{proposal_id}:{voter_id}"
+
+
+def find_ballot(proposal_id: str, voter_id: str) -> Optional[RankedBallot]:
+    return RankedBallot["key", ballot_key(proposal_id, voter_id)]
+
+
+class RankedDelta:
+    """
+    Records ranked ballots on a proposal, collecting the changes of the
+    ranking buckets and voter count, which apply() writes once per bucket.
+    """
+
+    def __init__(self, proposal: Proposal, log: Accumulator):
+        self.proposal = proposal
+        self.log = log
+        self.buckets: Dict[str, int] = {}
+        self.new_voters = 0
+
+    def record(self, voter_id: str, ranking: List[str]) -> None:
+        """Cast a voter's ranking, replacing any earlier one."""
+        encoded = _encode(ranking)
+        key = ballot_key(self.proposal.proposal_id, voter_id)
+        ballot = RankedBallot["key", key]
+        if ballot and ballot.ranking == encoded:
+            return
+        sequence = self.log.append(voter_id, ranking)
+        if ballot:
+            self.buckets[ballot.ranking] = self.buckets.get(ballot.ranking, 0) - 1
+            ballot._do_not_save = True
+            try:
+                ballot.ranking = encoded
+                ballot.sequence = sequence
+            finally:
+                ballot._do_not_save = False
+            ballot._save()
+        else:
+            RankedBallot(key=key, ranking=encoded, sequence=sequence)
+            self.new_voters += 1
+        self.buckets[encoded] = self.buckets.get(encoded, 0) + 1
+
+    def apply(self) -> None:
+        proposal_id = self.proposal.proposal_id
+        added: Dict[int, List[str]] = {}
+        removed: Dict[int, List[str]] = {}
+        for encoded, delta in self.buckets.items():
+            if not delta:
+                continue
+            key = f"{proposal_id}:{encoded}"
+            bucket = RankingBucket["key", key]
+            if not bucket:
+                if delta > 0:
+                    bucket = RankingBucket(key=key, count=delta)
+                    added.setdefault(_page(bucket), []).append(encoded)
+            elif bucket.count + delta > 0:
+                bucket.count = bucket.count + delta
+            else:
+                removed.setdefault(_page(bucket), []).append(encoded)
+                bucket.delete()
+        name = _rankings_key(proposal_id)
+        for page, values in added.items():
+            ProposalIndex.add_paged(name, page, values)
+        for page, values in removed.items():
+            ProposalIndex.remove_paged(name, page, values)
+        tally.add_to_fields(self.proposal, {"total_voters": self.new_voters})
+
+
+def catch_up(limit: int) -> bool:
+    """
+    List up to `limit` of the ranking buckets stored since the last
+    catch_up under their proposal.
+
+    Returns whether every bucket is listed.
+    """
+    state = VotingState["key", "paged_ranking_bucket_id"]
+    listed = int(state.value) if state else 0
+    max_id = RankingBucket.max_id()
+    if max_id <= listed:
+        return True
+    stored = RankingBucket.load_some(listed + 1, limit)
+    pages: Dict[Tuple[str, int], List[str]] = {}
+    for bucket in stored:
+        # The key is "<proposal_id>:<ranking JSON>", and the JSON is a list
+        separator = bucket.key.index(":[")
+        proposal_id, encoded = bucket.key[:separator], bucket.key[separator + 1 :]
+        pages.setdefault((proposal_id, _page(bucket)), []).append(encoded)
+    for proposal_id in {proposal_id for proposal_id, _ in pages}:
+        # Unpaged list of an earlier version, superseded by the relisting
+        ProposalIndex.put(f"rankings:{proposal_id}", [])
+    for (proposal_id, page), values in pages.items():
+        ProposalIndex.add_paged(_rankings_key(proposal_id), page, values)
+    listed = int(stored[-1]._id) if len(stored) == limit else max_id
+    if state:
+        state.value = str(listed)
+    else:
+        VotingState(key="paged_ranking_bucket_id", value=str(listed))
+    return listed >= max_id
+
+
+def buckets(proposal_id: str) -> Dict[Tuple[str, ...], int]:
+    """Number of voters behind each distinct ranking of a proposal."""
+    result = {}
+    name = _rankings_key(proposal_id)
+    for page in ProposalIndex.get(name):
+        for encoded in ProposalIndex.get(f"{name}:{page}"):
+            bucket = RankingBucket["key", f"{proposal_id}:{encoded}"]
+            if bucket and bucket.count > 0:
+                result[tuple(json.loads(encoded))] = bucket.count
+    return result
+
+
+def instant_runoff(
+    ranking_counts: Dict[Tuple[str, ...], int], candidate_list: List[str]
+) -> Dict[str, Any]:
+    """
+    Tabulate ranked ballots by instant runoff.
+
+    Args:
+        ranking_counts: Number of ballots of each distinct ranking
+        candidate_list: The candidates, in the order used to break ties
+
+    Returns:
+        Dict with the `winner` (None without ballots) and the `rounds`, each
+        with the ballots per continuing candidate, the `exhausted` ballots
+        and the `eliminated` candidate
+    """
+    continuing = set(candidate_list)
+    totals = {candidate: 0 for candidate in candidate_list}
+    # Buckets currently counted for each candidate, as (ranking, position)
+    piles: Dict[str, List[Tuple[Tuple[str, ...], int]]] = {
+        candidate: [] for candidate in candidate_list
+    }
+    exhausted = 0
+
+    def assign(ranking: Tuple[str, ...], position: int) -> None:
+        nonlocal exhausted
+        while position < len(ranking) and ranking[position] not in continuing:
+            position += 1
+        if position == len(ranking):
+            exhausted += ranking_counts[ranking]
+            return
+        piles[ranking[position]].append((ranking, position))
+        totals[ranking[position]] += ranking_counts[ranking]
+
+    for ranking in ranking_counts:
+        assign(ranking, 0)
+
+    rounds = []
+    history: List[Dict[str, int]] = []
+    while continuing:
+        round_totals = {c: totals[c] for c in candidate_list if c in continuing}
+        rounds.append({"totals": round_totals, "exhausted": exhausted})
+        history.append(round_totals)
+        active = sum(round_totals.values())
+        if active == 0:
+            return {"winner": None, "rounds": rounds}
+
+        leader = max(round_totals, key=round_totals.get)
+        if round_totals[leader] * 2 > active or len(continuing) == 1:
+            return {"winner": leader, "rounds": rounds}
+
+        # Fewest ballots now, then in the latest earlier round, then last listed
+        loser = min(
+            reversed(list(round_totals)),
+            key=lambda c: [earlier[c] for earlier in reversed(history)],
+        )
+        rounds[-1]["eliminated"] = loser
+        continuing.discard(loser)
+        del totals[loser]
+        for ranking, position in piles.pop(loser):
+            assign(ranking, position + 1)
+
+    return {"winner": None, "rounds": rounds}
+
+
+def tabulate(proposal: Proposal) -> Dict[str, Any]:
+    """Instant-runoff result of a ranked-choice proposal."""
+    return instant_runoff(buckets(proposal.proposal_id), candidates(proposal))
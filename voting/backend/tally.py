@@ -0,0 +1,279 @@
+"""
+Voting Tally Modes
+
+Every proposal is tallied in one of TALLY_MODES, chosen when voting opens
+and kept in the "tally" key of its metadata:
+
+- count: one voter, one vote (the default); the Proposal vote counters
+  are the tally;
+- weighted: a vote counts with the voter's balance of the proposal's
+  instrument;
+- quadratic: a vote counts with the square root of that balance.
+
+Balances are snapshotted into VoteWeight entries when voting opens. The
+voting power behind each choice is accumulated in the proposal's
+ProposalTally as votes are cast or changed, so a result never needs the
+balances, or the votes, to be read again.
+
+A snapshot covers the Balance IDs that exist when voting opens and reads
+them SNAPSHOT_BATCH_SIZE at a time: a first batch from open_voting, then
+one per timer tick, with the progress kept in a "snapshot:<proposal_id>"
+VotingState entry. Votes are refused until the snapshot is complete.
+Each snapshot of a proposal is numbered, in the "snapshot" key of its
+metadata, and only weights written under the current number count, so
+the weights of an earlier snapshot need not be deleted.
+"""
+
+import json
+import math
+from typing import Dict, Optional
+
+from ggg import Balance, Proposal
+from kybra import Duration, TimerId, ic
+from kybra_simple_logging import get_logger
+
+from .models import ProposalIndex, ProposalTally, VoteWeight, VotingState
+
+logger = get_logger("extensions.voting.tally")
+
+TALLY_MODES = ("count", "weighted", "quadratic")
+
+# Proposal counter of each vote choice
+TALLY_FIELDS = {"yes": "votes_yes", "no": "votes_no", "abstain": "votes_abstain"}
+
+# Balances read per snapshot batch
+SNAPSHOT_BATCH_SIZE = 500
+
+# Error returned while the weights of a proposal are being snapshotted
+SNAPSHOT_ERROR = "Vote weights are still being snapshotted, please try again shortly"
+
+_snapshot_timer_id: Optional[TimerId] = None
+
+
+def _metadata(proposal: Proposal) -> dict:
+    try:
+        return json.loads(proposal.metadata or "{}")
+    except ValueError:
+        return {}
+
+
+def get_mode(proposal: Proposal) -> str:
+    return _metadata(proposal).get("tally", "count")
+
+
+def snapshot_number(proposal: Proposal) -> int:
+    """Number of the current weight snapshot of a proposal."""
+    return _metadata(proposal).get("snapshot", 0)
+
+
+def weight_key(proposal_id: str, voter_id: str) -> str:
+    return f"{proposal_id}:{voter_id}"
+
+
+def power(mode: str, weight: float) -> float:
+    """Voting power of a voter with the given weight."""
+    if mode == "weighted":
+        return weight
+    if mode == "quadratic":
+        return math.sqrt(max(weight, 0))
+    return 1.0
+
+
+def get_weight(proposal_id: str, voter_id: str, number: int) -> float:
+    """Weight of a voter in snapshot `number` of a proposal."""
+    entry = VoteWeight["key", weight_key(proposal_id, voter_id)]
+    return entry.weight if entry and entry.snapshot == number else 0.0
+
+
+def set_weight(proposal_id: str, voter_id: str, weight: float, number: int) -> None:
+    """Set the weight of a voter in snapshot `number` of a proposal."""
+    key = weight_key(proposal_id, voter_id)
+    entry = VoteWeight["key", key]
+    if not entry:
+        VoteWeight(key=key, weight=float(weight), snapshot=number)
+    elif entry.weight != weight or entry.snapshot != number:
+        # Both fields in one write
+        entry._do_not_save = True
+        try:
+            entry.weight = float(weight)
+            entry.snapshot = number
+        finally:
+            entry._do_not_save = False
+        entry._save()
+
+
+def _snapshot_key(proposal_id: str) -> str:
+    return f"snapshot:{proposal_id}"
+
+
+def start_snapshot(proposal: Proposal, instrument: str, number: int) -> bool:
+    """
+    Start snapshot `number` of the balances of `instrument` as the weights
+    of a proposal, create its ProposalTally and take the first batch.
+
+    Returns whether the snapshot is complete.
+    """
+    progress = {
+        "instrument": instrument,
+        "number": number,
+        "cursor": 0,
+        "end": Balance.max_id(),
+    }
+    key = _snapshot_key(proposal.proposal_id)
+    state = VotingState["key", key]
+    if state:
+        state.value = json.dumps(progress)
+    else:
+        VotingState(key=key, value=json.dumps(progress))
+    ProposalIndex.add("snapshots", proposal.proposal_id)
+    if not ProposalTally["proposal_id", proposal.proposal_id]:
+        ProposalTally(proposal_id=proposal.proposal_id)
+    return continue_snapshot(proposal.proposal_id)
+
+
+def continue_snapshot(proposal_id: str, limit: int = SNAPSHOT_BATCH_SIZE) -> bool:
+    """
+    Take the next batch of a proposal's weight snapshot, if one is running.
+
+    Returns whether the snapshot is complete; if not, a timer takes the
+    next batch.
+    """
+    state = VotingState["key", _snapshot_key(proposal_id)]
+    if not state:
+        return True
+    progress = json.loads(state.value)
+    number, end = progress["number"], progress["end"]
+
+    balances = Balance.load_some(progress["cursor"] + 1, limit)
+    weights: Dict[str, float] = {}
+    for balance in balances:
+        if int(balance._id) > end:
+            break
+        if (
+            balance.instrument == progress["instrument"]
+            and balance.user
+            and balance.amount
+        ):
+            user_id = balance.user.id
+            weights[user_id] = weights.get(user_id, 0.0) + balance.amount
+    for voter_id, weight in weights.items():
+        # A voter's balances may span batches
+        set_weight(
+            proposal_id,
+            voter_id,
+            get_weight(proposal_id, voter_id, number) + weight,
+            number,
+        )
+
+    cursor = int(balances[-1]._id) if len(balances) == limit else end
+    if cursor >= end:
+        state.delete()
+        ProposalIndex.remove("snapshots", proposal_id)
+        return True
+    progress["cursor"] = cursor
+    state.value = json.dumps(progress)
+    _schedule_snapshot()
+    return False
+
+
+def is_ready(proposal: Proposal) -> bool:
+    """
+    Whether votes can be counted on a proposal, taking the next snapshot
+    batch if its weights are still being snapshotted.
+    """
+    return get_mode(proposal) == "count" or continue_snapshot(proposal.proposal_id)
+
+
+def _schedule_snapshot() -> None:
+    global _snapshot_timer_id
+    if _snapshot_timer_id is None:
+        _snapshot_timer_id = ic.set_timer(Duration(0), _on_snapshot_timer)
+
+
+def _on_snapshot_timer() -> None:
+    global _snapshot_timer_id
+    _snapshot_timer_id = None
+    try:
+        pending = ProposalIndex.get("snapshots")
+        if pending and continue_snapshot(pending[0]):
+            ProposalIndex.remove("snapshots", pending[0])
+            if len(pending) > 1:
+                _schedule_snapshot()
+    except Exception as e:
+        logger.error(f"Error snapshotting vote weights: {str(e)}")
+
+
+def totals(proposal: Proposal) -> Dict[str, float]:
+    """Voting power behind each choice of a proposal."""
+    if get_mode(proposal) == "count":
+        return {
+            choice: getattr(proposal, field) or 0
+            for choice, field in TALLY_FIELDS.items()
+        }
+    tally = ProposalTally["proposal_id", proposal.proposal_id]
+    return {choice: getattr(tally, choice) if tally else 0.0 for choice in TALLY_FIELDS}
+
+
+def add_to_fields(entity, deltas: Dict[str, float]) -> None:
+    """Add to numeric fields of an entity with a single write."""
+    if not any(deltas.values()):
+        return
+    entity._do_not_save = True
+    try:
+        for field, delta in deltas.items():
+            setattr(entity, field, float(getattr(entity, field) or 0) + delta)
+    finally:
+        entity._do_not_save = False
+    entity._save()
+
+
+class TallyDelta:
+    """
+    Pending changes to the vote counters and voting power totals of a
+    proposal, collected over any number of votes and written by apply().
+    """
+
+    def __init__(self, proposal: Proposal):
+        self.proposal = proposal
+        self.mode = get_mode(proposal)
+        self.snapshot = snapshot_number(proposal)
+        self.counters: Dict[str, float] = {}
+        self.power: Dict[str, float] = {}
+
+    def _add(self, totals: Dict[str, float], key: str, delta: float) -> None:
+        totals[key] = totals.get(key, 0) + delta
+
+    def move(self, voter_id: str, old_choice: Optional[str], new_choice: str) -> None:
+        """Count a voter's vote moving from old_choice (None if new) to new_choice."""
+        if old_choice in TALLY_FIELDS:
+            self._add(self.counters, TALLY_FIELDS[old_choice], -1)
+        elif old_choice is None:
+            self._add(self.counters, "total_voters", 1)
+        self._add(self.counters, TALLY_FIELDS[new_choice], 1)
+
+        if self.mode != "count":
+            voter_power = power(
+                self.mode,
+                get_weight(self.proposal.proposal_id, voter_id, self.snapshot),
+            )
+            if old_choice in TALLY_FIELDS:
+                self._add(self.power, old_choice, -voter_power)
+            self._add(self.power, new_choice, voter_power)
+
+    def reweigh(self, choice: str, old_weight: float, new_weight: float) -> None:
+        """Count the weight of a voter who voted `choice` changing."""
+        if self.mode != "count" and choice in TALLY_FIELDS:
+            self._add(
+                self.power,
+                choice,
+                power(self.mode, new_weight) - power(self.mode, old_weight),
+            )
+
+    def apply(self) -> None:
+        """Write the collected changes, with one write per entity."""
+        add_to_fields(self.proposal, self.counters)
+        if any(self.power.values()):
+            tally = ProposalTally["proposal_id", self.proposal.proposal_id]
+            if not tally:
+                tally = ProposalTally(proposal_id=self.proposal.proposal_id)
+            add_to_fields(tally, self.power)